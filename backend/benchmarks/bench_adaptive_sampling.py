@@ -0,0 +1,136 @@
+"""
+Benchmark: detector calls and count accuracy of adaptive vs fixed frame sampling.
+
+Writes a synthetic clip whose crowd alternates between quiet phases and sudden
+surges (people arriving and leaving within a second), and runs it through
+FramePipeline with a stub detector that returns the ground-truth boxes of each
+analysed frame. Inference cost therefore only depends on how many frames a
+sampler picks, and count errors come from sampling alone.
+
+For each sampler the time-aligned frame_wise_count (every 5th frame, carried
+forward between analysed frames) is compared with the true counts, both on that
+grid and for every frame of the clip.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_adaptive_sampling --frames 1500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import SyntheticScene
+from utils.analytics import Detections, compute_quadrant_counts
+from utils.pipeline import FramePipeline
+from utils.sampling import FRAME_SKIP, AdaptiveSampler, FixedSampler
+from utils.video_processing import CrowdStatistics
+
+
+def build_scene(args) -> SyntheticScene:
+    """
+    A resident crowd with surges: groups arrive or leave within `surge_frames`
+    at evenly spaced points of the clip.
+    """
+    rng = np.random.default_rng(args.seed)
+    arrivals = np.zeros(args.people)
+    departures = np.full(args.people, np.inf)
+    group = args.people // (2 * args.surges + 1)
+    period = args.frames // (args.surges + 1)
+    for surge in range(args.surges):
+        start = (surge + 1) * period
+        arriving = slice(args.people - (surge + 1) * group, args.people - surge * group)
+        arrivals[arriving] = start + rng.integers(0, args.surge_frames, group)
+        leaving = slice(surge * group, (surge + 1) * group)
+        departures[leaving] = start + period // 2 + rng.integers(0, args.surge_frames, group)
+    return SyntheticScene(
+        num_people=args.people, width=args.width, height=args.height, speed=args.speed,
+        seed=args.seed, arrivals=arrivals, departures=departures,
+    )
+
+
+async def run_sampler(scene, video_path, sampler):
+    """
+    Returns (frame_wise_count, analysed frame indices, sampler stats, elapsed seconds).
+    """
+    cap = cv2.VideoCapture(video_path)
+    statistics = CrowdStatistics(frame_step=FRAME_SKIP)
+
+    def detect(frame_indices, frames):
+        # Ground truth instead of a model, so only the choice of frames matters.
+        return [Detections(b, np.zeros(len(b), np.int32), np.ones(len(b), np.float32))
+                for b in map(scene.boxes, frame_indices)]
+
+    def encode(frame_index, frame, detections):
+        return frame_index, compute_quadrant_counts(detections.xyxy, scene.width, scene.height), len(detections.xyxy)
+
+    analysed = []
+    start = time.perf_counter()
+    async with FramePipeline(cap, detect, encode, sampler=sampler) as pipeline:
+        async for frame_index, quadrant_counts, people in pipeline:
+            statistics.update(frame_index, quadrant_counts, people, verbose=False)
+            analysed.append(frame_index)
+    elapsed = time.perf_counter() - start
+    cap.release()
+    statistics.finish(sampler.frames - 1)
+    return statistics.summary()["frame_wise_count"], analysed, sampler.stats(), elapsed
+
+
+def per_frame_estimate(analysed, counts_at, num_frames):
+    """
+    Carries each analysed frame's count forward to every following frame.
+    """
+    analysed = np.asarray(analysed)
+    latest = np.searchsorted(analysed, np.arange(num_frames), side="right") - 1
+    return np.asarray([counts_at[i] for i in analysed])[latest]
+
+
+async def main(args):
+    scene = build_scene(args)
+    truth = np.array([len(scene.boxes(i)) for i in range(args.frames)])
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = scene.write_clip(os.path.join(tmp, "surges.mp4"), args.frames)
+
+        samplers = [
+            ("fixed", FixedSampler(FRAME_SKIP)),
+            ("adaptive", AdaptiveSampler(
+                min_interval=args.min_interval, max_interval=args.max_interval,
+                motion_threshold=args.motion_threshold,
+            )),
+        ]
+        results = []
+        for name, sampler in samplers:
+            results.append((name, *await run_sampler(scene, video_path, sampler)))
+        # A fixed sampler with about the adaptive sampler's budget, for a fair comparison.
+        budget_skip = max(1, round(args.frames / max(1, results[1][3]["inferred_frames"])))
+        results.append((f"fixed/{budget_skip}", *await run_sampler(scene, video_path, FixedSampler(budget_skip))))
+
+    grid_truth = truth[::FRAME_SKIP]
+    print(f"{args.frames} frames, {args.people} people, {args.surges} surges; true count {truth.min()}..{truth.max()}")
+    print(f"{'sampler':>10} {'decoded':>8} {'inferred':>8} {'saved':>6} {'seconds':>8}"
+          f" {'grid MAE':>9} {'frame MAE':>9} {'max err':>8}")
+    for name, frame_wise_count, analysed, stats, elapsed in results:
+        grid_error = np.abs(np.asarray(frame_wise_count[:len(grid_truth)]) - grid_truth[:len(frame_wise_count)])
+        frame_error = np.abs(per_frame_estimate(analysed, truth, args.frames) - truth)
+        print(f"{name:>10} {stats['decoded_frames']:>8} {stats['inferred_frames']:>8} {stats['inference_saved']:>6}"
+              f" {elapsed:>8.2f} {grid_error.mean():>9.3f} {frame_error.mean():>9.3f} {frame_error.max():>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1500)
+    parser.add_argument("--people", type=int, default=60)
+    parser.add_argument("--surges", type=int, default=3)
+    parser.add_argument("--surge-frames", type=int, default=25, help="Frames over which a group arrives or leaves")
+    parser.add_argument("--speed", type=float, default=0.3, help="Maximum walking speed in pixels per frame")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--min-interval", type=int, default=2)
+    parser.add_argument("--max-interval", type=int, default=15)
+    parser.add_argument("--motion-threshold", type=float, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""
+Benchmark: per-frame cost and alert flapping of AlertEngine vs check_overcrowding.
+
+Generates noisy quadrant counts just below the density threshold with a few
+genuine surges, then feeds the same frames to the per-frame check_overcrowding
+(without printing) and to the incremental AlertEngine. Reports the time per frame
+and how many alerts each produces: check_overcrowding flags every noisy frame that
+crosses a threshold, while the engine only reports raised and cleared alerts.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_alert_engine --frames 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.alert import AlertEngine, check_overcrowding
+from utils.analytics import quadrant_names
+
+
+def synthetic_counts(args) -> np.ndarray:
+    """
+    Poisson quadrant counts averaging `baseline` people, with surges of +`surge`
+    people in one quadrant lasting about two seconds.
+    """
+    rng = np.random.default_rng(args.seed)
+    counts = rng.poisson(args.baseline, size=(args.frames, 12))
+    for start in rng.integers(0, args.frames, args.surges):
+        counts[start:start + int(2 * args.fps), rng.integers(0, 12)] += args.surge
+    return counts
+
+
+def main(args):
+    regions = quadrant_names()
+    counts = synthetic_counts(args)
+    frames = [dict(zip(regions, map(int, row))) for row in counts]
+    totals = counts.sum(axis=1).tolist()
+
+    start = time.perf_counter()
+    flagged = 0
+    previous = {key: 0 for key in regions}
+    for quadrant_counts, total in zip(frames, totals):
+        deltas = {key: quadrant_counts[key] - previous[key] for key in regions}
+        info = check_overcrowding(
+            total, args.max_capacity, quadrant_counts, args.density_threshold, deltas, args.change_threshold, verbose=False
+        )
+        flagged += sum(alert["alert"] for alert in info["quadrant_alerts"].values())
+        previous = quadrant_counts
+    legacy_seconds = time.perf_counter() - start
+
+    engine = AlertEngine(
+        regions, max_capacity=args.max_capacity, density_threshold=args.density_threshold,
+        change_threshold=args.change_threshold, debounce=args.debounce,
+    )
+    start = time.perf_counter()
+    transitions = []
+    for i, (quadrant_counts, total) in enumerate(zip(frames, totals)):
+        transitions.extend(engine.update(i / args.fps, quadrant_counts, total))
+    engine_seconds = time.perf_counter() - start
+
+    raised = [t for t in transitions if t.active]
+    print(f"{args.frames} frames at {args.fps:g} fps, 12 quadrants, {args.surges} surges")
+    print(f"check_overcrowding: {legacy_seconds / args.frames * 1e6:8.1f} us/frame, {flagged} quadrant-frames flagged")
+    print(f"AlertEngine:        {engine_seconds / args.frames * 1e6:8.1f} us/frame, {len(raised)} alerts raised, "
+          f"{len(transitions) - len(raised)} cleared")
+    for kind in ("density", "surge", "capacity"):
+        print(f"  {kind:>8}: {sum(t.kind == kind for t in raised)} raised")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--fps", type=float, default=6.0, help="Analysed frames per second of video time")
+    parser.add_argument("--baseline", type=float, default=4.0, help="Mean people per quadrant")
+    parser.add_argument("--density-threshold", type=int, default=5)
+    parser.add_argument("--change-threshold", type=int, default=3)
+    parser.add_argument("--max-capacity", type=int, default=80)
+    parser.add_argument("--surges", type=int, default=20)
+    parser.add_argument("--surge", type=int, default=8, help="People added to a quadrant during a surge")
+    parser.add_argument("--debounce", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+"""
+Benchmark: detection pipeline throughput at different YOLO batch sizes on CPU.
+
+Writes a synthetic clip, runs it through FramePipeline once per batch size and
+reports sampled frames per second. Per-frame detection counts are compared with
+the unbatched run to confirm batching does not change results.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_batch_inference --frames 400 --batch-sizes 1 4 8 16
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.synthetic import SyntheticScene
+from models import get_model
+from utils.pipeline import FramePipeline
+
+
+async def run_pipeline(model, video_path, batch_size, frame_skip):
+    """
+    Runs the clip through the pipeline and returns (per-frame counts, elapsed seconds).
+    """
+    cap = cv2.VideoCapture(video_path)
+
+    def detect(frame_indices, frames):
+        return model(frames)
+
+    def encode(frame_index, frame, result):
+        return frame_index, len(result.boxes)
+
+    counts = []
+    start = time.perf_counter()
+    async with FramePipeline(cap, detect, encode, frame_skip=frame_skip, batch_size=batch_size) as pipeline:
+        async for frame_index, count in pipeline:
+            counts.append((frame_index, count))
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return counts, elapsed
+
+
+async def main(args):
+    model = get_model(weights=args.weights, device="cpu")
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "synthetic.mp4")
+        SyntheticScene(num_people=args.people, width=args.width, height=args.height).write_clip(
+            video_path, args.frames
+        )
+
+        # Warm up so the first measured run does not pay for lazy initialisation.
+        await run_pipeline(model, video_path, 1, args.frames)
+
+        baseline = None
+        print(f"{'batch':>5} {'frames':>7} {'seconds':>8} {'fps':>8} {'identical':>9}")
+        for batch_size in args.batch_sizes:
+            counts, elapsed = await run_pipeline(model, video_path, batch_size, args.frame_skip)
+            if baseline is None:
+                baseline = counts
+            fps = len(counts) / elapsed if elapsed else 0.0
+            print(f"{batch_size:>5} {len(counts):>7} {elapsed:>8.2f} {fps:>8.2f} {str(counts == baseline):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--frames", type=int, default=400, help="Frames in the synthetic clip")
+    parser.add_argument("--frame-skip", type=int, default=5)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--people", type=int, default=30)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    asyncio.run(main(parser.parse_args()))
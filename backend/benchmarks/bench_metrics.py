@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: cost of the instrumentation in utils/metrics.py.
+
+Times --calls empty blocks wrapped in stage_timer(), record_stage() calls and
+count_frames() calls with metrics enabled and disabled (STAMPEDE_METRICS=0),
+against a bare loop, from --threads threads at once (the pipeline stages, camera
+workers and event loop record concurrently). Also reports how long rendering
+/metrics takes once every pipeline and stage has data.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_metrics --calls 200000 --threads 1 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import count_frames, metrics, record_stage, stage_timer
+
+PIPELINES = ("video", "live", "detect_frame", "camera")
+STAGES = ("decode", "inference", "analytics", "heatmap", "encode", "websocket_send", "video_write")
+
+
+def bare(calls: int):
+    for _ in range(calls):
+        pass
+
+
+def timed_block(calls: int):
+    for _ in range(calls):
+        with stage_timer("video", "heatmap"):
+            pass
+
+
+def recorded(calls: int):
+    for _ in range(calls):
+        record_stage("video", "decode", 0.001)
+
+
+def counted(calls: int):
+    for _ in range(calls):
+        count_frames("video")
+
+
+def per_call_ns(function, calls: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(function, [calls] * threads))
+    return (time.perf_counter() - start) / (calls * threads) * 1e9
+
+
+def main(args):
+    print(f"{'threads':>7} {'metrics':>8} {'bare ns':>8} {'timer ns':>9} {'record ns':>10} {'count ns':>9}")
+    for threads in args.threads:
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            base = per_call_ns(bare, args.calls, threads)
+            print(f"{threads:>7} {'on' if enabled else 'off':>8} {base:>8.0f} "
+                  f"{per_call_ns(timed_block, args.calls, threads) - base:>9.0f} "
+                  f"{per_call_ns(recorded, args.calls, threads) - base:>10.0f} "
+                  f"{per_call_ns(counted, args.calls, threads) - base:>9.0f}")
+
+    metrics.enabled = True
+    for pipeline in PIPELINES:
+        for stage in STAGES:
+            record_stage(pipeline, stage, 0.01)
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"\n/metrics: {len(text.splitlines())} lines, {len(text) / 1024:.0f} KB, "
+          f"rendered in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+"""
+Benchmark: many cameras sharing one detector through the CameraManager scheduler.
+
+Writes a few synthetic clips and adds --cameras looping "cameras" reading them at
+their own frame rate, each targeting --fps analysed frames per second. After
+--seconds it reports the scheduler's batch sizes, each camera's achieved rate
+(with Jain's fairness index: 1.0 means every camera got the same share), frames
+dropped at the source instead of queued, result latency and the process RSS,
+sampled over the run to show memory stays flat.
+
+By default the shared YOLO model is used. --stub-ms replaces it with a detector
+that returns no boxes and sleeps a fixed time per batch plus per frame, to study
+scheduling under a given inference cost without the model installed.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_multi_camera --cameras 16 --fps 5 --seconds 30
+    python -m benchmarks.bench_multi_camera --cameras 32 --stub-ms 20 15
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticScene
+from models import _rss_mb
+from utils.cameras import CameraManager
+
+
+class _StubBoxes:
+    xyxy = np.zeros((0, 4), dtype=np.float32)
+    cls = np.zeros(0, dtype=np.float32)
+    conf = np.zeros(0, dtype=np.float32)
+
+
+class _StubResult:
+    boxes = _StubBoxes()
+
+
+def stub_detector(batch_ms: float, frame_ms: float):
+    def detect(frames):
+        time.sleep((batch_ms + frame_ms * len(frames)) / 1000)
+        return [_StubResult() for _ in frames]
+    return detect
+
+
+def jain_index(rates) -> float:
+    rates = np.asarray(rates, dtype=np.float64)
+    return float(rates.sum() ** 2 / (len(rates) * (rates ** 2).sum())) if rates.any() else 0.0
+
+
+async def main(args):
+    model = stub_detector(*args.stub_ms) if args.stub_ms else None
+    manager = CameraManager(batch_size=args.batch_size, workers=args.workers, model=model)
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = [
+            SyntheticScene(num_people=30, width=args.width, height=args.height, seed=seed).write_clip(
+                os.path.join(tmp, f"camera_{seed}.mp4"), 250
+            )
+            for seed in range(4)
+        ]
+        await manager.start()
+        for i in range(args.cameras):
+            manager.add(f"cam{i:02d}", clips[i % len(clips)], fps=args.fps)
+
+        rss = []
+        start = time.monotonic()
+        while time.monotonic() - start < args.seconds:
+            await asyncio.sleep(1)
+            rss.append(_rss_mb())
+        stats = manager.stats()
+        await manager.stop()
+
+    cameras = stats["cameras"]
+    rates = [camera["analysed_fps"] for camera in cameras]
+    latencies = [camera["last_result"].get("latency_ms", 0) for camera in cameras]
+    print(f"{args.cameras} cameras x {args.fps} fps target = {args.cameras * args.fps:.0f} frames/s requested")
+    print(f"batches {stats['batches']}, average batch {stats['average_batch_size']}, "
+          f"inference busy {stats['inference_seconds'] / args.seconds:.0%}")
+    print(f"analysed fps per camera: min {min(rates):.2f}  mean {np.mean(rates):.2f}  max {max(rates):.2f}  "
+          f"total {sum(rates):.1f}  fairness {jain_index(rates):.3f}")
+    print(f"dropped at source: {sum(c['frames_dropped'] for c in cameras)} of "
+          f"{sum(c['frames_sampled'] for c in cameras)} sampled frames")
+    print(f"last result latency: median {np.median(latencies):.0f} ms, max {max(latencies):.0f} ms")
+    print(f"RSS MB over the run: first {rss[0]:.0f}, max {max(rss):.0f}, last {rss[-1]:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--fps", type=float, default=5.0, help="Target analysed fps per camera")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--stub-ms", type=float, nargs=2, metavar=("BATCH_MS", "FRAME_MS"),
+                        help="Use a sleeping stub detector instead of the model")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Benchmark: writing the heatmap output video.
+
+Renders --frames frames of a 1920x1080 SyntheticScene at --fps, keeps every 5th
+(as the fixed sampler does) and writes them, spending --work-ms on each frame
+before writing it to stand in for the rest of the pipeline:
+
+  - sync:     cv2.VideoWriter (mp4v, full resolution, source frame rate) called
+              inline, as the encode stage used to
+  - threaded: VideoWriterThread for each codec and --widths output width
+
+Reports the output resolution, frame rate and duration (which should match the
+source's), the time write() blocks the caller per frame, the frames per second
+the encoder manages (time the writer thread is busy) and the file size. "h264"
+needs ffmpeg (or STAMPEDE_FFMPEG pointing at it) and is skipped otherwise.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_output --frames 250 --widths 0 1280 960
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.synthetic import SyntheticScene
+from utils.sampling import FRAME_SKIP
+from utils.video_writer import OUTPUT_CODECS, VideoWriterThread, ffmpeg_available
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def report(name, blocked, frames, stats, fps, duration):
+    print(f"{name:>10} {stats['codec']:>6} {stats['width']:>5}x{stats['height']:<5} {fps:>6.1f} {duration:>6.1f} "
+          f"{blocked / frames * 1000:>10.2f} {stats['encode_fps'] or 0:>10.1f} {stats['size_bytes'] / 1024:>9.0f}")
+
+
+def run_sync(frames, path, args):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), args.fps, (WIDTH, HEIGHT))
+    blocked = 0.0
+    for _, frame in frames:
+        time.sleep(args.work_ms / 1000)
+        start = time.perf_counter()
+        writer.write(frame)
+        blocked += time.perf_counter() - start
+    start = time.perf_counter()
+    writer.release()
+    encode_seconds = blocked + time.perf_counter() - start
+    stats = {"codec": "mp4v", "width": WIDTH, "height": HEIGHT, "encode_fps": len(frames) / encode_seconds,
+             "size_bytes": os.path.getsize(path)}
+    report("sync", blocked, len(frames), stats, args.fps, len(frames) / args.fps)
+
+
+def run_threaded(frames, path, codec, width, args):
+    writer = VideoWriterThread(path, args.fps, WIDTH, HEIGHT, codec=codec, max_width=width)
+    blocked = 0.0
+    for frame_index, frame in frames:
+        time.sleep(args.work_ms / 1000)
+        start = time.perf_counter()
+        writer.write(frame_index, frame)
+        blocked += time.perf_counter() - start
+    stats = writer.close(args.frames)
+    report("threaded", blocked, len(frames), stats, stats["fps"], stats["frames_written"] / stats["fps"])
+
+
+def main(args):
+    scene = SyntheticScene(num_people=200, width=WIDTH, height=HEIGHT, seed=1)
+    frames = [(index, scene.render(index)) for index in range(0, args.frames, FRAME_SKIP)]
+    print(f"{len(frames)} of {args.frames} frames at {args.fps} fps ({args.frames / args.fps:.1f} s of video), "
+          f"{args.work_ms} ms of other work per frame")
+    print(f"{'writer':>10} {'codec':>6} {'size':>11} {'fps':>6} {'secs':>6} {'blocked ms':>10} "
+          f"{'encode fps':>10} {'size KB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        run_sync(frames, os.path.join(directory, "sync.mp4"), args)
+        for codec in OUTPUT_CODECS:
+            if codec == "h264" and not ffmpeg_available():
+                print(f"{'threaded':>10} {codec:>6} skipped, ffmpeg not found")
+                continue
+            for width in args.widths:
+                run_threaded(frames, os.path.join(directory, f"{codec}_{width}.mp4"), codec, width, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=250)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--work-ms", type=float, default=40.0, help="Time spent on each frame before writing it")
+    parser.add_argument("--widths", type=int, nargs="+", default=[0, 1280, 960], help="Output widths; 0 keeps 1920")
+    main(parser.parse_args())
@@ -0,0 +1,49 @@
+"""
+Benchmark: bytes per frame and encode time for each WebSocket streaming mode.
+
+Renders a synthetic crowd frame plus its heatmap overlay and encodes it the way
+process_video does for each StreamOptions, from the legacy base64 JSON protocol
+to downscaled binary JPEG/WebP previews.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_stream_encoding --width 1920 --height 1080
+"""
+import argparse
+
+from benchmarks.synthetic import SyntheticScene
+from utils.analytics import HeatmapRenderer
+from utils.streaming import DEFAULT_STREAM_OPTIONS, StreamOptions, StreamStats, encode_frame
+
+MODES = [
+    DEFAULT_STREAM_OPTIONS,
+    StreamOptions(binary=True),
+    StreamOptions(binary=True, quality=75),
+    StreamOptions(binary=True, quality=75, preview_width=960),
+    StreamOptions(binary=True, quality=70, preview_width=640, send_raw=False),
+    StreamOptions(binary=True, quality=70, preview_width=640, image_format="webp", send_raw=False),
+]
+
+
+def main(args):
+    scene = SyntheticScene(num_people=args.people, width=args.width, height=args.height, person_size=(40, 100))
+    renderer = HeatmapRenderer()
+    stats = StreamStats()
+    for i in range(args.frames):
+        frame = scene.render(i)
+        overlay = renderer.render(frame, scene.boxes(i))
+        stats.record({options: encode_frame(frame, overlay, options) for options in MODES})
+
+    print(f"{args.width}x{args.height}, {args.frames} frames")
+    print(f"{'mode':<40} {'bytes/frame':>12} {'encode ms':>10}")
+    for mode, row in stats.summary().items():
+        print(f"{mode:<40} {row['avg_bytes_per_frame']:>12} {row['avg_encode_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--people", type=int, default=60)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    main(parser.parse_args())
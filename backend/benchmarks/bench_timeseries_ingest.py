@@ -0,0 +1,103 @@
+"""
+Benchmark: ingest throughput of the time-series store.
+
+Records --samples analysed frames spread over --cameras sources (13 rows each:
+the whole frame plus 12 quadrants) through TimeSeriesStore.record() from one
+producer thread per camera, and reports how fast the writer thread commits them
+with their 1s/1m/1h rollups, the batch sizes it ends up using, samples dropped
+and the database size per sample.
+
+For comparison it also inserts --baseline samples the naive way, one autocommitted
+INSERT per row without rollups.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_timeseries_ingest --samples 200000 --cameras 16
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils.analytics import quadrant_names
+from utils.timeseries import TimeSeriesStore
+
+
+def produce(store: TimeSeriesStore, source: str, count: int, start: float, interval: float, seed: int):
+    rng = np.random.default_rng(seed)
+    regions = quadrant_names()
+    counts = rng.poisson(4, size=(count, len(regions))).tolist()
+    for i, row in enumerate(counts):
+        quadrant_counts = dict(zip(regions, row))
+        danger_zones = [region for region, value in quadrant_counts.items() if value > 8]
+        store.record(source, start + i * interval, sum(row), quadrant_counts, danger_zones)
+
+
+def database_bytes(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def naive_insert(path: str, samples: int) -> float:
+    """
+    Returns rows per second inserting one autocommitted row at a time.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE samples (source TEXT, region TEXT, ts REAL, count INTEGER, danger INTEGER)")
+    regions = ["global", *quadrant_names()]
+    start = time.perf_counter()
+    for i in range(samples):
+        for region in regions:
+            conn.execute("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", ("camera:0", region, float(i), 4, 0))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return samples * len(regions) / elapsed
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "timeseries.sqlite3")
+        store = TimeSeriesStore(path, max_pending=args.max_pending, retention_days={"raw": None, "1s": None, "1m": None})
+        store.start()
+        per_camera = args.samples // args.cameras
+        now = time.time()
+        producers = [
+            threading.Thread(target=produce, args=(store, f"camera:{i}", per_camera, now, 1 / args.fps, i))
+            for i in range(args.cameras)
+        ]
+        start = time.perf_counter()
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        produced = time.perf_counter() - start
+        store.stop()
+        elapsed = time.perf_counter() - start
+        stats = store.stats()
+        size = database_bytes(path)
+
+        naive_rate = naive_insert(os.path.join(tmp, "naive.sqlite3"), args.baseline) if args.baseline else None
+
+    written = stats["written_rows"] // 13
+    print(f"{args.cameras} cameras, {per_camera * args.cameras} samples recorded in {produced:.2f}s "
+          f"({stats['dropped_samples']} dropped), all written after {elapsed:.2f}s")
+    print(f"store:  {written / elapsed:,.0f} samples/s = {stats['written_rows'] / elapsed:,.0f} rows/s, "
+          f"{stats['batches']} batches of ~{written / max(stats['batches'], 1):,.0f} samples, "
+          f"{stats['write_ms_per_batch']} ms per batch")
+    print(f"size:   {size / 1e6:.1f} MB, {size / max(written, 1):.0f} bytes per sample including rollups")
+    if naive_rate:
+        print(f"naive:  {naive_rate:,.0f} rows/s with one autocommitted INSERT per row (no rollups)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--fps", type=float, default=5.0, help="Spacing of each camera's sample timestamps")
+    parser.add_argument("--max-pending", type=int, default=1000000, help="Writer queue size; smaller values drop samples under the burst")
+    parser.add_argument("--baseline", type=int, default=2000, help="Samples inserted row by row for comparison (0: skip)")
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+"""
+Benchmark: query latency of the time-series store over months of history.
+
+Fills a store with --days of samples for --cameras sources, one sample every
+--interval seconds ending now (all data kept, no retention), then times range and
+aggregate queries over spans from a minute to the whole history. Each query runs
+--repeat times; the median and 95th percentile latency are reported together with
+the resolution picked and the rows returned, so latency can be seen to depend on
+the rows read rather than on the span covered.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_timeseries_query --days 60 --cameras 2 --interval 30
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.analytics import quadrant_names
+from utils.timeseries import Sample, TimeSeriesStore
+
+SPANS = {"1 minute": 60, "1 hour": 3600, "1 day": 86400, "1 week": 7 * 86400, "30 days": 30 * 86400}
+
+
+def fill(store: TimeSeriesStore, args, now: float) -> int:
+    regions = quadrant_names()
+    conn = store._connect()
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(now - args.days * 86400, now, args.interval)
+    chunk = 20000
+    for i in range(0, len(timestamps), chunk):
+        batch = []
+        for camera in range(args.cameras):
+            counts = rng.poisson(4, size=(len(timestamps[i:i + chunk]), len(regions))).tolist()
+            for timestamp, row in zip(timestamps[i:i + chunk].tolist(), counts):
+                quadrant_counts = dict(zip(regions, row))
+                batch.append(Sample(f"camera:{camera}", timestamp, sum(row), quadrant_counts,
+                                    [region for region, value in quadrant_counts.items() if value > 8]))
+        store.write(conn, batch)
+    conn.close()
+    return len(timestamps) * args.cameras
+
+
+def timed(repeat: int, query):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "timeseries.sqlite3")
+        store = TimeSeriesStore(path, retention_days={"raw": None, "1s": None, "1m": None})
+        store.start()
+        now = time.time()
+        start = time.perf_counter()
+        samples = fill(store, args, now)
+        fill_seconds = time.perf_counter() - start
+        size = os.path.getsize(path) + (os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0)
+        print(f"{samples:,} samples ({samples * 13:,} rows) over {args.days} days written in {fill_seconds:.1f}s, "
+              f"{size / 1e6:.0f} MB")
+
+        spans = {name: span for name, span in SPANS.items() if span <= args.days * 86400}
+        spans[f"all {args.days} days"] = args.days * 86400
+        print(f"{'query':>9} {'span':>12} {'resolution':>10} {'rows':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, span in spans.items():
+            result, p50, p95 = timed(args.repeat, lambda: store.series("camera:0", "q1", now - span, now))
+            print(f"{'series':>9} {name:>12} {result['resolution']:>10} {len(result['points']):>6} {p50:>8.2f} {p95:>8.2f}")
+        for name, span in spans.items():
+            result, p50, p95 = timed(args.repeat, lambda: store.aggregate("camera:0", "global", now - span - 17.5, now))
+            print(f"{'aggregate':>9} {name:>12} {'tiled':>10} {result['samples']:>6} {p50:>8.2f} {p95:>8.2f}")
+        result, p50, p95 = timed(args.repeat, lambda: store.series("camera:0", "global", now - 3600, now, "raw", 10000))
+        print(f"{'raw':>9} {'1 hour':>12} {'raw':>10} {len(result['points']):>6} {p50:>8.2f} {p95:>8.2f}")
+        store.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--cameras", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between a camera's samples")
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+"""
+Benchmark: per-frame cost and quality of the optional tracking stage.
+
+Moves --people ground-truth people through a 1920x1080 SyntheticScene and feeds
+the tracker what a detector would give it: boxes with --noise pixels of jitter,
+--drop of them missed each frame and confidences spread between --min-confidence
+and 0.95 (so some only take part in the low-confidence association). Every
+--step-th frame of a --fps clip is tracked, as with a frame skip.
+
+Reports the tracker's update time per frame (mean and p95) next to the cost of
+compute_quadrant_counts on the same boxes, the tracks created and confirmed, ID
+switches (a ground-truth person matched to a different confirmed track than
+before) and recall (people covered by a confirmed track with IoU >= 0.5).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_tracking --people 50 300 600 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticScene
+from utils.analytics import compute_quadrant_counts
+from utils.tracking import Tracker, match, overlapping_pairs
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def run(people: int, args):
+    scene = SyntheticScene(num_people=people, width=WIDTH, height=HEIGHT, speed=args.speed, seed=1)
+    tracker = Tracker(WIDTH, HEIGHT)
+    rng = np.random.default_rng(0)
+    update_ms, counts_ms = [], []
+    confirmed_ids, previous = set(), {}
+    switches = covered = total = 0
+    for frame_index in range(0, args.frames, args.step):
+        truth = scene.boxes(frame_index)
+        seen = rng.random(len(truth)) >= args.drop
+        boxes = (truth + rng.normal(0, args.noise, truth.shape))[seen].astype(np.float32)
+        confidences = rng.uniform(args.min_confidence, 0.95, len(truth))[seen].astype(np.float32)
+
+        start = time.perf_counter()
+        tracker.update(frame_index / args.fps, boxes, confidences)
+        update_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        compute_quadrant_counts(boxes, WIDTH, HEIGHT)
+        counts_ms.append((time.perf_counter() - start) * 1000)
+
+        confirmed = np.flatnonzero(tracker.confirmed)
+        confirmed_ids.update(tracker.ids[confirmed].tolist())
+        persons, tracks = match(*overlapping_pairs(truth, tracker.boxes[confirmed]), 0.5)
+        covered += len(persons)
+        total += len(truth)
+        for person, track_id in zip(persons.tolist(), tracker.ids[confirmed][tracks].tolist()):
+            if previous.get(person, track_id) != track_id:
+                switches += 1
+            previous[person] = track_id
+
+    summary = tracker.summary()
+    print(f"{people:>6} {np.mean(update_ms):>8.2f} {np.percentile(update_ms, 95):>8.2f} {np.mean(counts_ms):>9.3f} "
+          f"{summary['total_tracks']:>8} {len(confirmed_ids):>10} {switches:>9} {covered / max(total, 1):>7.3f}")
+
+
+def main(args):
+    print(f"{len(range(0, args.frames, args.step))} tracked frames (every {args.step} of {args.frames} at {args.fps} fps), "
+          f"{args.drop:.0%} missed, {args.noise}px jitter, confidence {args.min_confidence}-0.95")
+    print(f"{'people':>6} {'mean ms':>8} {'p95 ms':>8} {'counts ms':>9} {'created':>8} {'confirmed':>10} "
+          f"{'switches':>9} {'recall':>7}")
+    for people in args.people:
+        run(people, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--people", type=int, nargs="+", default=[50, 300, 600, 1000])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--step", type=int, default=5, help="Track every n-th frame")
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--speed", type=float, default=2.0, help="Maximum speed of a person in pixels per frame")
+    parser.add_argument("--noise", type=float, default=1.5, help="Standard deviation of box jitter in pixels")
+    parser.add_argument("--drop", type=float, default=0.05, help="Fraction of people missed each frame")
+    parser.add_argument("--min-confidence", type=float, default=0.3)
+    main(parser.parse_args())
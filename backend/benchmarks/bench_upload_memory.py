@@ -0,0 +1,75 @@
+"""
+Memory benchmark: peak Python heap while ingesting a large upload.
+
+Builds a large synthetic video file by concatenating copies of a rendered clip
+(ingestion never decodes it, so only the size matters), wraps it in a FastAPI
+UploadFile and compares the previous whole-file `await video.read()` against
+the chunked save_upload().
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_upload_memory --size-mb 1024
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi import UploadFile
+
+from benchmarks.synthetic import SyntheticScene
+from utils.uploads import save_upload
+
+
+def build_large_file(path: str, size_mb: int, tmp: str):
+    clip = SyntheticScene(width=1280, height=720).write_clip(os.path.join(tmp, "clip.mp4"), 100)
+    with open(clip, "rb") as f:
+        block = f.read()
+    target = size_mb * 1024 * 1024
+    with open(path, "wb") as out:
+        written = 0
+        while written < target:
+            out.write(block)
+            written += len(block)
+    return written
+
+
+async def legacy_ingest(upload: UploadFile, tmp: str):
+    with open(os.path.join(tmp, f"temp_{upload.filename}"), "wb") as f:
+        f.write(await upload.read())
+
+
+async def chunked_ingest(upload: UploadFile, tmp: str):
+    saved = await save_upload(upload, directory=tmp)
+    os.remove(saved.path)
+
+
+async def measure(name, ingest, path, tmp):
+    with open(path, "rb") as f:
+        upload = UploadFile(file=f, filename="large.mp4")
+        tracemalloc.start()
+        start = time.perf_counter()
+        await ingest(upload, tmp)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{name:<10} peak heap {peak / 2**20:10.1f} MB   {elapsed:6.2f} s")
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.mp4")
+        size = build_large_file(path, args.size_mb, tmp)
+        print(f"upload size {size / 2**20:.0f} MB")
+        await measure("chunked", chunked_ingest, path, tmp)
+        if not args.skip_legacy:
+            await measure("legacy", legacy_ingest, path, tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--skip-legacy", action="store_true", help="Skip the whole-file read (needs RAM >= file size)")
+    asyncio.run(main(parser.parse_args()))
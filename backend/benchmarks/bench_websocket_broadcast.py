@@ -0,0 +1,109 @@
+"""
+Load test: broadcast throughput of WebSocketManager with many clients, one of them slow.
+
+Simulates a video job producing frames as fast as it can and fanning each one out
+to 100 in-process fake clients. One client takes `--slow-delay` seconds per send.
+The old sequential `await send_json` loop is measured alongside for comparison,
+then per-client queue depth and drop counts are reported.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_websocket_broadcast --clients 100 --frames 200
+"""
+import argparse
+import asyncio
+import time
+
+from utils.streaming import DEFAULT_STREAM_OPTIONS, EncodedFrame
+from websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """
+    Stands in for a starlette WebSocket; every send takes `delay` seconds.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def _deliver(self):
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def send_json(self, data):
+        await self._deliver()
+
+    async def send_bytes(self, data):
+        await self._deliver()
+
+
+def make_frame(size: int):
+    return {DEFAULT_STREAM_OPTIONS: EncodedFrame([("frame", b"\0" * size), ("heatmap", b"\0" * size)], 0.0)}
+
+
+async def sequential_broadcast(sockets, frames, encoded):
+    """The original send_data: await each connection in turn."""
+    start = time.perf_counter()
+    for i in range(frames):
+        for ws in sockets:
+            for message in encoded[DEFAULT_STREAM_OPTIONS].messages({"frame_index": i}, DEFAULT_STREAM_OPTIONS):
+                await ws.send_json(message)
+    return time.perf_counter() - start
+
+
+async def queued_broadcast(manager, frames, encoded, frame_interval):
+    start = time.perf_counter()
+    for i in range(frames):
+        await manager.send_frame({"frame_index": i}, encoded)
+        if i % 20 == 0:
+            await manager.send_data({"type": "alert", "frame_index": i})
+        # Stands in for per-frame processing work between broadcasts.
+        await asyncio.sleep(frame_interval)
+    return time.perf_counter() - start
+
+
+async def main(args):
+    encoded = make_frame(args.payload_bytes)
+
+    for slow in (0, 1):
+        manager = WebSocketManager()
+        sockets = [FakeWebSocket(args.fast_delay) for _ in range(args.clients - slow)]
+        sockets += [FakeWebSocket(args.slow_delay) for _ in range(slow)]
+        for ws in sockets:
+            await manager.connect(ws)
+
+        elapsed = await queued_broadcast(manager, args.frames, encoded, args.frame_interval)
+        stats = manager.stats()["clients"]
+        print(
+            f"queued, {slow} slow client(s): {args.frames / elapsed:8.1f} frames/s, "
+            f"max queue depth {max(c['queue_depth'] for c in stats)}, "
+            f"total dropped {sum(c['dropped_frames'] for c in stats)}"
+        )
+        if slow:
+            print(f"  slow client: {stats[-1]}")
+        for ws in sockets:
+            manager.disconnect(ws)
+
+    # The sequential loop is bounded by the slowest client, so keep this run short.
+    seq_frames = min(args.frames, 10)
+    sockets = [FakeWebSocket(args.fast_delay) for _ in range(args.clients - 1)] + [FakeWebSocket(args.slow_delay)]
+    elapsed = await sequential_broadcast(sockets, seq_frames, encoded)
+    print(f"sequential, 1 slow client: {seq_frames / elapsed:8.1f} frames/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--payload-bytes", type=int, default=60_000)
+    parser.add_argument("--frame-interval", type=float, default=0.005, help="Simulated processing time per frame")
+    parser.add_argument("--fast-delay", type=float, default=0.0005)
+    parser.add_argument("--slow-delay", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: assigning detections to polygon zones.
+
+Builds a layout of --zones random convex polygons (plus the default 3x4 grid) and
+counts --detections box centers per zone on a --width x --height frame, comparing
+a per-box, per-zone point-in-polygon test (cv2.pointPolygonTest) with the label
+mask lookup of ZoneLayout.counts(). Also reports the one-off cost and size of each
+layout's lookup for the resolution.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_zones --detections 100 1000 5000 --zones 12 50
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.zones import Zone, ZoneLayout
+
+
+def random_layout(count: int, seed: int = 0) -> ZoneLayout:
+    rng = np.random.default_rng(seed)
+    zones = []
+    for i in range(count):
+        center = rng.uniform(0.1, 0.9, 2)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 8))
+        radius = rng.uniform(0.05, 0.2)
+        polygon = np.clip(center + radius * np.column_stack([np.cos(angles), np.sin(angles)]), 0, 1)
+        zones.append(Zone(f"z{i + 1}", polygon, 5))
+    return ZoneLayout(zones, name=f"{count} polygons")
+
+
+def point_in_polygon_counts(layout: ZoneLayout, boxes: np.ndarray, width: int, height: int):
+    polygons = [(zone.polygon * (width, height)).astype(np.float32) for zone in layout.zones]
+    counts = {name: 0 for name in layout.names}
+    for x1, y1, x2, y2 in boxes.astype(np.int32).tolist():
+        center = ((x1 + x2) // 2, (y1 + y2) // 2)
+        for name, polygon in zip(layout.names, polygons):
+            if cv2.pointPolygonTest(polygon, center, False) >= 0:
+                counts[name] += 1
+                break
+    return counts
+
+
+def timed(repeat: int, function, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    rng = np.random.default_rng(1)
+    layouts = [ZoneLayout.from_grid()] + [random_layout(count) for count in args.zones]
+    print(f"{'layout':>12} {'build ms':>9} {'size KB':>8}")
+    for layout in layouts:
+        start = time.perf_counter()
+        lookup = layout._lookup(args.width, args.height)
+        build_ms = (time.perf_counter() - start) * 1000
+        size = sum(table.nbytes for table in lookup) if isinstance(lookup, tuple) else lookup.nbytes
+        print(f"{layout.name:>12} {build_ms:>9.2f} {size / 1024:>8.0f}")
+
+    print(f"\n{'layout':>12} {'boxes':>6} {'per-box ms':>11} {'mask ms':>8} {'speed-up':>9}")
+    for layout in layouts:
+        for count in args.detections:
+            centers = rng.uniform(0, (args.width, args.height), (count, 2))
+            boxes = np.hstack([centers - 10, centers + 10]).astype(np.float32)
+            per_box = timed(max(1, args.repeat // 10), point_in_polygon_counts, layout, boxes, args.width, args.height)
+            lookup = timed(args.repeat, layout.counts, boxes, args.width, args.height)
+            print(f"{layout.name:>12} {count:>6} {per_box:>11.3f} {lookup:>8.3f} {per_box / lookup:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--zones", type=int, nargs="+", default=[12, 50])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat", type=int, default=100)
+    main(parser.parse_args())
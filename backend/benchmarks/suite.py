@@ -0,0 +1,344 @@
+"""
+Benchmark suite: end-to-end performance of process_video_file, for regression checks.
+
+For every --resolutions x --people combination, renders a --frames frame
+SyntheticScene clip (people sized in proportion to the frame height, so the
+scene looks the same at every resolution and the ground-truth count is known)
+and processes it with process_video_file, detecting with BlobDetector so no
+weights or network are needed and results are deterministic. One in-process
+WebSocket client (JSON/base64 frames, or binary with --binary) receives the
+stream. Each case runs --repeat times and the run with the median wall time is
+reported:
+
+  - throughput: wall time, source frames and analysed frames per second
+  - latency: p50/p95/p99 of the interval between analysed frames reaching the
+    event loop, and of every pipeline stage (decode, inference, analytics,
+    heatmap, encode, video write, WebSocket send) from the /metrics histograms
+  - memory: peak resident memory above the level before the run
+  - WebSocket: bytes and messages received by the client, frames it dropped
+  - accuracy: mean people per analysed frame against the ground truth
+
+Results are written as JSON (--output) together with the machine, library
+versions and git commit. --compare prints the change of every case against an
+earlier result file and exits with status 1 if any metric got worse by more
+than --threshold.
+
+Run from the backend directory:
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --output current.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+from rich import get_console
+
+from benchmarks.synthetic import BlobDetector, SyntheticScene
+from utils import alert, video_processing
+from utils.metrics import STAGE_SECONDS
+from utils.video_processing import process_video_file
+from websocket_manager import websocket_manager
+
+# Person size at 720p; scaled with the frame height.
+PERSON_SIZE_720P = (24, 56)
+PERCENTILES = (50, 95, 99)
+
+# (metric path, whether higher is better) compared by --compare, besides the mean time of each stage
+COMPARED = [
+    (("throughput", "analysed_fps"), True),
+    (("latency", "frame_interval_ms", "p95"), False),
+    (("memory", "peak_rss_delta_mb"), False),
+    (("websocket", "bytes_per_frame"), False),
+]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakMemory:
+    """
+    Samples the resident set size on a background thread and keeps the peak.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline = self.peak = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+        return False
+
+
+class CountingWebSocket:
+    """
+    Stands in for a starlette WebSocket and counts what is sent to it.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.messages = 0
+        self.client = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_json(self, data):
+        self.bytes += len(json.dumps(data, separators=(",", ":")))
+        self.messages += 1
+
+    async def send_bytes(self, data):
+        self.bytes += len(data)
+        self.messages += 1
+
+
+def percentiles(values) -> dict:
+    if not len(values):
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+
+
+def histogram_quantile(q: float, counts, bounds) -> float:
+    """
+    Estimates a quantile from per-bucket counts, interpolating linearly inside the
+    bucket as Prometheus' histogram_quantile does.
+    """
+    total = sum(counts)
+    rank = q * total
+    cumulative, lower = 0, 0.0
+    for count, upper in zip(counts, list(bounds) + [bounds[-1]]):
+        if count and cumulative + count >= rank:
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = upper
+    return bounds[-1]
+
+
+def stage_summary(before: dict, after: dict) -> dict:
+    """
+    Returns count, mean and percentiles (ms) of every video pipeline stage between two snapshots.
+    """
+    stages = {}
+    for (pipeline, stage), (counts, total) in sorted(after.items()):
+        if pipeline != "video":
+            continue
+        previous_counts, previous_total = before.get((pipeline, stage), ([0] * len(counts), 0.0))
+        counts = [a - b for a, b in zip(counts, previous_counts)]
+        frames = sum(counts)
+        if not frames:
+            continue
+        stages[stage] = {
+            "count": frames,
+            "mean_ms": round((total - previous_total) / frames * 1000, 3),
+            **{
+                f"p{p}_ms": round(histogram_quantile(p / 100, counts, STAGE_SECONDS.buckets) * 1000, 3)
+                for p in PERCENTILES
+            },
+        }
+    return stages
+
+
+async def run_once(video_path: str, directory: str, scene: SyntheticScene, args) -> dict:
+    websocket = CountingWebSocket()
+    await websocket_manager.connect(websocket)
+    if args.binary:
+        websocket_manager.configure(websocket, {"type": "configure", "binary": True})
+    client = websocket_manager.clients[websocket]
+    arrivals = []
+    before = STAGE_SECONDS.snapshot()
+    try:
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            result = await process_video_file(
+                video_path,
+                os.path.join(directory, "output.mp4"),
+                batch_size=args.batch_size,
+                sampling="fixed",
+                on_progress=lambda percent: arrivals.append(time.perf_counter()),
+                model=BlobDetector(),
+                output_codec="mp4v",
+            )
+            wall = time.perf_counter() - start
+            # Let the client's sender task deliver what is still queued
+            deadline = time.monotonic() + 5
+            while client.queue_depth and time.monotonic() < deadline:
+                await asyncio.sleep(0.001)
+    finally:
+        websocket_manager.disconnect(websocket)
+    after = STAGE_SECONDS.snapshot()
+
+    analysed = len(arrivals)
+    truth = [len(scene.boxes(i)) for i in range(0, args.frames, 5)]
+    return {
+        "throughput": {
+            "wall_seconds": round(wall, 3),
+            "source_fps": round(args.frames / wall, 2),
+            "analysed_frames": analysed,
+            "analysed_fps": round(analysed / wall, 2),
+        },
+        "latency": {
+            "frame_interval_ms": percentiles(np.diff(arrivals) * 1000),
+            "stages": stage_summary(before, after),
+        },
+        "memory": {
+            "baseline_rss_mb": round(memory.baseline, 1),
+            "peak_rss_delta_mb": round(memory.peak - memory.baseline, 1),
+        },
+        "websocket": {
+            "mode": "binary" if args.binary else "json",
+            "bytes": websocket.bytes,
+            "messages": websocket.messages,
+            "bytes_per_frame": round(websocket.bytes / max(analysed, 1)),
+            "dropped_frames": client.dropped_frames,
+        },
+        "accuracy": {
+            "people_truth": round(float(np.mean(truth)), 2),
+            "people_detected": round(result["average_people_per_frame"], 2),
+        },
+        "output_video": result["output_video"],
+    }
+
+
+async def run_case(width: int, height: int, people: int, args) -> dict:
+    scale = height / 720
+    scene = SyntheticScene(
+        num_people=people, width=width, height=height, seed=1,
+        person_size=(max(4, round(PERSON_SIZE_720P[0] * scale)), max(8, round(PERSON_SIZE_720P[1] * scale))),
+        speed=2.0 * scale,
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = scene.write_clip(os.path.join(directory, "clip.mp4"), args.frames, args.fps)
+        runs = [await run_once(video_path, directory, scene, args) for _ in range(args.repeat)]
+    runs.sort(key=lambda run: run["throughput"]["wall_seconds"])
+    return {"resolution": f"{width}x{height}", "people": people, **runs[len(runs) // 2]}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def lookup(case: dict, path):
+    for key in path:
+        case = case.get(key) if isinstance(case, dict) else None
+    return case
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Prints the relative change of each compared metric per case; returns the number of regressions.
+    """
+    previous = {(case["resolution"], case["people"]): case for case in baseline["cases"]}
+    regressions = 0
+    print(f"\nAgainst {baseline['environment'].get('git_commit')} ({baseline['environment'].get('timestamp')}):")
+    for case in results["cases"]:
+        old = previous.get((case["resolution"], case["people"]))
+        if old is None:
+            continue
+        changes = []
+        stages = [(("latency", "stages", stage, "mean_ms"), False) for stage in case["latency"]["stages"]]
+        for path, higher_is_better in COMPARED + stages:
+            new_value, old_value = lookup(case, path), lookup(old, path)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > threshold else ""
+            regressions += worse > threshold
+            name = {"p95": "interval p95", "mean_ms": path[-2]}.get(path[-1], path[-1])
+            changes.append(f"{name} {change:+.1%}{flag}")
+        print(f"{case['resolution']:>10} {case['people']:>5}  " + ", ".join(changes))
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def main(args):
+    if not args.verbose:
+        # process_video_file reports every video and its alerts; keep the suite's own table readable
+        for console in (video_processing.console, alert.console, get_console()):
+            console.quiet = True
+
+    results = {"environment": environment(), "arguments": vars(args), "cases": []}
+    print(f"{'resolution':>10} {'people':>6} {'fps':>7} {'src fps':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'peak MB':>8} {'WS B/frame':>11} {'count':>11}")
+    for resolution in args.resolutions:
+        width, height = (int(value) for value in resolution.lower().split("x"))
+        for people in args.people:
+            case = asyncio.run(run_case(width, height, people, args))
+            results["cases"].append(case)
+            interval = case["latency"]["frame_interval_ms"]
+            print(f"{case['resolution']:>10} {people:>6} {case['throughput']['analysed_fps']:>7.1f} "
+                  f"{case['throughput']['source_fps']:>8.1f} {interval['p50'] or 0:>7.1f} {interval['p95'] or 0:>7.1f} "
+                  f"{interval['p99'] or 0:>7.1f} {case['memory']['peak_rss_delta_mb']:>8.1f} "
+                  f"{case['websocket']['bytes_per_frame']:>11} "
+                  f"{case['accuracy']['people_detected']:>5}/{case['accuracy']['people_truth']:<5}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720", "1920x1080"])
+    parser.add_argument("--people", type=int, nargs="+", default=[20, 100, 400])
+    parser.add_argument("--frames", type=int, default=250)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the median is reported")
+    parser.add_argument("--binary", action="store_true", help="Stream binary frames instead of JSON/base64")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Keep process_video_file's console output")
+    main(parser.parse_args())
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+
+
+class SyntheticScene:
+    """
+    A deterministic crowd scene used by the benchmarks.
+
+    People are drawn as light, person-shaped blobs (a head and a torso) on a dark
+    background and drift with a constant velocity, bouncing off the frame edges.
+    Their bounding boxes are known for every frame, so benchmark results can be
+    compared against ground truth. With `arrivals`/`departures` people are only in
+    the scene for part of the clip, which makes the crowd size change over time.
+
+    :param num_people: Number of people in the scene.
+    :param width: Frame width.
+    :param height: Frame height.
+    :param person_size: Approximate (width, height) of a person in pixels.
+    :param speed: Maximum speed of a person in pixels per frame.
+    :param seed: Random seed, so the same arguments always produce the same clip.
+    :param arrivals: Optional per-person frame index at which the person appears.
+    :param departures: Optional per-person frame index at which the person leaves.
+    """
+
+    def __init__(self, num_people=20, width=640, height=360, person_size=(24, 56), speed=2.0, seed=0,
+                 arrivals=None, departures=None):
+        self.num_people = num_people
+        self.width = width
+        self.height = height
+        self.person_w, self.person_h = person_size
+        rng = np.random.default_rng(seed)
+        self.origins = np.column_stack([
+            rng.uniform(0, width - self.person_w, num_people),
+            rng.uniform(0, height - self.person_h, num_people),
+        ]).astype(np.float32)
+        self.velocities = rng.uniform(-speed, speed, (num_people, 2)).astype(np.float32)
+        self.background = np.full((height, width, 3), 40, dtype=np.uint8)
+        self.arrivals = np.zeros(num_people) if arrivals is None else np.asarray(arrivals)
+        self.departures = np.full(num_people, np.inf) if departures is None else np.asarray(departures)
+
+    def boxes(self, frame_index: int) -> np.ndarray:
+        """
+        Returns the ground-truth boxes of the people in the scene at a frame as an (N, 4) xyxy array.
+        """
+        span = np.array([self.width - self.person_w, self.height - self.person_h], dtype=np.float32)
+        # Reflect positions at the borders so people bounce instead of leaving the frame.
+        pos = np.abs(self.origins + self.velocities * frame_index)
+        pos = np.where((pos // span) % 2 == 1, span - pos % span, pos % span)
+        boxes = np.column_stack([pos, pos + [self.person_w, self.person_h]]).astype(np.float32)
+        return boxes[(self.arrivals <= frame_index) & (frame_index < self.departures)]
+
+    def render(self, frame_index: int) -> np.ndarray:
+        """
+        Renders a BGR frame with every person drawn at its position for `frame_index`.
+        """
+        frame = self.background.copy()
+        head_r = max(2, self.person_w // 4)
+        for x1, y1, x2, y2 in self.boxes(frame_index).astype(int):
+            cx = (x1 + x2) // 2
+            cv2.circle(frame, (cx, y1 + head_r), head_r, (200, 200, 220), -1)
+            cv2.rectangle(frame, (x1, y1 + 2 * head_r), (x2, y2), (180, 190, 210), -1)
+        return frame
+
+    def write_clip(self, path: str, num_frames: int, fps: float = 25.0) -> str:
+        """
+        Writes `num_frames` rendered frames to an mp4 file and returns its path.
+        """
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        out = cv2.VideoWriter(path, fourcc, fps, (self.width, self.height))
+        for i in range(num_frames):
+            out.write(self.render(i))
+        out.release()
+        return path
+
+
+class _Boxes:
+    """Mimics the fields of a YOLO Boxes object that detections_from_result reads."""
+
+    def __init__(self, xyxy, conf):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = np.zeros(len(xyxy), dtype=np.float32)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class BlobDetector:
+    """
+    A stand-in for the YOLO model on SyntheticScene frames, for benchmarks that need
+    no weights.
+
+    Each image is resized to fit `imgsz`, as the model input would be, and every
+    bright blob in it is reported as a person. Blobs shorter than `min_height` input
+    pixels are missed, as a real detector misses small people, and people that touch
+    merge into one blob. Confidence grows with blob height.
+
+    :param imgsz: Model input size.
+    :param min_height: Smallest detectable person height, in input pixels.
+    """
+
+    def __init__(self, imgsz=640, min_height=8):
+        self.imgsz = imgsz
+        self.min_height = min_height
+        self.cache_key = f"blob:{imgsz}:{min_height}"
+
+    def __call__(self, source, **kwargs):
+        results = []
+        for image in source if isinstance(source, list) else [source]:
+            height, width = image.shape[:2]
+            scale = self.imgsz / max(height, width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            mask = (resized[:, :, 0] > 100).astype(np.uint8)
+            _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            stats = stats[1:][stats[1:, cv2.CC_STAT_HEIGHT] >= self.min_height].astype(np.float32)
+            x, y, w, h = (stats[:, i] for i in range(4))
+            xyxy = np.column_stack([x, y, x + w, y + h]) / np.float32(scale)
+            conf = np.clip(0.3 + h / (4 * self.min_height), 0, 0.95)
+            results.append(_Result(_Boxes(xyxy.reshape(-1, 4), conf)))
+        return results
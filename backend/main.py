@@ -1,11 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, WebSocket
+import os
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, WebSocket, Query, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
+from models import get_model, model_stats
 from utils.video_processing import process_video
 from utils.live_detection import router as live_detection_router
-from ultralytics import YOLO
+from utils.jobs import job_manager
+from routes.jobs import (
+    analysis_thresholds, output_options, router as jobs_router, sampling_mode, tiled_inference, tracking_enabled
+)
+from utils.cameras import camera_manager
+from routes.cameras import router as cameras_router
+from utils.timeseries import timeseries_store
+from routes.history import router as history_router
+from utils.zones import zone_config
+from routes.zones import router as zones_router
+from routes.metrics import router as metrics_router
+from utils.metrics import metrics
 from websocket_manager import websocket_manager
+from rich.console import Console
 
+console = Console()
 app = FastAPI()
 
 # Enable CORS middleware to allow all origins, credentials, methods, and headers.
@@ -17,8 +36,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load YOLOv8 Model
-model = YOLO("yolov8n.pt")
+startup_stats = {}
+metrics.gauge(
+    "stampede_startup_seconds", "Time from import to a warmed-up model.", lambda: startup_stats.get("startup_seconds")
+)
+
+
+@app.on_event("startup")
+async def load_models():
+    """
+    Loads the shared YOLO model once and warms it up with a dummy frame, so the
+    first upload or live frame does not pay for it. Startup time and resident
+    memory are recorded and exposed through /models.
+    """
+    handle = await run_in_threadpool(get_model)
+    await run_in_threadpool(handle.warmup)
+    startup_stats["startup_seconds"] = round(time.perf_counter() - _import_started, 3)
+    console.print(f"[bold green]Startup complete in {startup_stats['startup_seconds']}s[/bold green]")
+    # Read the zone layouts now, so a malformed STAMPEDE_ZONES fails at startup
+    zone_config.load()
+    # Start the time-series writer before anything records counts
+    timeseries_store.start()
+    # Start background job workers (resuming jobs interrupted by a restart)
+    await job_manager.start()
+    # Start the shared camera scheduler (and cameras listed in STAMPEDE_CAMERAS)
+    await camera_manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await camera_manager.stop()
+    await job_manager.stop()
+    # Write out the counts still buffered
+    await run_in_threadpool(timeseries_store.stop)
+
+
+@app.get("/models")
+async def loaded_models():
+    """
+    Reports startup time and, for each loaded model, load/warm-up time and memory use.
+    """
+    return {**startup_stats, "models": model_stats()}
 
 
 @app.websocket("/ws")
@@ -26,39 +84,85 @@ async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint to maintain an active connection.
     
-    Sends periodic "keep-alive" messages to the client every 2 seconds.
+    Sends a "keep-alive" message to the client after every 2 idle seconds.
+    Clients may negotiate how frames are streamed by sending:
+
+        {"type": "configure", "binary": true, "preview_width": 640,
+         "quality": 70, "format": "jpeg" | "webp", "send_raw": false}
+
+    In binary mode each frame arrives as a JSON metadata message listing its
+    payloads, followed by one binary message per payload in that order.
+    """
+    await websocket_manager.serve(websocket)
+
+
+@app.get("/ws/stats")
+async def websocket_stats():
+    """
+    Reports connected WebSocket clients with their outbound queue depth and dropped frames.
     """
-    await websocket_manager.connect(websocket)
-    try:
-        while True:
-            # Send a keep-alive message to the client.
-            await websocket.send_json({"message": "WebSocket connection active"})
-            await asyncio.sleep(2)  # Prevent flooding the connection.
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        websocket_manager.disconnect(websocket)
+    return websocket_manager.stats()
 
 
 @app.post("/detect/")
-async def detect_crowd(video: UploadFile = File(...)):
+async def detect_crowd(
+    video: UploadFile = File(...),
+    batch_size: int = Query(1, ge=1, le=64, description="Sampled frames per model call"),
+    thresholds: dict = Depends(analysis_thresholds),
+    sampling: str = Depends(sampling_mode),
+    tracking: bool = Depends(tracking_enabled),
+    tiled: bool = Depends(tiled_inference),
+    output: dict = Depends(output_options),
+):
     """
     Endpoint to process an uploaded video and detect crowd statistics.
+    Processing is limited to 60 seconds (the response is flagged as truncated
+    when that limit is hit); use POST /jobs/ for long videos. Detections are
+    cached by content, so uploading the same video again (e.g. with different
+    thresholds) skips inference.
     
     Returns a JSON response with:
       - Total people detected
       - Average people per frame
       - Processing time in seconds
       - Frame-wise people count
+      - Per-zone moving averages, rolling maxima and time in alert
+      - Average people/m² of zones with a known area
+      - With tracking, tracks created and per-quadrant inflow, outflow and dwell
+      - With tiled inference, the tiles run per frame
+      - Codec, resolution, frame rate, encode speed and size of the heatmap video
       - URL to the heatmap video output
     """
-    results = await process_video(video)
+    results = await process_video(
+        video, batch_size=batch_size, sampling=sampling, tracking=tracking, tiled=tiled, **output, **thresholds
+    )
     return {
         "total_people_detected": results["total_people_detected"],
         "average_people_per_frame": results["average_people_per_frame"],
         "processing_time_seconds": results["processing_time_seconds"],
         "frame_wise_count": results["frame_wise_count"],
-        "heatmap_video_url": f"http://127.0.0.1:8000/videos/output_{video.filename}" 
+        "zone_layout": results["zone_layout"],
+        "avg_zone_density": results["avg_zone_density"],
+        "region_stats": results["region_stats"],
+        "tracking": results["tracking"],
+        "tiling": results["tiling"],
+        "stream_stats": results["stream_stats"],
+        "truncated": results["truncated"],
+        "cache_hit": results["cache_hit"],
+        "sampling": results["sampling"],
+        "output_video": results["output_video"],
+        "heatmap_video_url": f"http://127.0.0.1:8000/videos/{os.path.basename(results['output_video_path'])}"
     }
 
 # Include the live detection router for additional live features.
 app.include_router(live_detection_router)
+# Background analysis jobs with status polling
+app.include_router(jobs_router)
+# Multi-camera ingestion with per-camera result streams
+app.include_router(cameras_router)
+# Historical counts per camera/video and region
+app.include_router(history_router)
+# Configured zone layouts
+app.include_router(zones_router)
+# Prometheus metrics and the optional sampling profiler
+app.include_router(metrics_router)
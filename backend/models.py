@@ -1,8 +1,166 @@
+import os
+import resource
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
 from ultralytics import YOLO
 from rich.console import Console
 
 console = Console()
 
-console.print("[bold cyan]Loading YOLOv8 Model...[/bold cyan]")
-model = YOLO("yolov8n.pt")
-console.print("[bold green]Model Loaded Successfully![/bold green] ✅\n")
+# Defaults can be overridden per deployment through environment variables.
+DEFAULT_WEIGHTS = os.getenv("STAMPEDE_MODEL_WEIGHTS", "yolov8n.pt")
+DEFAULT_DEVICE = os.getenv("STAMPEDE_MODEL_DEVICE", "cpu")
+DEFAULT_IMGSZ = int(os.getenv("STAMPEDE_MODEL_IMGSZ", "640"))
+# "torch" runs the PyTorch weights directly; "onnx" and "openvino" export them once
+# (next to the weights file) and load the exported model for faster CPU inference.
+DEFAULT_BACKEND = os.getenv("STAMPEDE_MODEL_BACKEND", "torch")
+SUPPORTED_BACKENDS = ("torch", "onnx", "openvino")
+
+
+def _rss_mb() -> float:
+    """
+    Returns the current resident set size of this process in megabytes.
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelHandle:
+    """
+    A loaded YOLO model bound to a device and input size.
+
+    Calling the handle runs inference with those settings. The underlying predictor is
+    not thread-safe, so calls are serialised with a lock; every endpoint and worker
+    thread can share a single handle.
+    """
+
+    def __init__(self, model, weights: str, device: str, imgsz: int, backend: str):
+        self.model = model
+        self.weights = weights
+        self.device = device
+        self.imgsz = imgsz
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Any] = {}
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identifies the model's outputs, for caching detections (the device is left out
+        since it does not change them).
+        """
+        return f"{self.weights}:{self.backend}:{self.imgsz}"
+
+    def __call__(self, source, **kwargs):
+        """
+        Runs inference on a frame or a list of frames and returns one result per frame.
+        """
+        kwargs.setdefault("device", self.device)
+        kwargs.setdefault("imgsz", self.imgsz)
+        kwargs.setdefault("verbose", False)
+        with self.lock:
+            return self.model(source, **kwargs)
+
+    def warmup(self):
+        """
+        Runs a dummy frame through the model so the first real request does not pay
+        for predictor setup and lazy backend initialisation.
+        """
+        start = time.perf_counter()
+        self(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+        self.stats["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+
+_models: Dict[Tuple[str, str, int, str], ModelHandle] = {}
+_models_lock = threading.Lock()
+
+
+def _export(weights: str, imgsz: int, backend: str) -> str:
+    """
+    Exports `weights` to the given backend format, reusing a previous export if present.
+
+    :return: Path of the exported model.
+    """
+    stem, _ = os.path.splitext(weights)
+    exported = f"{stem}.onnx" if backend == "onnx" else f"{stem}_openvino_model"
+    if not os.path.exists(exported):
+        console.print(f"[bold cyan]Exporting {weights} to {backend}...[/bold cyan]")
+        exported = YOLO(weights).export(format=backend, imgsz=imgsz)
+    return exported
+
+
+def get_model(
+    weights: Optional[str] = None,
+    device: Optional[str] = None,
+    imgsz: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> ModelHandle:
+    """
+    Returns the shared model for (weights, device, imgsz, backend), loading it on first use.
+
+    :param weights: Path or name of the YOLO weights.
+    :param device: Inference device, e.g. "cpu" or "cuda:0".
+    :param imgsz: Model input size.
+    :param backend: One of SUPPORTED_BACKENDS.
+    :return: The loaded ModelHandle.
+    :raises ValueError: If the backend is not supported.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    device = device or DEFAULT_DEVICE
+    imgsz = imgsz or DEFAULT_IMGSZ
+    backend = backend or DEFAULT_BACKEND
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported model backend '{backend}', expected one of {SUPPORTED_BACKENDS}.")
+
+    key = (weights, device, imgsz, backend)
+    handle = _models.get(key)
+    if handle is not None:
+        return handle
+
+    with _models_lock:
+        # Another thread may have finished loading while we waited for the lock.
+        handle = _models.get(key)
+        if handle is not None:
+            return handle
+
+        console.print(f"[bold cyan]Loading YOLOv8 Model ({weights}, {backend}, {device}, {imgsz})...[/bold cyan]")
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        path = weights if backend == "torch" else _export(weights, imgsz, backend)
+        handle = ModelHandle(YOLO(path, task="detect"), weights, device, imgsz, backend)
+        handle.stats = {
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+        }
+        _models[key] = handle
+        console.print(
+            f"[bold green]Model Loaded Successfully![/bold green] ✅ "
+            f"({handle.stats['load_seconds']}s, +{handle.stats['rss_delta_mb']} MB)\n"
+        )
+        return handle
+
+
+def model_stats() -> List[Dict[str, Any]]:
+    """
+    Returns load/warm-up timings for every loaded model along with the current RSS.
+    """
+    rss = round(_rss_mb(), 1)
+    return [
+        {
+            "weights": handle.weights,
+            "device": handle.device,
+            "imgsz": handle.imgsz,
+            "backend": handle.backend,
+            "process_rss_mb": rss,
+            **handle.stats,
+        }
+        for handle in _models.values()
+    ]
@@ -0,0 +1,76 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from rich.console import Console
+
+from utils.cameras import DEFAULT_CAMERA_FPS, camera_channel, camera_manager
+from websocket_manager import websocket_manager
+
+router = APIRouter(prefix="/cameras", tags=["cameras"])
+console = Console()
+
+
+@router.get("/")
+async def list_cameras():
+    """
+    Lists cameras with their ingestion/analysis rates, plus shared scheduler totals.
+    """
+    return camera_manager.stats()
+
+
+@router.post("/", status_code=201)
+async def add_camera(
+    camera_id: str = Query(..., min_length=1, max_length=64, pattern=r"^[\w.-]+$"),
+    source: str = Query(..., description="URL with an allowed scheme (rtsp by default) or a file in STAMPEDE_CAMERA_SOURCE_DIRS"),
+    fps: float = Query(DEFAULT_CAMERA_FPS, gt=0, le=30, description="Target analysis rate"),
+    loop: Optional[bool] = Query(None, description="Restart local files at the end (default for files)"),
+    zones: Optional[str] = Query(None, description="Zone layout (see STAMPEDE_ZONES); defaults to the one named like the camera"),
+):
+    """
+    Starts ingesting a camera; results are streamed on /cameras/{camera_id}/ws. Other
+    sources (HTTP URLs, device indices, files elsewhere) can only be configured in
+    STAMPEDE_CAMERAS, and the source has to open before the camera is added.
+
+    :raises HTTPException: 409 if the camera id is taken, 429 if the camera limit is reached,
+        403 if the source is not allowed, 400 if it cannot be opened, 404 if the zone layout does not exist.
+    """
+    # Opening the source can take seconds (e.g. an RTSP handshake)
+    camera = await run_in_threadpool(camera_manager.add, camera_id, source, fps, loop, zones)
+    return camera.stats()
+
+
+@router.get("/{camera_id}")
+async def get_camera(camera_id: str):
+    """
+    Returns a camera's status, rates and latest result.
+
+    :raises HTTPException: 404 if the camera does not exist.
+    """
+    camera = camera_manager.cameras.get(camera_id)
+    if camera is None:
+        raise HTTPException(status_code=404, detail="Camera not found.")
+    return camera.stats()
+
+
+@router.delete("/{camera_id}")
+async def remove_camera(camera_id: str):
+    """
+    Stops ingesting a camera.
+
+    :raises HTTPException: 404 if the camera does not exist.
+    """
+    return camera_manager.remove(camera_id).stats()
+
+
+@router.websocket("/{camera_id}/ws")
+async def camera_stream(websocket: WebSocket, camera_id: str):
+    """
+    Streams one camera's analysed frames and alerts. The protocol matches /ws,
+    including "configure" messages; frame metadata also carries the camera_id,
+    capture time and latency.
+    """
+    if camera_id not in camera_manager.cameras:
+        await websocket.close(code=1008)
+        return
+    await websocket_manager.serve(websocket, camera_channel(camera_id))
@@ -0,0 +1,76 @@
+import time
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from utils.timeseries import GLOBAL_REGION, RESOLUTIONS, timeseries_store
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+# Span queried when a request gives no start time, in seconds.
+DEFAULT_SPAN = 3600.0
+
+START_DESCRIPTION = "Unix time, or video seconds for videos; defaults to an hour before end (0 for videos)"
+END_DESCRIPTION = "Unix time, or video seconds for videos; defaults to now (an hour after start for videos)"
+
+
+async def _time_range(source: str, start: Optional[float], end: Optional[float]) -> Tuple[float, float]:
+    if await run_in_threadpool(timeseries_store.is_video_time, source):
+        # Videos are recorded in video time: the first hour of the video by default.
+        start = 0.0 if start is None else start
+        end = start + DEFAULT_SPAN if end is None else end
+    else:
+        end = time.time() if end is None else end
+        start = end - DEFAULT_SPAN if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end.")
+    return start, end
+
+
+@router.get("/")
+async def list_sources():
+    """
+    Lists recorded sources (cameras as "camera:<id>", jobs as "job:<id>", direct
+    uploads as "video:<hash>") with their regions, plus writer statistics.
+
+    Cameras are recorded in Unix time. Jobs and uploads are recorded in video time,
+    seconds from the start of the video ("video_time": true). Times in queries of
+    those sources are video seconds, and the default range is the first hour of the
+    video.
+    """
+    sources = await run_in_threadpool(timeseries_store.sources)
+    return {"sources": sources, "writer": timeseries_store.stats()}
+
+
+@router.get("/{source}/series")
+async def get_series(
+    source: str,
+    region: str = Query(GLOBAL_REGION, description='Quadrant name or "global"'),
+    start: Optional[float] = Query(None, description=START_DESCRIPTION),
+    end: Optional[float] = Query(None, description=END_DESCRIPTION),
+    resolution: str = Query("auto", pattern=f"^(auto|raw|{'|'.join(RESOLUTIONS)})$"),
+    max_points: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Returns a region's counts over a time range: raw samples, or per-bucket mean,
+    minimum, maximum and fraction in danger from the 1s/1m/1h rollups. "auto" picks
+    the finest rollup that fits in max_points.
+    """
+    start, end = await _time_range(source, start, end)
+    return await run_in_threadpool(timeseries_store.series, source, region, start, end, resolution, max_points)
+
+
+@router.get("/{source}/aggregate")
+async def get_aggregate(
+    source: str,
+    region: str = Query(GLOBAL_REGION, description='Quadrant name or "global"'),
+    start: Optional[float] = Query(None, description=START_DESCRIPTION),
+    end: Optional[float] = Query(None, description=END_DESCRIPTION),
+):
+    """
+    Returns a region's mean, minimum and maximum count and fraction of samples in
+    danger over a time range (whole seconds), assembled from the coarsest rollups.
+    """
+    start, end = await _time_range(source, start, end)
+    return await run_in_threadpool(timeseries_store.aggregate, source, region, start, end)
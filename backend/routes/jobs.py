@@ -0,0 +1,182 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from rich.console import Console
+
+from models import get_model
+from utils.detection_cache import DetectionCache, detection_cache
+from utils.jobs import JOB_UPLOAD_DIR, job_manager
+from utils.uploads import save_upload
+from utils.sampling import DEFAULT_SAMPLING, SAMPLING_MODES, make_sampler
+from utils.tiling import detection_key
+from utils.video_processing import reanalyze_cached
+from utils.video_writer import OUTPUT_CODECS
+from utils.zones import zone_config
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+console = Console()
+
+
+def analysis_thresholds(
+    zones: Optional[str] = Query(None, description="Zone layout (see STAMPEDE_ZONES); defaults to the default layout"),
+    num_rows: Optional[int] = Query(None, ge=1, le=32, description="Grid rows, for a grid instead of a zone layout"),
+    num_cols: Optional[int] = Query(None, ge=1, le=32, description="Grid columns, for a grid instead of a zone layout"),
+    max_capacity: Optional[int] = Query(None, ge=0, description="Global capacity threshold; defaults to the layout's"),
+    high_density_threshold: Optional[int] = Query(
+        None, ge=0, description="People per zone that triggers a density alert; defaults to each zone's capacity"
+    ),
+    sudden_change_threshold: int = Query(3, ge=0, description="Change per quadrant within change_window that triggers an alert"),
+    alert_window: float = Query(10.0, gt=0, le=3600, description="Rolling window of the per-quadrant statistics, in seconds"),
+    change_window: float = Query(1.0, gt=0, le=60, description="Window of the sudden change check, in seconds"),
+    alert_debounce: float = Query(0.5, ge=0, le=60, description="Seconds a condition must hold before an alert is raised or cleared"),
+) -> Dict[str, Any]:
+    # Fail before anything is queued if the layout does not exist
+    zone_config.resolve(zones, num_rows, num_cols)
+    return {
+        "zones": zones,
+        "num_rows": num_rows,
+        "num_cols": num_cols,
+        "max_capacity": max_capacity,
+        "high_density_threshold": high_density_threshold,
+        "sudden_change_threshold": sudden_change_threshold,
+        "alert_window": alert_window,
+        "change_window": change_window,
+        "alert_debounce": alert_debounce,
+    }
+
+
+def sampling_mode(
+    sampling: str = Query(
+        DEFAULT_SAMPLING,
+        pattern=f"^({'|'.join(SAMPLING_MODES)})$",
+        description="Analyse every 5th frame (fixed) or pick frames by scene motion (adaptive)",
+    ),
+) -> str:
+    return sampling
+
+
+def tracking_enabled(
+    tracking: bool = Query(False, description="Track people across frames for flow, speed and dwell metrics"),
+) -> bool:
+    return tracking
+
+
+def tiled_inference(
+    tiled: bool = Query(False, description="Also detect on overlapping tiles of crowded zones, for small, distant people"),
+) -> bool:
+    return tiled
+
+
+def output_options(
+    output_codec: Optional[str] = Query(
+        None,
+        pattern=f"^({'|'.join(OUTPUT_CODECS)})$",
+        description="Codec of the heatmap video (h264 needs ffmpeg); defaults to STAMPEDE_OUTPUT_CODEC",
+    ),
+    output_width: Optional[int] = Query(
+        None, ge=0, le=7680, description="Downscale the heatmap video to at most this width; 0 keeps the source width"
+    ),
+) -> Dict[str, Any]:
+    return {"output_codec": output_codec, "output_width": output_width}
+
+
+@router.post("/", status_code=202)
+async def submit_job(
+    video: UploadFile = File(...),
+    batch_size: int = Query(1, ge=1, le=64, description="Sampled frames per model call"),
+    thresholds: Dict[str, Any] = Depends(analysis_thresholds),
+    sampling: str = Depends(sampling_mode),
+    tracking: bool = Depends(tracking_enabled),
+    tiled: bool = Depends(tiled_inference),
+    output: Dict[str, Any] = Depends(output_options),
+):
+    """
+    Saves an uploaded video and queues it for background analysis.
+
+    :return: The job id and its initial status; poll GET /jobs/{job_id} for progress.
+    :raises HTTPException: 503 if the job queue is full.
+    """
+    console.print(f"\n[bold cyan]Receiving video for job:[/bold cyan] {video.filename}")
+    upload = await save_upload(video, directory=JOB_UPLOAD_DIR)
+    job = job_manager.submit(upload, {
+        "batch_size": batch_size, "sampling": sampling, "tracking": tracking, "tiled": tiled, **output, **thresholds
+    })
+    return {"job_id": job["id"], "status": job["status"], "queue_depth": job_manager.queue_depth()}
+
+
+@router.get("/")
+async def list_jobs(status: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """
+    Lists recent jobs (newest first) without their full results.
+    """
+    return [_summary(job) for job in job_manager.store.list(status=status, limit=limit)]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Returns a job's status and progress, plus its results once completed.
+
+    :raises HTTPException: 404 if the job does not exist.
+    """
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {**_summary(job), "result": job["result"]}
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued job, or stops a running one after its current frame.
+
+    :raises HTTPException: 404 if the job does not exist, 409 if it already finished.
+    """
+    return _summary(job_manager.cancel(job_id))
+
+
+@router.post("/{job_id}/reanalyze")
+async def reanalyze_job(
+    job_id: str,
+    thresholds: Dict[str, Any] = Depends(analysis_thresholds),
+    tracking: bool = Depends(tracking_enabled),
+):
+    """
+    Recomputes a finished job's statistics with different zones or thresholds (and
+    optionally tracking) from its cached detections, without running the model
+    again. The stored job result is left unchanged.
+
+    :raises HTTPException: 404 if the job does not exist or its detections are not cached
+        (e.g. it did not complete, was evicted, or the model has changed since).
+    """
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    params = job["params"] or {}
+    # The sampler that produced the cached detections: as reported by the run, else as requested
+    ran = ((job["result"] or {}).get("sampling") or {}).get("mode")
+    sampler = make_sampler(ran or params.get("sampling") or DEFAULT_SAMPLING)
+    # Tiled detections are keyed by the zones that steered the tiling, i.e. the job's own.
+    zones = zone_config.resolve(params.get("zones"), params.get("num_rows"), params.get("num_cols"))
+    model_key = detection_key(get_model(), zones, params.get("tiled", False))
+    key = DetectionCache.key(job["sha256"], model_key, sampler.cache_key)
+    cached = await run_in_threadpool(detection_cache.load, key)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="No cached detections for this job; submit the video again.")
+    result = await run_in_threadpool(reanalyze_cached, cached, tracking, **thresholds)
+    return {**_summary(job), "params": {**params, **thresholds, "tracking": tracking}, "result": result}
+
+
+def _summary(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "progress": job["progress"],
+        "params": job["params"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
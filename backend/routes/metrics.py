@@ -0,0 +1,79 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from models import model_stats
+from utils.cameras import camera_manager
+from utils.jobs import job_manager
+from utils.metrics import metrics
+from utils.profiling import DEFAULT_PROFILE_INTERVAL, MAX_PROFILE_SECONDS, PROFILER_ENABLED, ProfilerBusy, profiler
+from websocket_manager import websocket_manager
+
+router = APIRouter(tags=["metrics"])
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _model_stat(key: str):
+    def collect():
+        return {
+            (stats["weights"], stats["backend"], stats["device"]): stats.get(key)
+            for stats in model_stats()
+        }
+    return collect
+
+
+metrics.gauge(
+    "stampede_websocket_clients", "Connected WebSocket clients.", lambda: len(websocket_manager.clients)
+)
+metrics.gauge(
+    "stampede_websocket_pending_messages", "Messages waiting in the outbound queues of WebSocket clients.",
+    lambda: sum(client.queue_depth for client in list(websocket_manager.clients.values())),
+)
+metrics.gauge("stampede_job_queue_depth", "Analysis jobs waiting for a worker.", job_manager.queue_depth)
+metrics.gauge(
+    "stampede_camera_analysed_fps", "Frames analysed per second for each camera.",
+    lambda: {camera["camera_id"]: camera["analysed_fps"] for camera in camera_manager.stats()["cameras"]},
+    ("camera",),
+)
+metrics.gauge(
+    "stampede_model_load_seconds", "Time taken to load each model.", _model_stat("load_seconds"),
+    ("weights", "backend", "device"),
+)
+metrics.gauge(
+    "stampede_model_warmup_seconds", "Time taken by each model's warm-up inference.", _model_stat("warmup_seconds"),
+    ("weights", "backend", "device"),
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Exposes stage timing histograms (decode, inference, analytics, heatmap, encode,
+    WebSocket send, video write per pipeline), analysed frames and frames per second,
+    internal queue depths, connected clients and model load times in the Prometheus
+    text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/metrics/profile", response_class=PlainTextResponse)
+async def sampling_profile(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS, description="How long to sample"),
+    interval_ms: float = Query(DEFAULT_PROFILE_INTERVAL * 1000, ge=1, le=1000, description="Time between samples"),
+):
+    """
+    Samples the stacks of all server threads for `seconds` and returns them in the
+    collapsed format of flame graph tools, one "thread;file:function;... count" line
+    per distinct stack. Only available with STAMPEDE_PROFILER=1.
+
+    :raises HTTPException: 404 if the profiler is disabled, 409 if a profile is already running.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled; set STAMPEDE_PROFILER=1.")
+    try:
+        stacks = await run_in_threadpool(profiler.profile, seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profiler.collapsed(stacks))
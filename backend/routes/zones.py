@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from utils.zones import zone_config
+
+router = APIRouter(prefix="/zones", tags=["zones"])
+
+
+@router.get("/")
+async def list_layouts():
+    """
+    Lists the zone layouts of STAMPEDE_ZONES (plus the default layout) with their
+    zones' polygons (as fractions of the frame size), capacities and areas.
+    """
+    return [layout.describe() for layout in zone_config.load().values()]
+
+
+@router.get("/{name}")
+async def get_layout(name: str):
+    """
+    Returns one zone layout.
+
+    :raises HTTPException: 404 if no layout has this name.
+    """
+    return zone_config.get(name).describe()
@@ -0,0 +1,93 @@
+import numpy as np
+
+from benchmarks.synthetic import SyntheticScene
+from utils.alert import AlertEngine
+from utils.zones import ZoneLayout
+
+# Exact in binary floating point, so debounce comparisons are not off by a rounding error.
+STEP = 0.25
+
+
+def run(engine, counts, region="q1", start=0):
+    """Feeds per-step counts of one region; returns {step: [(region, kind, active), ...]}."""
+    transitions = {}
+    for step, count in enumerate(counts, start):
+        found = engine.update(step * STEP, {region: count}, count)
+        if found:
+            transitions[step] = [(t.region, t.kind, t.active) for t in found]
+    return transitions
+
+
+def density_engine(**kwargs):
+    # No smoothing and no surge or capacity alerts, so only density transitions show.
+    options = dict(max_capacity=1000, density_threshold=5, change_threshold=1000, ema_halflife=0, debounce=0.5)
+    return AlertEngine(["q1"], **{**options, **kwargs})
+
+
+def test_density_raises_after_debounce():
+    engine = density_engine()
+    transitions = run(engine, [0, 0, 6, 6, 6, 6])
+    # Over the threshold from step 2; raised once it has held for 0.5 s (two steps).
+    assert transitions == {4: [("q1", "density", True)]}
+    assert engine.danger_zones() == ["q1"]
+
+
+def test_short_spikes_are_ignored():
+    engine = density_engine()
+    assert run(engine, [0, 6, 6, 0, 6, 0, 6, 6, 0]) == {}
+    assert engine.active_alerts() == []
+
+
+def test_density_clears_below_hysteresis_only():
+    engine = density_engine()
+    assert run(engine, [6, 6, 6]) == {2: [("q1", "density", True)]}
+    # At the threshold but above 0.8 of it: the alert holds however long it lasts.
+    assert run(engine, [5] * 10 + [4.5] * 10, start=3) == {}
+    assert engine.danger_zones() == ["q1"]
+    # At 0.8 of the threshold it clears after the debounce, unless the value bounces back first.
+    assert run(engine, [4, 4, 6, 4, 4, 4], start=23) == {28: [("q1", "density", False)]}
+    assert engine.danger_zones() == []
+
+
+def test_zero_debounce_flips_immediately():
+    engine = density_engine(debounce=0)
+    assert run(engine, [0, 6, 5, 4, 6]) == {
+        1: [("q1", "density", True)],
+        3: [("q1", "density", False)],
+        4: [("q1", "density", True)],
+    }
+
+
+def test_surge_and_capacity():
+    engine = AlertEngine(["q1"], max_capacity=8, density_threshold=100, change_threshold=3,
+                         change_window=1.0, ema_halflife=0, debounce=0.5)
+    transitions = run(engine, [0] * 4 + [10] * 12)
+    # Both conditions start at step 4 and are raised two steps later. The jump leaves the
+    # 1 s change window at step 8, so the surge clears two steps after that; the crowd stays.
+    assert transitions == {
+        6: [("q1", "surge", True), ("global", "capacity", True)],
+        10: [("q1", "surge", False)],
+    }
+    assert engine.active_alerts() == [("global", "capacity")]
+    assert engine.danger_zones() == []
+
+
+def test_synthetic_crowd_raises_and_clears_once():
+    # Forty people arrive over the first 4 s and the last thirty leave after 12 s, at 25 fps.
+    num_people, fps = 40, 25
+    arrivals = np.linspace(0, 4 * fps, num_people).astype(int)
+    departures = np.where(np.arange(num_people) >= 10, 12 * fps, np.inf)
+    scene = SyntheticScene(num_people=num_people, speed=3.0, seed=1, arrivals=arrivals, departures=departures)
+    layout = ZoneLayout.from_grid(3, 4)
+    engine = AlertEngine(layout.names, max_capacity=30, density_threshold=layout.capacities,
+                         change_threshold=1000, debounce=0.5)
+    raised, cleared = [], []
+    for frame_index in range(0, 20 * fps, 5):
+        boxes = scene.boxes(frame_index)
+        for transition in engine.update(frame_index / fps, layout.counts(boxes, scene.width, scene.height), len(boxes)):
+            if transition.region == "global":
+                (raised if transition.active else cleared).append(transition.timestamp)
+    assert len(raised) == 1 and len(cleared) == 1
+    # Raised once the smoothed count passes 30 (after the 30th arrival at 3 s), cleared after the departures.
+    assert 3.0 < raised[0] < 6.0
+    assert 12.0 < cleared[0] < 16.0
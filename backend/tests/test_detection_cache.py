@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import BlobDetector, SyntheticScene
+from utils.analytics import detections_from_result
+from utils.detection_cache import DetectionCache, pack_detections
+
+
+@pytest.fixture(scope="module")
+def cached_video():
+    scene = SyntheticScene(num_people=25, seed=5, arrivals=np.arange(25) * 2)
+    detector = BlobDetector()
+    frames = [(i, detections_from_result(detector(scene.render(i))[0])) for i in range(0, 50, 5)]
+    return frames, pack_detections(frames, scene.width, scene.height, 25.0, 50)
+
+
+def test_pack_detections(cached_video):
+    frames, cached = cached_video
+    assert cached.by_frame_index() == {frame_index: i for i, (frame_index, _) in enumerate(frames)}
+    for (frame_index, detections), (packed_index, packed) in zip(frames, cached.frames()):
+        assert packed_index == frame_index
+        np.testing.assert_array_equal(packed.xyxy, detections.xyxy.astype(np.float32))
+        np.testing.assert_array_equal(packed.cls, detections.cls)
+        np.testing.assert_array_equal(packed.conf, detections.conf.astype(np.float32))
+
+
+def test_save_load_round_trip(tmp_path, cached_video):
+    _, cached = cached_video
+    cache = DetectionCache(str(tmp_path))
+    key = DetectionCache.key("0" * 64, "blob:640:8", "fixed:5")
+    assert cache.load(key) is None
+    cache.save(key, cached)
+    loaded = cache.load(key)
+    assert loaded is not None
+    for name, value in cached._asdict().items():
+        np.testing.assert_array_equal(getattr(loaded, name), value, err_msg=name)
+    assert loaded.conf.dtype == np.float32
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_keys_differ_by_model_and_sampling():
+    keys = {
+        DetectionCache.key("a" * 64, "blob:640:8", "fixed:5"),
+        DetectionCache.key("b" * 64, "blob:640:8", "fixed:5"),
+        DetectionCache.key("a" * 64, "blob:320:8", "fixed:5"),
+        DetectionCache.key("a" * 64, "blob:640:8", "adaptive:2:15:40:16"),
+    }
+    assert len(keys) == 4
+
+
+def test_evicts_least_recently_used(tmp_path, cached_video):
+    _, cached = cached_video
+    probe = DetectionCache(str(tmp_path / "probe"))
+    probe.save("size", cached)
+    entry_size = os.path.getsize(os.path.join(probe.directory, "size.npz"))
+
+    cache = DetectionCache(str(tmp_path / "cache"), max_bytes=3 * entry_size)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.save(key, cached)
+        # mtimes an hour apart, so the order does not depend on the filesystem's timestamp resolution
+        os.utime(cache._path(key), (1000 + 3600 * i, 1000 + 3600 * i))
+    # Reading "a" makes it the most recently used, so "b" is evicted when "d" is added.
+    assert cache.load("a") is not None
+    cache.save("d", cached)
+    assert cache.load("b") is None
+    for key in ("a", "c", "d"):
+        assert cache.load(key) is not None
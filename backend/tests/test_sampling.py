@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.synthetic import SyntheticScene
+from utils.sampling import AdaptiveSampler, FixedSampler, make_sampler
+
+
+def sample(sampler, scene, num_frames):
+    """Walks a clip the way FramePipeline does; returns the decoded and the inferred frame indices."""
+    decoded, inferred = [], []
+    for frame_index in range(num_frames):
+        if not sampler.decode(frame_index):
+            continue
+        decoded.append(frame_index)
+        if sampler.infer(frame_index, scene.render(frame_index)):
+            inferred.append(frame_index)
+    sampler.decode(num_frames)
+    return decoded, inferred
+
+
+@pytest.mark.parametrize("frame_skip", [1, 5, 7])
+def test_fixed_sampler_takes_every_nth_frame(frame_skip):
+    sampler = FixedSampler(frame_skip)
+    decoded, inferred = sample(sampler, SyntheticScene(num_people=5, seed=2), 60)
+    assert decoded == inferred == list(range(0, 60, frame_skip))
+    stats = sampler.stats()
+    assert stats["frames"] == 60
+    assert stats["inferred_frames"] == stats["baseline_inferred_frames"] == len(inferred)
+    assert stats["inference_saved"] == 0
+
+
+def test_adaptive_sampler_refreshes_a_static_scene():
+    scene = SyntheticScene(num_people=10, speed=0, seed=2)
+    sampler = AdaptiveSampler(min_interval=3, max_interval=15)
+    decoded, inferred = sample(sampler, scene, 100)
+    assert inferred == list(range(0, 100, 15))
+    # Only probes every min_interval frames after an analysed frame are decoded.
+    assert decoded == list(range(0, 100, 3))
+    assert sampler.stats()["inference_saved"] == 20 - len(inferred)
+
+
+def test_adaptive_sampler_follows_arrivals():
+    arrivals = [0, 0, 0, 23, 41, 42, 77]
+    scene = SyntheticScene(num_people=len(arrivals), person_size=(60, 120), speed=0, seed=4, arrivals=arrivals)
+    sampler = AdaptiveSampler(min_interval=3, max_interval=30)
+    _, inferred = sample(sampler, scene, 100)
+    # Every arrival is analysed by the next probe, at most min_interval frames later.
+    for arrival in set(arrivals) - {0}:
+        assert any(arrival <= i < arrival + 3 for i in inferred), (arrival, inferred)
+    # Otherwise the scene is still, so it is only refreshed every max_interval frames.
+    assert len(inferred) <= 1 + 4 + 100 // 30
+
+
+def test_make_sampler():
+    assert make_sampler("fixed", frame_skip=3).cache_key == "fixed:3"
+    assert isinstance(make_sampler("adaptive"), AdaptiveSampler)
+    with pytest.raises(ValueError):
+        make_sampler("every-frame")
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticScene
+from utils.analytics import compute_quadrant_counts
+from utils.zones import ZoneLayout
+
+WIDTH, HEIGHT = 640, 360
+
+
+def scene_boxes(num_frames=20):
+    scene = SyntheticScene(num_people=150, width=WIDTH, height=HEIGHT, person_size=(18, 40), speed=6.0, seed=3)
+    return [scene.boxes(i) for i in range(0, 10 * num_frames, 10)]
+
+
+def grid_counts(boxes, width, height, num_rows, num_cols):
+    """One box at a time, as the grid was counted before label lookups."""
+    counts = {f"q{i}": 0 for i in range(1, num_rows * num_cols + 1)}
+    for x1, y1, x2, y2 in boxes.astype(np.int32).tolist():
+        col = min(int((x1 + x2) / 2 / (width / num_cols)), num_cols - 1)
+        row = min(int((y1 + y2) / 2 / (height / num_rows)), num_rows - 1)
+        counts[f"q{row * num_cols + col + 1}"] += 1
+    return counts
+
+
+@pytest.mark.parametrize("num_rows, num_cols", [(3, 4), (1, 1), (5, 7)])
+def test_grid_counts_match_brute_force(num_rows, num_cols):
+    layout = ZoneLayout.from_grid(num_rows, num_cols)
+    for boxes in scene_boxes():
+        expected = grid_counts(boxes, WIDTH, HEIGHT, num_rows, num_cols)
+        assert layout.counts(boxes, WIDTH, HEIGHT) == expected
+        assert compute_quadrant_counts(boxes, WIDTH, HEIGHT, num_rows, num_cols) == expected
+
+
+def test_grid_counts_every_box_once():
+    layout = ZoneLayout.from_grid(3, 4)
+    for boxes in scene_boxes():
+        assert sum(layout.counts(boxes, WIDTH, HEIGHT).values()) == len(boxes)
+
+
+def test_polygon_counts_match_brute_force():
+    # Overlapping zones (the first listed wins) and a gap covered by no zone.
+    layout = ZoneLayout.from_config("test", {
+        "frame_size": [WIDTH, HEIGHT],
+        "zones": [
+            {"name": "gate", "polygon": [[200, 50], [440, 50], [440, 250], [200, 250]]},
+            {"name": "left", "polygon": [[0, 0], [320, 0], [320, 360], [0, 360]]},
+            {"name": "ramp", "polygon": [[400, 360], [640, 100], [640, 360]]},
+        ],
+    })
+    polygons = [(zone.polygon * (WIDTH, HEIGHT)).astype(np.float32) for zone in layout.zones]
+    compared = 0
+    for boxes in scene_boxes():
+        boxes = boxes.astype(np.int32)
+        centers = [((x1 + x2) // 2, (y1 + y2) // 2) for x1, y1, x2, y2 in boxes.tolist()]
+        # Rasterisation may go either way right on an edge, so only compare centers clear of every edge.
+        clear = [
+            all(abs(cv2.pointPolygonTest(polygon, center, True)) > 2 for polygon in polygons)
+            for center in centers
+        ]
+        expected = {name: 0 for name in layout.names}
+        for center, keep in zip(centers, clear):
+            if not keep:
+                continue
+            for name, polygon in zip(layout.names, polygons):
+                if cv2.pointPolygonTest(polygon, center, False) > 0:
+                    expected[name] += 1
+                    break
+        assert layout.counts(boxes[clear], WIDTH, HEIGHT) == expected
+        compared += sum(clear)
+    assert compared > 1000
+
+
+def test_counts_at_other_resolutions():
+    layout = ZoneLayout.from_grid(3, 4)
+    boxes = scene_boxes(1)[0]
+    for scale in (0.5, 2.0, 3.0):
+        width, height = int(WIDTH * scale), int(HEIGHT * scale)
+        scaled = boxes * np.float32(scale)
+        assert layout.counts(scaled, width, height) == grid_counts(scaled, width, height, 3, 4)
@@ -1,15 +1,23 @@
+import math
+import queue
+import threading
+from collections import deque
 from rich.console import Console
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple, Union
 
 console = Console()
 
+# Frame rate assumed for videos that do not report one, to convert frame indices to seconds.
+DEFAULT_VIDEO_FPS = 30.0
+
 def check_overcrowding(
     people_count: int,
     max_capacity: int,
     quadrant_counts: Optional[Dict[str, int]] = None,
     quadrant_threshold: Optional[int] = None,
     quadrant_deltas: Optional[Dict[str, int]] = None,
-    scatter_threshold: Optional[int] = None
+    scatter_threshold: Optional[int] = None,
+    verbose: bool = True
 ) -> Dict[str, Any]:
     """
     Check for overall and quadrant-specific overcrowding.
@@ -25,6 +33,7 @@ def check_overcrowding(
     :param quadrant_threshold: Threshold for people count in a quadrant.
     :param quadrant_deltas: Dictionary with changes in people count per quadrant (from previous frame).
     :param scatter_threshold: Threshold for rapid changes in quadrant counts.
+    :param verbose: Print alerts to the console (disabled when replaying cached detections).
     :return: Dictionary containing global alert status/message and quadrant-specific alerts.
     """
     # Global overcrowding check
@@ -33,7 +42,8 @@ def check_overcrowding(
         global_message = (
             f"Overcrowding detected! {people_count} people detected, exceeding limit of {max_capacity}."
         )
-        console.print(f"[bold red]⚠️ ALERT! {global_message}[/bold red]")
+        if verbose:
+            console.print(f"[bold red]⚠️ ALERT! {global_message}[/bold red]")
     else:
         global_alert = False
         global_message = f"Safe: {people_count} people detected (limit: {max_capacity})."
@@ -49,7 +59,8 @@ def check_overcrowding(
             if count > quadrant_threshold:
                 alert = True
                 msg = f"Alert: {count} people in {quadrant}, exceeding threshold of {quadrant_threshold}."
-                console.print(f"[bold red]⚠️ ALERT! {msg}[/bold red]")
+                if verbose:
+                    console.print(f"[bold red]⚠️ ALERT! {msg}[/bold red]")
                 messages.append(msg)
             
             # Check for rapid change if delta info is provided
@@ -58,7 +69,8 @@ def check_overcrowding(
                 if abs(delta) > scatter_threshold:
                     alert = True
                     msg = f"Warning: Rapid change in {quadrant} with a difference of {delta} people."
-                    console.print(f"[bold yellow]⚠️ WARNING! {msg}[/bold yellow]")
+                    if verbose:
+                        console.print(f"[bold yellow]⚠️ WARNING! {msg}[/bold yellow]")
                     messages.append(msg)
             
             # Set the message based on alerts, or provide a safe message if none
@@ -70,3 +82,288 @@ def check_overcrowding(
         "global_message": global_message,
         "quadrant_alerts": quadrant_alerts
     }
+
+
+class AlertTransition(NamedTuple):
+    """
+    An alert being raised or cleared.
+
+    :param timestamp: Time of the update that caused the transition, in seconds.
+    :param region: Quadrant id, or "global" for the whole frame.
+    :param kind: "capacity" (global), "density" or "surge" (per quadrant).
+    :param active: True when the alert is raised, False when it clears.
+    :param value: The smoothed count (capacity/density) or the change over the change window (surge).
+    :param threshold: The threshold the value was compared with.
+    """
+    timestamp: float
+    region: str
+    kind: str
+    active: bool
+    value: float
+    threshold: float
+
+    @property
+    def message(self) -> str:
+        state = "ALERT" if self.active else "Cleared"
+        if self.kind == "capacity":
+            return f"{state}: {self.value:.1f} people in the frame (limit {self.threshold:g})."
+        if self.kind == "density":
+            return f"{state}: {self.value:.1f} people in {self.region} (threshold {self.threshold:g})."
+        return f"{state}: rapid change of {self.value:+.0f} people in {self.region} (threshold {self.threshold:g})."
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**self._asdict(), "value": round(self.value, 2), "message": self.message}
+
+
+class RollingWindow:
+    """
+    Mean, maximum and change of a time series over the last `window` seconds.
+
+    Samples are kept in a deque with a running sum, and the maximum in a monotonic
+    deque, so each update costs amortised O(1) however long the window is.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._samples = deque()
+        self._maxima = deque()
+        self._sum = 0.0
+
+    def add(self, timestamp: float, value: float):
+        self._samples.append((timestamp, value))
+        self._sum += value
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((timestamp, value))
+        horizon = timestamp - self.window
+        # The newest sample always stays, so the window is never empty.
+        while len(self._samples) > 1 and self._samples[0][0] < horizon:
+            self._sum -= self._samples.popleft()[1]
+        while self._maxima[0][0] < horizon:
+            self._maxima.popleft()
+
+    @property
+    def mean(self) -> float:
+        return self._sum / len(self._samples) if self._samples else 0.0
+
+    @property
+    def max(self) -> float:
+        return self._maxima[0][1] if self._maxima else 0.0
+
+    @property
+    def change(self) -> float:
+        """Newest minus oldest value in the window."""
+        return self._samples[-1][1] - self._samples[0][1] if self._samples else 0.0
+
+    @property
+    def rate(self) -> float:
+        """Change per second across the window."""
+        if len(self._samples) < 2:
+            return 0.0
+        return self.change / max(self._samples[-1][0] - self._samples[0][0], 1e-9)
+
+
+class _Debounced:
+    """
+    A boolean alert state with hysteresis and debouncing: it only flips once the
+    opposite condition has held for `debounce` seconds.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self.active = False
+        self.active_seconds = 0.0
+        self._pending_since: Optional[float] = None
+        self._last_timestamp: Optional[float] = None
+
+    def update(self, timestamp: float, raise_condition: bool, clear_condition: bool) -> bool:
+        """
+        :return: True if the state flipped on this update.
+        """
+        if self.active and self._last_timestamp is not None:
+            self.active_seconds += timestamp - self._last_timestamp
+        self._last_timestamp = timestamp
+
+        wants_flip = clear_condition if self.active else raise_condition
+        if not wants_flip:
+            self._pending_since = None
+            return False
+        if self._pending_since is None:
+            self._pending_since = timestamp
+        if timestamp - self._pending_since >= self.debounce:
+            self.active = not self.active
+            self._pending_since = None
+            return True
+        return False
+
+
+class AlertEngine:
+    """
+    Incremental crowd statistics and alerting over a stream of per-frame counts.
+
+    Every update costs O(1) per region. For each quadrant (and the whole frame) it keeps
+    an exponential moving average of the count, the rolling mean and maximum over
+    `window` seconds and the change over the last `change_window` seconds. Alerts are
+    evaluated on those instead of on single frames:
+
+    - capacity: the smoothed total exceeds `max_capacity`.
+    - density:  a quadrant's smoothed count exceeds its `density_threshold`.
+    - surge:    a quadrant's smoothed count changed by more than `change_threshold` people within `change_window`.
+
+    An alert clears once its value falls to `hysteresis` times the threshold, and
+    raising or clearing only happens after the condition has held for `debounce`
+    seconds, so counts hovering around a threshold do not flap. update() returns only
+    the transitions; nothing is printed here (see AlertLog).
+
+    :param regions: Quadrant ids.
+    :param max_capacity: Global capacity threshold.
+    :param density_threshold: People per quadrant that raises a density alert, or a
+        threshold per quadrant (e.g. ZoneLayout.capacities).
+    :param change_threshold: Change per quadrant within `change_window` that raises a surge alert.
+    :param window: Length of the rolling mean/maximum window in seconds.
+    :param change_window: Length of the rate-of-change window in seconds.
+    :param ema_halflife: Half-life of the moving average in seconds.
+    :param hysteresis: Fraction of a threshold an alert's value has to fall to before it clears.
+    :param debounce: Seconds a condition has to hold before an alert is raised or cleared.
+    """
+
+    def __init__(
+        self,
+        regions: List[str],
+        max_capacity: float = 50,
+        density_threshold: Union[float, Dict[str, float]] = 5,
+        change_threshold: float = 3,
+        window: float = 10.0,
+        change_window: float = 1.0,
+        ema_halflife: float = 1.0,
+        hysteresis: float = 0.8,
+        debounce: float = 0.5,
+    ):
+        self.regions = list(regions)
+        self.max_capacity = max_capacity
+        self.density_threshold = density_threshold
+        self._density_thresholds = (
+            dict(density_threshold) if isinstance(density_threshold, dict)
+            else {region: density_threshold for region in self.regions}
+        )
+        self.change_threshold = change_threshold
+        self.ema_halflife = ema_halflife
+        self.hysteresis = hysteresis
+        self.updates = 0
+        self._names = self.regions + ["global"]
+        self._ema = {name: None for name in self._names}
+        self._windows = {name: RollingWindow(window) for name in self._names}
+        self._changes = {name: RollingWindow(change_window) for name in self._names}
+        self._states = {("global", "capacity"): _Debounced(debounce)}
+        for region in self.regions:
+            self._states[(region, "density")] = _Debounced(debounce)
+            self._states[(region, "surge")] = _Debounced(debounce)
+        self._last_timestamp: Optional[float] = None
+        self._first_timestamp: Optional[float] = None
+
+    def _check(self, transitions, timestamp, region, kind, value, threshold):
+        state = self._states[(region, kind)]
+        if state.update(timestamp, abs(value) > threshold, abs(value) <= threshold * self.hysteresis):
+            transitions.append(AlertTransition(timestamp, region, kind, state.active, value, threshold))
+
+    def update(self, timestamp: float, quadrant_counts: Dict[str, int], people_count: int) -> List[AlertTransition]:
+        """
+        Adds one analysed frame.
+
+        :param timestamp: Time of the frame in seconds (video time or wall clock), non-decreasing.
+        :param quadrant_counts: People per quadrant.
+        :param people_count: People in the frame.
+        :return: Alerts raised or cleared by this frame.
+        """
+        if self._last_timestamp is None:
+            self._first_timestamp = timestamp
+            alpha = 1.0
+        elif self.ema_halflife > 0:
+            alpha = 1.0 - math.pow(0.5, max(timestamp - self._last_timestamp, 0.0) / self.ema_halflife)
+        else:
+            alpha = 1.0
+        transitions: List[AlertTransition] = []
+        for name in self._names:
+            value = people_count if name == "global" else quadrant_counts.get(name, 0)
+            previous = self._ema[name]
+            ema = value if previous is None else previous + alpha * (value - previous)
+            self._ema[name] = ema
+            self._windows[name].add(timestamp, value)
+            # Surges are measured on the smoothed count so single noisy frames do not trigger them.
+            self._changes[name].add(timestamp, ema)
+            if name == "global":
+                self._check(transitions, timestamp, name, "capacity", ema, self.max_capacity)
+            else:
+                self._check(transitions, timestamp, name, "density", ema, self._density_thresholds[name])
+                self._check(transitions, timestamp, name, "surge", self._changes[name].change, self.change_threshold)
+        self._last_timestamp = timestamp
+        self.updates += 1
+        return transitions
+
+    def active_alerts(self) -> List[Tuple[str, str]]:
+        """
+        Returns the (region, kind) of every currently raised alert.
+        """
+        return [key for key, state in self._states.items() if state.active]
+
+    def danger_zones(self) -> List[str]:
+        """
+        Returns the quadrants with at least one raised alert, in grid order.
+        """
+        return [region for region in self.regions if self._states[(region, "density")].active or self._states[(region, "surge")].active]
+
+    def region_stats(self, region: str) -> Dict[str, float]:
+        """
+        Returns a region's current moving average, rolling mean/maximum and rate of
+        change (people per second), plus the fraction of time it has been in alert.
+        """
+        window = self._windows[region]
+        elapsed = (self._last_timestamp or 0.0) - (self._first_timestamp or 0.0)
+        kinds = ("capacity",) if region == "global" else ("density", "surge")
+        # Time with any alert raised is approximated by the longest-raised kind.
+        active_seconds = max(self._states[(region, kind)].active_seconds for kind in kinds)
+        return {
+            "ema": round(self._ema[region] or 0.0, 3),
+            "mean": round(window.mean, 3),
+            "max": window.max,
+            "rate_per_second": round(self._changes[region].rate, 3),
+            "alert_fraction": round(active_seconds / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {name: self.region_stats(name) for name in self._names}
+
+
+class AlertLog:
+    """
+    Prints alert transitions on a background thread, so the processing loop only
+    pays for a queue put, and only when an alert is raised or cleared.
+    """
+
+    def __init__(self):
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def emit(self, transitions: List[AlertTransition], source: str = ""):
+        if not transitions:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._print, name="alert-log", daemon=True)
+                    self._thread.start()
+        self._queue.put((source, transitions))
+
+    def _print(self):
+        while True:
+            source, transitions = self._queue.get()
+            prefix = f"[{source}] " if source else ""
+            for transition in transitions:
+                if transition.active:
+                    console.print(f"[bold red]⚠️ {prefix}{transition.message}[/bold red]")
+                else:
+                    console.print(f"[bold green]{prefix}{transition.message}[/bold green]")
+
+
+alert_log = AlertLog()
@@ -0,0 +1,506 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+from rich.console import Console
+
+from models import get_model
+from utils.alert import AlertEngine, alert_log
+from utils.analytics import HeatmapRenderer, detections_from_result, person_boxes
+from utils.metrics import count_frames, record_stage, stage_timer
+from utils.streaming import encode_for_clients
+from utils.timeseries import timeseries_store
+from utils.zones import zone_config
+from websocket_manager import websocket_manager
+
+console = Console()
+
+# Optional JSON file listing cameras to start with the server:
+# [{"camera_id": "gate-1", "source": "rtsp://...", "fps": 5, "zones": "gate-1"}, ...]
+CAMERAS_FILE = os.getenv("STAMPEDE_CAMERAS")
+# Most camera frames sent through the model in one call.
+CAMERA_BATCH_SIZE = int(os.getenv("STAMPEDE_CAMERA_BATCH_SIZE", "8"))
+# Threads rendering overlays and encoding results while the next batch is detected.
+CAMERA_WORKERS = int(os.getenv("STAMPEDE_CAMERA_WORKERS", "2"))
+DEFAULT_CAMERA_FPS = 5.0
+# Most cameras ingested at once; each has a capture thread.
+MAX_CAMERAS = int(os.getenv("STAMPEDE_MAX_CAMERAS", "16"))
+
+# Sources cameras added through the API may use; cameras from STAMPEDE_CAMERAS are
+# trusted. URL schemes (comma-separated) and directories of local files (separated
+# like PATH). HTTP(S) and device indices are operator-only by default; allowing http
+# lets API clients make the server fetch internal URLs.
+CAMERA_URL_SCHEMES = tuple(
+    scheme.strip().lower() for scheme in os.getenv("STAMPEDE_CAMERA_URL_SCHEMES", "rtsp,rtsps").split(",") if scheme.strip()
+)
+CAMERA_SOURCE_DIRS = tuple(
+    os.path.realpath(directory) for directory in os.getenv("STAMPEDE_CAMERA_SOURCE_DIRS", "").split(os.pathsep) if directory
+)
+
+# Seconds between reconnection attempts of a live source, doubling up to the maximum.
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+def source_allowed(source: str) -> bool:
+    """
+    Returns whether an API client may use `source`: a URL with one of CAMERA_URL_SCHEMES,
+    or an existing file inside one of CAMERA_SOURCE_DIRS.
+    """
+    scheme = urlparse(source).scheme.lower()
+    if scheme and len(scheme) > 1:
+        # (a one-letter scheme is a Windows drive)
+        return scheme in CAMERA_URL_SCHEMES
+    path = os.path.realpath(source)
+    return os.path.isfile(path) and any(
+        os.path.commonpath([path, directory]) == directory for directory in CAMERA_SOURCE_DIRS
+    )
+
+
+def source_opens(source: str) -> bool:
+    """
+    Returns whether cv2.VideoCapture can open `source`. Blocks while it connects.
+    """
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    try:
+        return cap.isOpened()
+    finally:
+        cap.release()
+
+
+def camera_channel(camera_id: str) -> str:
+    """
+    Returns the websocket_manager channel a camera's results are published on.
+    """
+    return f"camera:{camera_id}"
+
+
+class CameraStream:
+    """
+    Reads one video source on its own thread and keeps only its newest sampled frame.
+
+    The capture is drained continuously with grab(), so a live source never lags behind
+    real time, but frames are only retrieved (converted to BGR) at the camera's target
+    `fps`. A sampled frame waits in a single slot until the scheduler takes it; a newer
+    sample replaces it and the stale one is counted as dropped, so memory per camera is
+    bounded whatever the inference load.
+
+    Local files are read at their own frame rate, as if they were live, and loop by
+    default; other sources (RTSP/HTTP URLs, device indices) are reconnected when they fail.
+
+    :param camera_id: Unique name of the camera.
+    :param source: Anything cv2.VideoCapture opens: a URL, a file path or a device index.
+    :param fps: Target analysis rate of this camera.
+    :param loop: Restart local files at the end; defaults to True for files.
+    :param zones: Zone layout of the camera's view; defaults to the layout named like the
+        camera, if STAMPEDE_ZONES has one, or else the default layout.
+    :raises HTTPException: 404 if the named zone layout does not exist.
+    """
+
+    def __init__(
+        self, camera_id: str, source: str, fps: float = DEFAULT_CAMERA_FPS, loop: Optional[bool] = None,
+        zones: Optional[str] = None,
+    ):
+        self.camera_id = camera_id
+        self.source = source
+        self.fps = fps
+        self.is_file = os.path.isfile(source)
+        self.loop = self.is_file if loop is None else loop
+        self.channel = camera_channel(camera_id)
+        self.zones = zone_config.get(zones) if zones else zone_config.find(camera_id) or zone_config.get()
+        self.status = "starting"
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.frames_dropped = 0
+        self.frames_analysed = 0
+        self.last_result: Dict[str, Any] = {}
+        # Rolling statistics and alert state over wall-clock time; only updated by the
+        # camera's one in-flight publish, so it needs no lock.
+        self.alerts = AlertEngine(
+            self.zones.names, max_capacity=self.zones.max_capacity, density_threshold=self.zones.capacities
+        )
+        # True while a taken frame is still being analysed; the scheduler skips the camera meanwhile.
+        self.busy = False
+        self._slot: Optional[Tuple[np.ndarray, float]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started_at = time.monotonic()
+        self._on_frame = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, on_frame=None):
+        """
+        Starts the reader thread; `on_frame` is called (on that thread) after each new sample.
+        """
+        self._on_frame = on_frame
+        self._thread = threading.Thread(target=self._read, name=f"camera-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def take(self) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Removes and returns the pending (frame, captured_at) sample, if any.
+        """
+        with self._lock:
+            sample, self._slot = self._slot, None
+        return sample
+
+    @property
+    def has_frame(self) -> bool:
+        return self._slot is not None
+
+    def _open(self) -> Optional[cv2.VideoCapture]:
+        source = int(self.source) if self.source.isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if cap.isOpened():
+            return cap
+        cap.release()
+        return None
+
+    def _read(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                self.status = "reconnecting"
+                console.print(f"[bold yellow]Camera {self.camera_id}: cannot open source, retrying in {delay:.0f}s[/bold yellow]")
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            self.status = "streaming"
+            try:
+                ended = self._drain(cap)
+            finally:
+                cap.release()
+            if ended:
+                self.status = "ended"
+                return
+            if not self._stop.is_set():
+                self.status = "reconnecting"
+                self._stop.wait(delay)
+        self.status = "stopped"
+
+    def _drain(self, cap: cv2.VideoCapture) -> bool:
+        """
+        Reads from an opened capture until it fails or the camera stops.
+
+        :return: True if a non-looping file reached its end.
+        """
+        # Files are paced at their own frame rate; live sources pace themselves.
+        source_fps = cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        frame_interval = 1.0 / source_fps if source_fps and source_fps > 0 else 0.0
+        sample_interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_frame = next_sample = time.monotonic()
+        rewound = False
+        while not self._stop.is_set():
+            if frame_interval:
+                wait = next_frame - time.monotonic()
+                if wait > 0:
+                    self._stop.wait(wait)
+                next_frame = max(next_frame + frame_interval, time.monotonic() - frame_interval)
+
+            if not cap.grab():
+                if self.is_file and self.loop and not rewound:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    rewound = True
+                    continue
+                return self.is_file
+            rewound = False
+            self.frames_read += 1
+
+            now = time.monotonic()
+            if now < next_sample:
+                continue
+            next_sample = max(next_sample + sample_interval, now)
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            with self._lock:
+                if self._slot is not None:
+                    self.frames_dropped += 1
+                self._slot = (frame, time.time())
+            self.frames_sampled += 1
+            if self._on_frame is not None:
+                self._on_frame()
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self._started_at, 1e-6)
+        return {
+            "camera_id": self.camera_id,
+            "source": self.source,
+            "status": self.status,
+            "target_fps": self.fps,
+            "analysed_fps": round(self.frames_analysed / elapsed, 2),
+            "frames_read": self.frames_read,
+            "frames_sampled": self.frames_sampled,
+            "frames_dropped": self.frames_dropped,
+            "frames_analysed": self.frames_analysed,
+            "channel": self.channel,
+            "zones": self.zones.name,
+            "last_result": self.last_result,
+            "active_alerts": [f"{region}:{kind}" for region, kind in self.alerts.active_alerts()],
+        }
+
+
+class CameraManager:
+    """
+    Ingests many cameras and shares one model between them.
+
+    A single scheduler thread repeatedly collects the pending samples of up to
+    `batch_size` cameras, visiting cameras round-robin from where the previous batch
+    stopped, and runs them through the model in one call. When the model cannot keep
+    up with every camera's target fps, each camera therefore gets an equal share of
+    the inference capacity and its older samples are dropped instead of queued.
+
+    Detections are turned into statistics, overlays and encoded frames on a small
+    worker pool while the next batch runs, then published to each camera's
+    websocket_manager channel. A camera has at most one sample in flight, so at any
+    time there are at most two frames per camera in memory.
+
+    :param batch_size: Most camera frames per model call.
+    :param workers: Threads preparing results for publishing.
+    :param model: Callable running detection on a list of frames; defaults to the shared model.
+    """
+
+    def __init__(self, batch_size: int = CAMERA_BATCH_SIZE, workers: int = CAMERA_WORKERS, model=None):
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.model = model
+        self.cameras: Dict[str, CameraStream] = {}
+        self.batches = 0
+        self.batched_frames = 0
+        self.inference_seconds = 0.0
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heatmap_renderer = HeatmapRenderer()
+
+    async def start(self):
+        """
+        Starts the scheduler and any cameras listed in STAMPEDE_CAMERAS.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="camera-results")
+        self._thread = threading.Thread(target=self._schedule, name="camera-scheduler", daemon=True)
+        self._thread.start()
+        if CAMERAS_FILE:
+            with open(CAMERAS_FILE) as f:
+                for camera in json.load(f):
+                    try:
+                        self.add(
+                            camera["camera_id"], camera["source"], camera.get("fps", DEFAULT_CAMERA_FPS),
+                            camera.get("loop"), camera.get("zones"), trusted=True,
+                        )
+                    except HTTPException as e:
+                        console.print(f"[bold red]Camera {camera['camera_id']} not started:[/bold red] {e.detail}")
+
+    async def stop(self):
+        for camera_id in list(self.cameras):
+            self.remove(camera_id)
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _check_capacity(self, camera_id: str):
+        if camera_id in self.cameras:
+            raise HTTPException(status_code=409, detail=f"Camera '{camera_id}' already exists.")
+        if len(self.cameras) >= MAX_CAMERAS:
+            raise HTTPException(status_code=429, detail=f"At most {MAX_CAMERAS} cameras can be ingested at once.")
+
+    def add(
+        self, camera_id: str, source: str, fps: float = DEFAULT_CAMERA_FPS, loop: Optional[bool] = None,
+        zones: Optional[str] = None, trusted: bool = False,
+    ) -> CameraStream:
+        """
+        Starts ingesting a camera. Unless `trusted` (configured by the operator), the source
+        must pass source_allowed() and open now; this blocks while it connects.
+
+        :raises HTTPException: 409 if a camera with this id already exists, 429 if MAX_CAMERAS
+            are running, 403 if the source is not allowed, 400 if it cannot be opened, 404 if
+            the zone layout does not exist.
+        """
+        with self._lock:
+            self._check_capacity(camera_id)
+        if not trusted:
+            if not source_allowed(source):
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Camera source not allowed; use a {'/'.join(CAMERA_URL_SCHEMES) or 'configured'} URL "
+                           f"or a file in STAMPEDE_CAMERA_SOURCE_DIRS.",
+                )
+            if not source_opens(source):
+                raise HTTPException(status_code=400, detail="Camera source cannot be opened.")
+        with self._lock:
+            # Checked again: another camera may have been added while the source was opened.
+            self._check_capacity(camera_id)
+            camera = self.cameras[camera_id] = CameraStream(camera_id, source, fps, loop, zones)
+        camera.start(on_frame=self._wakeup.set)
+        console.print(f"[bold green]Camera {camera_id} added[/bold green] ({source}, {fps} fps)")
+        return camera
+
+    def remove(self, camera_id: str) -> CameraStream:
+        """
+        Stops ingesting a camera and closes the sockets of its stream's clients (code 1001).
+        Must be called on the event loop.
+
+        :raises HTTPException: 404 if the camera does not exist.
+        """
+        with self._lock:
+            camera = self.cameras.pop(camera_id, None)
+        if camera is None:
+            raise HTTPException(status_code=404, detail="Camera not found.")
+        camera.stop()
+        websocket_manager.close_channel(camera.channel)
+        return camera
+
+    def _next_batch(self) -> List[Tuple[CameraStream, np.ndarray, float]]:
+        """
+        Takes the pending samples of up to batch_size idle cameras, round-robin.
+        """
+        with self._lock:
+            cameras = list(self.cameras.values())
+        batch = []
+        count = len(cameras)
+        for offset in range(count):
+            index = (self._cursor + offset) % count
+            camera = cameras[index]
+            if camera.busy or not camera.has_frame:
+                continue
+            sample = camera.take()
+            if sample is None:
+                continue
+            camera.busy = True
+            batch.append((camera, *sample))
+            # The next batch starts after the last camera served.
+            self._cursor = (index + 1) % count
+            if len(batch) == self.batch_size:
+                break
+        return batch
+
+    def _schedule(self):
+        model = self.model or get_model()
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                # Woken by the next new sample (or a finished result freeing a camera).
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                continue
+            start = time.perf_counter()
+            try:
+                results = model([frame for _, frame, _ in batch])
+            except Exception as e:
+                console.print(f"[bold red]Camera batch failed:[/bold red] {e!r}")
+                for camera, _, _ in batch:
+                    camera.busy = False
+                continue
+            inference_ms = (time.perf_counter() - start) * 1000
+            record_stage("camera", "inference", inference_ms / 1000)
+            count_frames("camera", len(batch))
+            self.batches += 1
+            self.batched_frames += len(batch)
+            self.inference_seconds += inference_ms / 1000
+            for (camera, frame, captured_at), result in zip(batch, results):
+                self._executor.submit(
+                    self._publish, camera, frame, captured_at, detections_from_result(result), inference_ms, len(batch)
+                )
+
+    def _publish(self, camera: CameraStream, frame: np.ndarray, captured_at: float, detections, inference_ms: float, batch_size: int):
+        """
+        Computes a camera frame's statistics and hands them (with the encoded overlay,
+        if anyone is watching) to the camera's channel.
+        """
+        try:
+            boxes = person_boxes(detections)
+            height, width = frame.shape[:2]
+            with stage_timer("camera", "analytics"):
+                quadrant_counts = camera.zones.counts(boxes, width, height)
+                transitions = camera.alerts.update(captured_at, quadrant_counts, len(boxes))
+                danger_zones = camera.alerts.danger_zones()
+            timeseries_store.record(camera.channel, captured_at, len(boxes), quadrant_counts, danger_zones)
+            metadata = {
+                "camera_id": camera.camera_id,
+                "captured_at": captured_at,
+                "people_in_frame": len(boxes),
+                "quadrant_counts": quadrant_counts,
+                "danger_zones": danger_zones,
+                "batch_size": batch_size,
+                "inference_ms": round(inference_ms, 2),
+            }
+            zone_density = camera.zones.densities(quadrant_counts)
+            if zone_density:
+                metadata["zone_density"] = zone_density
+            # Overlays are only rendered and encoded for channels someone is watching.
+            options = websocket_manager.requested_options(camera.channel)
+            encoded = {}
+            if options:
+                with stage_timer("camera", "heatmap"):
+                    overlay = self._heatmap_renderer.render(frame, boxes)
+                with stage_timer("camera", "encode"):
+                    encoded = encode_for_clients(frame, overlay, options)
+            metadata["latency_ms"] = round((time.time() - captured_at) * 1000, 2)
+            camera.frames_analysed += 1
+            camera.last_result = {key: metadata[key] for key in ("captured_at", "people_in_frame", "danger_zones", "latency_ms")}
+
+            if transitions:
+                alert_log.emit(transitions, camera.camera_id)
+                self._run_on_loop(websocket_manager.send_data({
+                    "type": "alert",
+                    "camera_id": camera.camera_id,
+                    "people_in_frame": len(boxes),
+                    "danger_zones": danger_zones,
+                    "transitions": [transition.as_dict() for transition in transitions],
+                }, camera.channel))
+            if encoded:
+                self._run_on_loop(websocket_manager.send_frame(metadata, encoded, camera.channel))
+        except Exception as e:
+            console.print(f"[bold red]Camera {camera.camera_id}: failed to publish result:[/bold red] {e!r}")
+        finally:
+            camera.busy = False
+            self._wakeup.set()
+
+    def _run_on_loop(self, coroutine):
+        if self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        else:
+            coroutine.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns scheduler totals and per-camera ingestion and analysis counters.
+        """
+        with self._lock:
+            cameras = list(self.cameras.values())
+        return {
+            "batches": self.batches,
+            "average_batch_size": round(self.batched_frames / self.batches, 2) if self.batches else 0,
+            "inference_seconds": round(self.inference_seconds, 2),
+            "cameras": [camera.stats() for camera in cameras],
+        }
+
+
+camera_manager = CameraManager()
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.analytics import Detections
+
+# Cached detections live here; override with STAMPEDE_CACHE_DIR.
+CACHE_DIR = os.getenv("STAMPEDE_CACHE_DIR", os.path.join("data", "detections"))
+# Least recently used entries are evicted once the cache grows past this size.
+CACHE_MAX_BYTES = int(os.getenv("STAMPEDE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Part of every key; bumped when the stored columns change, so older entries are never read.
+CACHE_FORMAT = 2
+
+
+class CachedVideo(NamedTuple):
+    """
+    Per-frame detections of one video, stored column-wise.
+
+    Boxes of all sampled frames are concatenated; the detections of sampled frame i are
+    rows offsets[i]:offsets[i + 1] of xyxy/cls/conf.
+    """
+    frame_indices: np.ndarray
+    offsets: np.ndarray
+    xyxy: np.ndarray
+    cls: np.ndarray
+    conf: np.ndarray
+    width: int
+    height: int
+    fps: float
+    total_frames: int
+
+    def detections(self, i: int) -> Detections:
+        """
+        Returns the detections of the i-th sampled frame.
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return Detections(self.xyxy[start:end], self.cls[start:end], self.conf[start:end])
+
+    def by_frame_index(self) -> dict:
+        """
+        Maps video frame index -> position in frame_indices.
+        """
+        return {int(frame_index): i for i, frame_index in enumerate(self.frame_indices)}
+
+    def frames(self) -> Iterator[Tuple[int, Detections]]:
+        """
+        Yields (frame_index, detections) for every sampled frame, in order.
+        """
+        for i, frame_index in enumerate(self.frame_indices):
+            yield int(frame_index), self.detections(i)
+
+
+def pack_detections(frames: List[Tuple[int, Detections]], width: int, height: int, fps: float, total_frames: int) -> CachedVideo:
+    """
+    Packs (frame_index, Detections) pairs into a columnar CachedVideo.
+    """
+    counts = [len(d.xyxy) for _, d in frames]
+    offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    def concat(arrays, shape, dtype):
+        return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(shape, dtype=dtype)
+
+    return CachedVideo(
+        frame_indices=np.array([i for i, _ in frames], dtype=np.int64),
+        offsets=offsets,
+        xyxy=concat([d.xyxy for _, d in frames], (0, 4), np.float32).reshape(-1, 4),
+        cls=concat([d.cls for _, d in frames], (0,), np.int16),
+        # Full precision, so replays gate and associate on exactly the live confidences
+        conf=concat([d.conf for _, d in frames], (0,), np.float32),
+        width=width,
+        height=height,
+        fps=fps,
+        total_frames=total_frames,
+    )
+
+
+class DetectionCache:
+    """
+    On-disk cache of per-frame detections keyed by video content, model and frame sampling.
+
+    Each entry is an uncompressed .npz of the CachedVideo columns, so arrays load
+    with a single read each. Access updates the file's mtime, and the oldest entries
+    are removed when the total size exceeds `max_bytes`.
+
+    :param directory: Cache directory.
+    :param max_bytes: Size cap of the cache.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sha256: str, model_key: str, sampling_key: str) -> str:
+        """
+        Builds the cache key for a video's content hash, the model identity and the
+        frame sampling settings (and the storage format).
+        """
+        return hashlib.sha256(f"{CACHE_FORMAT}|{sha256}|{model_key}|{sampling_key}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key: str) -> Optional[CachedVideo]:
+        """
+        Returns the cached detections for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                cached = CachedVideo(
+                    frame_indices=data["frame_indices"],
+                    offsets=data["offsets"],
+                    xyxy=data["xyxy"],
+                    cls=data["cls"],
+                    conf=data["conf"],
+                    width=int(data["width"]),
+                    height=int(data["height"]),
+                    fps=float(data["fps"]),
+                    total_frames=int(data["total_frames"]),
+                )
+            os.utime(path)
+            return cached
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, key: str, cached: CachedVideo):
+        """
+        Stores detections under `key`, then evicts least recently used entries if needed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **cached._asdict())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            try:
+                entries = [
+                    (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                    for entry in os.scandir(self.directory)
+                    if entry.name.endswith(".npz")
+                ]
+            except FileNotFoundError:
+                return
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+
+
+detection_cache = DetectionCache()
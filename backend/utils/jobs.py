@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from rich.console import Console
+
+from utils.uploads import SavedUpload, unique_output_path
+from utils.video_processing import process_video_file
+
+console = Console()
+
+# Job database, persisted uploads and output videos live here; override with STAMPEDE_DATA_DIR.
+DATA_DIR = os.getenv("STAMPEDE_DATA_DIR", "data")
+JOB_UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+JOB_OUTPUT_DIR = os.path.join(DATA_DIR, "outputs")
+
+# Number of videos processed at the same time, and how many may wait in the queue.
+JOB_CONCURRENCY = int(os.getenv("STAMPEDE_JOB_CONCURRENCY", "1"))
+JOB_QUEUE_SIZE = int(os.getenv("STAMPEDE_JOB_QUEUE_SIZE", "100"))
+
+# Progress is written to the database at most this often (seconds) per job.
+PROGRESS_INTERVAL = 1.0
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobStore:
+    """
+    SQLite-backed record of analysis jobs, their progress and their results.
+
+    Every method is a single short statement, so calls are made directly from the
+    event loop; a lock makes the shared connection safe to use from worker threads too.
+
+    :param path: Database file.
+    """
+
+    _COLUMNS = (
+        "id", "status", "filename", "video_path", "output_video_path", "sha256", "params",
+        "progress", "created_at", "started_at", "finished_at", "error", "result",
+    )
+    _JSON_COLUMNS = ("params", "result")
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT,
+                video_path TEXT,
+                output_video_path TEXT,
+                sha256 TEXT,
+                params TEXT,
+                progress REAL DEFAULT 0,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT,
+                result TEXT
+            )
+            """
+        )
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def create(self, upload: SavedUpload, output_video_path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, filename, video_path, output_video_path, sha256, params, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, upload.filename, upload.path, output_video_path, upload.sha256,
+                 json.dumps(params), time.time()),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        for column in self._JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM jobs"
+        args = []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """
+        Returns queued and running jobs, oldest first (used to resume after a restart).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+
+class JobManager:
+    """
+    Runs video analysis jobs in the background with a bounded worker pool.
+
+    Submitting a job persists the upload and a job record, then returns immediately;
+    `concurrency` worker tasks take jobs from a bounded queue and run process_video_file
+    without a time limit. Jobs that were queued or running when the server stopped are
+    queued again on start, as long as their upload is still on disk. A resumed job is
+    processed again from the first frame; its time-series samples are in video time,
+    so the frames recorded before the interruption are not recorded twice.
+
+    The job database is opened by start(), so importing the module creates nothing on disk.
+
+    :param path: Job database file.
+    :param concurrency: Number of jobs processed at the same time.
+    :param queue_size: Maximum number of jobs waiting to run.
+    """
+
+    def __init__(self, path: str, concurrency: int = JOB_CONCURRENCY, queue_size: int = JOB_QUEUE_SIZE):
+        self.path = path
+        self.store: Optional[JobStore] = None
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._cancel_events: Dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        if self.store is None:
+            self.store = JobStore(self.path)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for job in self.store.unfinished():
+            if os.path.exists(job["video_path"]) and not self._queue.full():
+                self.store.update(job["id"], status=QUEUED, progress=0)
+                self._queue.put_nowait(job["id"])
+                console.print(f"[bold cyan]Resuming job {job['id']}[/bold cyan]")
+            else:
+                self.store.update(job["id"], status=FAILED, finished_at=time.time(),
+                                  error="Interrupted by a server restart and could not be resumed.")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, upload: SavedUpload, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Records a job for an already-saved upload and queues it.
+
+        :raises HTTPException: 503 if the queue is full.
+        """
+        if self._queue is None or self._queue.full():
+            os.remove(upload.path)
+            raise HTTPException(status_code=503, detail="Job queue is full, try again later.")
+        job = self.store.create(upload, unique_output_path(upload.filename, JOB_OUTPUT_DIR), params)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """
+        Cancels a queued job immediately, or asks a running job to stop.
+
+        :raises HTTPException: 404 if the job does not exist, 409 if it already finished.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        if job["status"] in FINISHED_STATES:
+            raise HTTPException(status_code=409, detail=f"Job already {job['status']}.")
+        if job["status"] == QUEUED:
+            self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+            self._remove_upload(job)
+        elif job_id in self._cancel_events:
+            self._cancel_events[job_id].set()
+        return self.store.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @staticmethod
+    def _remove_upload(job: Dict[str, Any]):
+        if job["video_path"] and os.path.exists(job["video_path"]):
+            os.remove(job["video_path"])
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                console.print(f"[bold red]Job {job_id} crashed:[/bold red] {e!r}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            # Cancelled while it was waiting.
+            return
+
+        cancel_event = self._cancel_events[job_id] = asyncio.Event()
+        self.store.update(job_id, status=RUNNING, started_at=time.time(), progress=0)
+        last_write = 0.0
+
+        def on_progress(percent: float):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write >= PROGRESS_INTERVAL:
+                last_write = now
+                self.store.update(job_id, progress=round(percent, 2))
+
+        params = dict(job["params"] or {})
+        batch_size = params.pop("batch_size", 1)
+        sampling = params.pop("sampling", None)
+        try:
+            os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+            result = await process_video_file(
+                job["video_path"],
+                job["output_video_path"],
+                batch_size=batch_size,
+                timeout=None,
+                cancel_event=cancel_event,
+                on_progress=on_progress,
+                sampling=sampling,
+                sha256=job["sha256"],
+                source=f"job:{job_id}",
+                **params,
+            )
+        except asyncio.CancelledError:
+            # Server shutting down: leave the job queued (upload kept) so it resumes on restart.
+            self.store.update(job_id, status=QUEUED, progress=0)
+            raise
+        except HTTPException as e:
+            self.store.update(job_id, status=FAILED, finished_at=time.time(), error=e.detail)
+            self._remove_upload(job)
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, finished_at=time.time(), error=repr(e))
+            self._remove_upload(job)
+        else:
+            if result["cancelled"]:
+                self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+                if os.path.exists(job["output_video_path"]):
+                    os.remove(job["output_video_path"])
+            else:
+                self.store.update(job_id, status=COMPLETED, finished_at=time.time(), progress=100, result=result)
+            self._remove_upload(job)
+        finally:
+            self._cancel_events.pop(job_id, None)
+
+
+job_manager = JobManager(os.path.join(DATA_DIR, "jobs.sqlite3"))
@@ -1,106 +1,261 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import struct
+import time
 import cv2
 import numpy as np
 import base64
-from ultralytics import YOLO
+from models import get_model
+from utils.analytics import HeatmapRenderer, detections_from_result, person_boxes, person_confidences
+from utils.metrics import count_frames, record_stage, stage_timer
+from utils.tiling import TiledDetector
+from utils.tracking import Tracker
+from utils.zones import ZoneLayout, zone_config
 from rich.console import Console
 
 console = Console()
 router = APIRouter()
 
-# Load YOLOv8 model once on module load
-model = YOLO("yolov8n.pt")
 
+# Heatmap buffers are reused across requests (kept per threadpool thread).
+heatmap_renderer = HeatmapRenderer()
 
-def compute_quadrant_counts(results, width, height, num_rows=3, num_cols=4):
-    """
-    Computes the number of detected people per quadrant based on YOLO detection results.
-    
-    :param results: YOLO detection results.
-    :param width: Frame width.
-    :param height: Frame height.
-    :param num_rows: Number of grid rows.
-    :param num_cols: Number of grid columns.
-    :return: A dictionary mapping quadrant identifiers (e.g., "q1", "q2", ...) to counts.
-    """
-    quadrant_counts = {f"q{i}": 0 for i in range(1, num_rows * num_cols + 1)}
-    for box in results[0].boxes:
-        if int(box.cls[0]) == 0:  # Only count detections for persons (class 0)
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-            # Determine the column and row indices
-            col_index = min(int(center_x / (width / num_cols)), num_cols - 1)
-            row_index = min(int(center_y / (height / num_rows)), num_rows - 1)
-            quadrant_index = row_index * num_cols + col_index + 1
-            quadrant_counts[f"q{quadrant_index}"] += 1
-    return quadrant_counts
-
-
-def generate_heatmap_overlay(frame, results, height, width):
+# JPEG quality of overlays streamed back over /ws/live
+LIVE_JPEG_QUALITY = 80
+
+# Binary frames on /ws/live start with the client's send timestamp (little-endian float64, ms).
+LIVE_HEADER = struct.Struct("<d")
+
+
+def analyze_frame(
+    frame, tracker: Tracker = None, timestamp: float = None, zones: ZoneLayout = None, detector: TiledDetector = None,
+    pipeline: str = "live",
+):
     """
-    Generates a heatmap overlay from detected person bounding boxes.
-    
-    :param frame: Original frame image.
-    :param results: YOLO detection results.
-    :param height: Frame height.
-    :param width: Frame width.
-    :return: Image with the heatmap overlay blended.
+    Detects persons in a frame, computes zone counts and danger zones, and renders
+    the heatmap overlay. Shared by /detect_frame/ and /ws/live; runs on a worker thread.
+
+    :param frame: Decoded BGR frame.
+    :param tracker: A stream's tracker; when given, the statistics include its flow metrics.
+    :param timestamp: Capture time of the frame in seconds, for the tracker.
+    :param zones: Zone layout to count in; defaults to the default layout.
+    :param detector: Tiled detector to use instead of a whole-frame pass of the shared model.
+    :param pipeline: Label of the stage timings in /metrics.
+    :return: A tuple of (overlay image, statistics dictionary).
     """
-    heatmap = np.zeros((height, width), dtype=np.float32)
-    for box in results[0].boxes:
-        if int(box.cls[0]) == 0:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            heatmap[y1:y2, x1:x2] += 1
-    heatmap = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX)
-    heatmap = np.uint8(heatmap)
-    heatmap = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
-    return cv2.addWeighted(frame, 0.6, heatmap, 0.4, 0)
+    with stage_timer(pipeline, "inference"):
+        if detector is not None:
+            detections = detector([frame])[0]
+        else:
+            # Run YOLO detection on the frame with the shared model
+            results = get_model()(frame)
+            detections = detections_from_result(results[0])
+    # Keep only person detections (class 0 corresponds to persons)
+    boxes = person_boxes(detections)
+    people_in_frame = len(boxes)
+
+    # Retrieve frame dimensions
+    height, width, _ = frame.shape
+
+    with stage_timer(pipeline, "analytics"):
+        # Count people per zone of the layout
+        zones = zones if zones is not None else zone_config.get()
+        quadrant_counts = zones.counts(boxes, width, height)
+
+        # Identify danger zones: zones holding more people than their capacity
+        danger_zones = [key for key, count in quadrant_counts.items() if count > zones.capacities[key]]
+
+    # Generate a heatmap overlay on the frame
+    with stage_timer(pipeline, "heatmap"):
+        overlay = heatmap_renderer.render(frame, boxes)
+
+    stats = {
+        "people_in_frame": people_in_frame,
+        "quadrant_counts": quadrant_counts,
+        "danger_zones": danger_zones
+    }
+    zone_density = zones.densities(quadrant_counts)
+    if zone_density:
+        stats["zone_density"] = zone_density
+    if tracker is not None:
+        with stage_timer(pipeline, "analytics"):
+            tracker.update(timestamp, boxes, person_confidences(detections))
+            stats["flow"] = tracker.metrics()
+    count_frames(pipeline)
+    return overlay, stats
 
 
 @router.post("/detect_frame/")
-async def detect_frame(image: UploadFile = File(...)):
+async def detect_frame(
+    image: UploadFile = File(...),
+    zones: Optional[str] = Query(None, description="Zone layout (see STAMPEDE_ZONES); defaults to the default layout"),
+    tiled: bool = Query(False, description="Also detect on overlapping tiles, for small, distant people"),
+):
     """
-    Detects persons in an uploaded image frame using YOLOv8, computes quadrant counts,
+    Detects persons in an uploaded image frame using YOLOv8, computes zone counts,
     and returns a base64-encoded overlay image along with detection statistics.
-    
+
     :param image: Uploaded image file.
-    :return: A JSON object containing the overlay image, people count, quadrant counts,
-             and a list of danger zones (quadrants exceeding a high-density threshold).
-    :raises HTTPException: If the image file is invalid.
+    :param zones: Name of the zone layout to count in.
+    :param tiled: Tile the whole frame (a single frame has no density history to pick zones by).
+    :return: A JSON object containing the overlay image, people count, zone counts,
+             and a list of danger zones (zones holding more people than their capacity).
+    :raises HTTPException: If the image file is invalid (400) or the zone layout unknown (404).
     """
+    layout = zone_config.get(zones)
     # Read and decode the uploaded image file
     contents = await image.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    with stage_timer("detect_frame", "decode"):
+        nparr = np.frombuffer(contents, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     if frame is None:
         raise HTTPException(status_code=400, detail="Invalid image file.")
 
-    # Run YOLO detection on the frame
-    results = model(frame)
-    # Count the number of persons detected (class 0 corresponds to persons)
-    people_in_frame = sum(1 for box in results[0].boxes if int(box.cls[0]) == 0)
-    
-    # Retrieve frame dimensions
-    height, width, _ = frame.shape
+    # Inference runs in the threadpool so it does not block the event loop while
+    # waiting for the shared model.
+    detector = TiledDetector(get_model(), layout) if tiled else None
+    overlay, stats = await run_in_threadpool(
+        analyze_frame, frame, zones=layout, detector=detector, pipeline="detect_frame"
+    )
 
-    # Compute quadrant counts using a 3x4 grid (12 regions)
-    quadrant_counts = compute_quadrant_counts(results, width, height)
+    # Encode the overlay image to a base64 string, this is to send through the websocket to the frontend
+    with stage_timer("detect_frame", "encode"):
+        _, buffer = cv2.imencode(".jpg", overlay)
+        frame_base64 = base64.b64encode(buffer).decode("utf-8")
 
-    # Define high-density threshold and identify danger zones
-    high_density_threshold = 5  # Adjust threshold as needed
-    danger_zones = [key for key, count in quadrant_counts.items() if count > high_density_threshold]
+    return {"frame": frame_base64, **stats}
 
-    # Generate a heatmap overlay on the frame
-    overlay = generate_heatmap_overlay(frame, results, height, width)
-    
-    # Encode the overlay image to a base64 string, this is to send through the websocket to the frontend
-    _, buffer = cv2.imencode(".jpg", overlay)
-    frame_base64 = base64.b64encode(buffer).decode("utf-8")
 
-    return {
-        "frame": frame_base64,
-        "people_in_frame": people_in_frame,
-        "quadrant_counts": quadrant_counts,
-        "danger_zones": danger_zones
+def _process_live_frame(data: bytes, state: dict = None, timestamp: float = None):
+    """
+    Decodes, analyses and re-encodes one /ws/live frame, timing each step.
+
+    :param data: JPEG frame.
+    :param state: The connection's state: its zone layout, its "tiler" if tiled inference is
+        enabled and, if tracking is enabled, its "tracker", created on the first frame and
+        again whenever the frame size changes.
+    :param timestamp: Capture time of the frame in seconds, for the tracker.
+    :return: (overlay JPEG bytes or None, statistics, timings in ms)
+    """
+    start = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None, {}, {}
+    decoded = time.perf_counter()
+    tracker = None
+    zones = state.get("zones") if state is not None else None
+    if state is not None and state.get("tracking"):
+        height, width = frame.shape[:2]
+        tracker = state.get("tracker")
+        if tracker is None or (tracker.width, tracker.height) != (width, height):
+            tracker = state["tracker"] = Tracker(width, height, zones)
+    detector = state.get("tiler") if state is not None else None
+    overlay, stats = analyze_frame(frame, tracker, timestamp, zones, detector)
+    analysed = time.perf_counter()
+    _, buffer = cv2.imencode(".jpg", overlay, [cv2.IMWRITE_JPEG_QUALITY, LIVE_JPEG_QUALITY])
+    encoded = time.perf_counter()
+    record_stage("live", "decode", decoded - start)
+    record_stage("live", "encode", encoded - analysed)
+    timings = {
+        "decode_ms": round((decoded - start) * 1000, 2),
+        "analysis_ms": round((analysed - decoded) * 1000, 2),
+        "encode_ms": round((encoded - analysed) * 1000, 2),
     }
+    return buffer.tobytes(), stats, timings
+
+
+@router.websocket("/ws/live")
+async def live_stream(websocket: WebSocket, tracking: bool = False, zones: Optional[str] = None, tiled: bool = False):
+    """
+    Persistent live-camera stream replacing per-frame /detect_frame/ uploads.
+
+    The client sends binary messages: an 8-byte little-endian float64 timestamp (ms, on
+    the client's clock) followed by a JPEG frame. Only the newest frame is processed;
+    frames that arrive while the previous one is being analysed replace each other and
+    the stale ones are dropped. For every processed frame the server replies with a
+    JSON message (statistics, the echoed client_ts and server-side latency breakdown)
+    followed by one binary message holding the overlay JPEG. The client computes
+    end-to-end latency as now - client_ts when the reply arrives.
+
+    With ?tracking=true people are tracked across the stream's frames and each
+    result also carries per-region flow, speed and dwell metrics ("flow"). ?zones=<name>
+    counts in a zone layout of STAMPEDE_ZONES; the connection is closed (1008) if
+    there is no layout of that name. With ?tiled=true the crowded zones of each
+    frame are also detected tile by tile (see utils/tiling.py), following the
+    densities of the stream's earlier frames.
+    """
+    try:
+        layout = zone_config.get(zones)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    latest = {"data": None, "received_at": 0.0}
+    state = {"closed": False, "dropped": 0, "processed": 0, "tracking": tracking, "tracker": None, "zones": layout}
+    if tiled:
+        state["tiler"] = TiledDetector(get_model(), layout)
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        try:
+            while True:
+                data = await websocket.receive_bytes()
+                if latest["data"] is not None:
+                    state["dropped"] += 1
+                latest["data"] = data
+                latest["received_at"] = time.perf_counter()
+                frame_ready.set()
+        except (WebSocketDisconnect, RuntimeError, KeyError):
+            # KeyError: a text message arrived where bytes were expected; treat it as a protocol error.
+            pass
+        finally:
+            state["closed"] = True
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if state["closed"]:
+                break
+            data, received_at = latest["data"], latest["received_at"]
+            latest["data"] = None
+            if data is None or len(data) <= LIVE_HEADER.size:
+                continue
+
+            (client_ts,) = LIVE_HEADER.unpack_from(data)
+            started = time.perf_counter()
+            overlay, stats, timings = await run_in_threadpool(
+                _process_live_frame, data[LIVE_HEADER.size:], state, client_ts / 1000
+            )
+            if overlay is None:
+                await websocket.send_json({"type": "error", "client_ts": client_ts, "detail": "Invalid image frame."})
+                continue
+            state["processed"] += 1
+
+            sending = time.perf_counter()
+            await websocket.send_json({
+                "type": "result",
+                "client_ts": client_ts,
+                **stats,
+                "processed_frames": state["processed"],
+                "dropped_frames": state["dropped"],
+                "latency": {
+                    "queue_ms": round((started - received_at) * 1000, 2),
+                    **timings,
+                    "server_ms": round((time.perf_counter() - received_at) * 1000, 2),
+                },
+            })
+            await websocket.send_bytes(overlay)
+            record_stage("live", "websocket_send", time.perf_counter() - sending)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        console.print(
+            f"[bold cyan]Live stream closed:[/bold cyan] {state['processed']} frames processed, "
+            f"{state['dropped']} stale frames dropped"
+        )
@@ -0,0 +1,320 @@
+import bisect
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Recording of timings and frame counts; with STAMPEDE_METRICS=0 every hot-path call
+# returns immediately. Gauges are read when /metrics is scraped either way.
+METRICS_ENABLED = os.getenv("STAMPEDE_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Upper bounds (seconds) of the stage timing buckets: 0.5 ms up to 5 s.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Window over which frames per second are averaged, in seconds.
+RATE_WINDOW = 10
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _NullTimer:
+    """Stands in for a stage timer when metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yields (suffix, formatted labels, value) for the exposition."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count per label combination (named ..._total).
+    """
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class Gauge(_Metric):
+    """
+    A value read when the metrics are rendered: `function` returns either a number
+    (for a gauge without labels) or a {label values: number} dictionary. Values of
+    None are left out.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, function: Callable[[], object], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = function
+
+    def samples(self):
+        try:
+            values = self.function()
+        except Exception:
+            # A failing collector must not break the whole scrape.
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                yield "", _format_labels(self.labelnames, labels), value
+
+
+class Histogram(_Metric):
+    """
+    Observations counted into cumulative buckets per label combination, with their
+    sum and count, as Prometheus histograms are.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = STAGE_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *labels: str):
+        """
+        Returns a context manager observing the time spent in its block.
+        """
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[Labels, Tuple[List[int], float]]:
+        """
+        Returns a copy of the per-bucket (non-cumulative) counts and the sum for each label combination.
+        """
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+
+    def samples(self):
+        values = sorted(self.snapshot().items())
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames + ("le",), labels + (bound,)), cumulative
+            yield "_sum", _format_labels(self.labelnames, labels), total
+            yield "_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class Rate(_Metric):
+    """
+    Events per second over the last `window` whole seconds, per label combination.
+    Counts are kept in one slot per second of the window (plus one for the current
+    second), so marking is O(1).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, window: int = RATE_WINDOW, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window = max(1, window)
+        # labels -> (second of each slot, count of each slot)
+        self._slots: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def mark(self, *labels: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        second = int(time.monotonic())
+        slot = second % (self.window + 1)
+        with self._lock:
+            entry = self._slots.get(labels)
+            if entry is None:
+                entry = self._slots[labels] = ([-1] * (self.window + 1), [0] * (self.window + 1))
+            seconds, counts = entry
+            if seconds[slot] != second:
+                seconds[slot], counts[slot] = second, 0
+            counts[slot] += amount
+
+    def samples(self):
+        now = int(time.monotonic())
+        with self._lock:
+            entries = sorted((labels, (list(seconds), list(counts))) for labels, (seconds, counts) in self._slots.items())
+        for labels, (seconds, counts) in entries:
+            # The current second is still filling up, so it is left out.
+            total = sum(count for second, count in zip(seconds, counts) if 0 < now - second <= self.window)
+            yield "", _format_labels(self.labelnames, labels), total / self.window
+
+
+class MetricsRegistry:
+    """
+    The application's metrics, rendered in the Prometheus text exposition format.
+
+    Histograms, counters and rates are updated on the hot path under a short lock;
+    gauges are callbacks evaluated at scrape time, so queue depths and connection
+    counts cost nothing between scrapes. Disabled, the registry turns every update
+    into an early return (and stage timers into a shared no-op).
+
+    :param enabled: Record timings, counts and rates.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._queues: Dict[str, "weakref.WeakSet"] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], object], labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, function=function))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def rate(self, name: str, documentation: str, labelnames: Sequence[str] = (), window: int = RATE_WINDOW) -> Rate:
+        return self._register(Rate(self, name, documentation, labelnames, window=window))
+
+    def watch_queue(self, name: str, q) -> None:
+        """
+        Reports the depth of `q` (anything with qsize()) under `name` while it is alive;
+        queues of the same name, e.g. of concurrent videos, are summed.
+        """
+        with self._lock:
+            self._queues.setdefault(name, weakref.WeakSet()).add(q)
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._lock:
+            queues = {name: list(members) for name, members in self._queues.items()}
+        return {name: sum(q.qsize() for q in members) for name, members in queues.items()}
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "stampede_stage_seconds", "Time spent in each processing stage.", ("pipeline", "stage")
+)
+FRAMES = metrics.counter("stampede_frames_total", "Frames analysed.", ("pipeline",))
+FRAME_RATE = metrics.rate(
+    "stampede_frames_per_second", f"Frames analysed per second over the last {RATE_WINDOW} seconds.", ("pipeline",)
+)
+metrics.gauge(
+    "stampede_queue_depth", "Items waiting in internal queues.", metrics.queue_depths, ("queue",)
+)
+
+
+def stage_timer(pipeline: str, stage: str):
+    """
+    Returns a context manager recording the time of its block as `stage` of `pipeline`
+    ("video", "live", "detect_frame" or "camera").
+    """
+    return STAGE_SECONDS.time(pipeline, stage)
+
+
+def record_stage(pipeline: str, stage: str, seconds: float):
+    """Records a stage time measured by the caller."""
+    STAGE_SECONDS.observe(seconds, pipeline, stage)
+
+
+def count_frames(pipeline: str, frames: int = 1):
+    """Counts analysed frames of `pipeline`, for the frame total and rate."""
+    FRAMES.inc(pipeline, amount=frames)
+    FRAME_RATE.mark(pipeline, amount=frames)
@@ -0,0 +1,210 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metrics, record_stage
+from utils.sampling import FixedSampler
+
+# Marks the end of the stream as it travels down the stage queues.
+_END = object()
+
+
+class _StageError:
+    """
+    Wraps an exception raised inside a stage so it can travel down the queues
+    and be re-raised on the consumer side.
+    """
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class FramePipeline:
+    """
+    Runs video processing as three overlapping stages on worker threads:
+
+      1. decode  - reads the frames the sampler selects from the capture; the others
+                   are only grabbed, which skips decoding them.
+      2. detect  - runs the detector on batches of `batch_size` kept frames.
+      3. encode  - turns (frame_index, frame, result) into whatever the consumer needs
+                   (statistics, overlays, JPEG buffers, video writes, ...).
+
+    Stages are connected by bounded queues, so a slow stage applies backpressure to
+    the ones before it instead of letting frames pile up in memory. The event loop
+    only awaits finished items, which keeps it free to serve other requests.
+
+    Usage::
+
+        async with FramePipeline(cap, detect, encode) as pipeline:
+            async for item in pipeline:
+                ...
+
+    :param cap: An opened cv2.VideoCapture.
+    :param detect: Callable taking (frame_indices, frames) for a batch and returning one detection result per frame, in order.
+    :param encode: Callable taking (frame_index, frame, result) and returning the item yielded to the consumer.
+    :param frame_skip: Only every `frame_skip`-th frame is passed to the detector (unless a sampler is given).
+    :param batch_size: Number of kept frames collected into a single detector call.
+    :param queue_size: Capacity of each inter-stage queue.
+    :param sampler: A FrameSampler choosing the frames to decode and detect; defaults to FixedSampler(frame_skip).
+    :param name: Pipeline label of the decode timings and queue depths in /metrics.
+    """
+
+    def __init__(
+        self, cap, detect, encode, frame_skip: int = 5, batch_size: int = 1, queue_size: int = 8, sampler=None,
+        name: str = "video",
+    ):
+        self.cap = cap
+        self.detect = detect
+        self.encode = encode
+        self.sampler = sampler if sampler is not None else FixedSampler(frame_skip)
+        self.batch_size = max(1, batch_size)
+        # The decode queue must be able to hold a full batch.
+        queue_size = max(queue_size, self.batch_size)
+        self.queue_size = queue_size
+
+        self.name = name
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._detected = queue.Queue(maxsize=queue_size)
+        metrics.watch_queue(f"{name}_decoded", self._decoded)
+        metrics.watch_queue(f"{name}_detected", self._detected)
+        # Slots bound how many encoded items may wait on the event loop side.
+        self._slots = threading.Semaphore(queue_size)
+        self._stop = threading.Event()
+        self._executor = None
+        self._futures = []
+        self._loop = None
+        self._results = None
+
+    def stop(self):
+        """Asks every stage to finish as soon as possible."""
+        self._stop.set()
+
+    # ------------------------------------------------------------------ helpers
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocks while `q` is full, waking periodically to honour stop()."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        """Blocks until an item is available; returns _END once stopped."""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _emit(self, item) -> bool:
+        """Hands an item over to the event loop, waiting for a free slot first."""
+        while not self._stop.is_set():
+            if self._slots.acquire(timeout=0.1):
+                self._loop.call_soon_threadsafe(self._results.put_nowait, item)
+                return True
+        return False
+
+    # ------------------------------------------------------------------- stages
+
+    def _decode_stage(self):
+        try:
+            frame_index = 0
+            while not self._stop.is_set():
+                if not self.sampler.decode(frame_index):
+                    # Advance past the frame without decoding it.
+                    if not self.cap.grab():
+                        break
+                else:
+                    start = time.perf_counter()
+                    ret, frame = self.cap.read()
+                    if not ret:
+                        break
+                    record_stage(self.name, "decode", time.perf_counter() - start)
+                    if self.sampler.infer(frame_index, frame):
+                        if not self._put(self._decoded, (frame_index, frame)):
+                            return
+                frame_index += 1
+        except BaseException as exc:
+            self._put(self._decoded, _StageError(exc))
+            return
+        self._put(self._decoded, _END)
+
+    def _detect_stage(self):
+        finished = False
+        while not finished:
+            # Collect up to batch_size frames; a short batch is flushed at end of stream.
+            batch = []
+            tail = None
+            while len(batch) < self.batch_size:
+                item = self._get(self._decoded)
+                if item is _END or isinstance(item, _StageError):
+                    tail = item
+                    finished = True
+                    break
+                batch.append(item)
+
+            if batch:
+                try:
+                    results = self.detect([i for i, _ in batch], [frame for _, frame in batch])
+                except BaseException as exc:
+                    self._put(self._detected, _StageError(exc))
+                    return
+                # Results are handed on one frame at a time, in decode order.
+                for (frame_index, frame), result in zip(batch, results):
+                    if not self._put(self._detected, (frame_index, frame, result)):
+                        return
+
+            if tail is not None:
+                self._put(self._detected, tail)
+
+    def _encode_stage(self):
+        while True:
+            item = self._get(self._detected)
+            if item is _END or isinstance(item, _StageError):
+                self._emit(item)
+                return
+            try:
+                encoded = self.encode(*item)
+            except BaseException as exc:
+                self._emit(_StageError(exc))
+                return
+            if not self._emit(encoded):
+                return
+
+    # ------------------------------------------------------------ async surface
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._results = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="frame-pipeline")
+        self._futures = [
+            self._executor.submit(stage)
+            for stage in (self._decode_stage, self._detect_stage, self._encode_stage)
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.stop()
+        # Wait for the stages to return so the caller can safely release the capture
+        # and the video writer afterwards.
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in self._futures), return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._results.get()
+        self._slots.release()
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, _StageError):
+            raise item.exc
+        return item
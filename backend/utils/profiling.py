@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+# The sampling profiler is only available with STAMPEDE_PROFILER=1; otherwise no
+# thread is started and /metrics/profile answers 404.
+PROFILER_ENABLED = os.getenv("STAMPEDE_PROFILER", "0").lower() in ("1", "true", "yes")
+# Longest profile one request may take, in seconds.
+MAX_PROFILE_SECONDS = 60.0
+DEFAULT_PROFILE_INTERVAL = 0.005
+# Innermost frames kept per stack sample.
+MAX_STACK_DEPTH = 64
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """
+    A sampling profiler for the running server, without tracing or dependencies.
+
+    While a profile runs, a background thread reads the current stack of every
+    other thread (sys._current_frames) every `interval` seconds and counts each
+    distinct stack. The result is in the collapsed format flame graph tools take
+    ("thread;module:function;... count" per line), so time shows up where it is
+    spent: decode, inference, overlays, encoding or the event loop. Between
+    profiles it costs nothing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = DEFAULT_PROFILE_INTERVAL) -> Dict[str, int]:
+        """
+        Samples all threads for `seconds` and returns the count of each collapsed stack.
+        Blocks the calling thread for the duration.
+
+        :raises ProfilerBusy: If another profile is running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running.")
+        try:
+            stacks = Counter()
+            own = threading.get_ident()
+            names = {}
+            deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(interval)
+            return dict(stacks)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        calls = []
+        while frame is not None and len(calls) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            calls.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join([thread_name, *reversed(calls)])
+
+    @staticmethod
+    def collapsed(stacks: Dict[str, int]) -> str:
+        """
+        Renders stack counts one per line, most frequent first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,184 @@
+import math
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+# Reference sampling interval: the fixed sampler analyses every FRAME_SKIP-th frame, and
+# per-frame statistics are reported on this grid whatever sampler is used.
+FRAME_SKIP = 5
+
+SAMPLING_MODES = ("fixed", "adaptive")
+# Sampling mode used when a request does not choose one; override with STAMPEDE_SAMPLING.
+# Adaptive sampling decodes every min_interval-th frame to probe for motion, which is
+# more decoding than fixed sampling at the default settings, so it is opt-in.
+DEFAULT_SAMPLING = os.getenv("STAMPEDE_SAMPLING", "fixed")
+
+
+class FrameSampler(ABC):
+    """
+    Decides which frames of a video are decoded and which are sent to the detector.
+
+    FramePipeline asks `decode(frame_index)` for every frame; frames it declines are
+    only grabbed (advanced past without decoding). Decoded frames are then offered to
+    `infer(frame_index, frame)`. Both calls happen on the decode thread, in frame order.
+    """
+
+    mode = ""
+
+    def __init__(self, frame_skip: int = FRAME_SKIP):
+        self.frame_skip = max(1, frame_skip)
+        self.frames = 0
+        self.decoded = 0
+        self.inferred = 0
+
+    @property
+    @abstractmethod
+    def cache_key(self) -> str:
+        """
+        Identifies the sampling settings, since they decide which frames have detections.
+        """
+
+    def decode(self, frame_index: int) -> bool:
+        # Called once more past the last frame, which leaves `frames` at the frame count.
+        self.frames = frame_index
+        return self._should_decode(frame_index)
+
+    def infer(self, frame_index: int, frame: np.ndarray) -> bool:
+        self.frames = frame_index + 1
+        self.decoded += 1
+        if self._should_infer(frame_index, frame):
+            self.inferred += 1
+            return True
+        return False
+
+    @abstractmethod
+    def _should_decode(self, frame_index: int) -> bool:
+        """Returns whether frame `frame_index` is decoded (otherwise only grabbed)."""
+
+    @abstractmethod
+    def _should_infer(self, frame_index: int, frame: np.ndarray) -> bool:
+        """Returns whether a decoded frame is sent to the detector."""
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns frame counts along with the detector calls saved against fixed sampling
+        every `frame_skip` frames.
+        """
+        baseline = math.ceil(self.frames / self.frame_skip)
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "decoded_frames": self.decoded,
+            "inferred_frames": self.inferred,
+            "baseline_inferred_frames": baseline,
+            "inference_saved": baseline - self.inferred,
+        }
+
+
+class FixedSampler(FrameSampler):
+    """
+    Analyses every `frame_skip`-th frame; the frames in between are never decoded.
+    """
+
+    mode = "fixed"
+
+    @property
+    def cache_key(self) -> str:
+        return f"fixed:{self.frame_skip}"
+
+    def _should_decode(self, frame_index: int) -> bool:
+        return frame_index % self.frame_skip == 0
+
+    def _should_infer(self, frame_index: int, frame: np.ndarray) -> bool:
+        return True
+
+
+class AdaptiveSampler(FrameSampler):
+    """
+    Runs the detector when the scene has changed since the frame it last analysed.
+
+    Every `min_interval`-th frame after an analysed frame is decoded as a probe and
+    shrunk to a tiny grayscale thumbnail (16 pixels wide by default), where each pixel
+    is the mean brightness of a large cell of the frame. People walking around inside
+    a cell barely move its mean, while people arriving or leaving do, so the largest
+    cell change against the last analysed frame tracks changes in the crowd rather than
+    motion alone. The probe is analysed when that change exceeds `motion_threshold`
+    grey levels, or regardless once `max_interval` frames have passed, so slow drifts
+    and static scenes are still refreshed. Frames that are not probes are only
+    grabbed, never decoded.
+
+    :param min_interval: Minimum number of frames between two analysed frames.
+    :param max_interval: Maximum number of frames between two analysed frames.
+    :param motion_threshold: Change of a cell's mean brightness (grey levels) that triggers analysis.
+    :param probe_width: Width of the motion thumbnail in pixels (cells across the frame).
+    :param frame_skip: Interval of the fixed sampler the savings are reported against.
+    """
+
+    mode = "adaptive"
+
+    def __init__(
+        self,
+        min_interval: int = 2,
+        max_interval: int = 15,
+        motion_threshold: float = 40,
+        probe_width: int = 16,
+        frame_skip: int = FRAME_SKIP,
+    ):
+        super().__init__(frame_skip)
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.motion_threshold = motion_threshold
+        self.probe_width = probe_width
+        self._reference: Optional[np.ndarray] = None
+        self._last_inferred = None
+
+    @property
+    def cache_key(self) -> str:
+        return f"adaptive:{self.min_interval}:{self.max_interval}:{self.motion_threshold}:{self.probe_width}"
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (self.probe_width, max(1, round(height * self.probe_width / width)))
+        return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def motion_energy(self, thumbnail: np.ndarray) -> float:
+        """
+        Returns the largest change of a thumbnail cell since the last analysed frame, in grey levels.
+        """
+        return float(cv2.absdiff(thumbnail, self._reference).max())
+
+    def _should_decode(self, frame_index: int) -> bool:
+        if self._last_inferred is None:
+            return True
+        return (frame_index - self._last_inferred) % self.min_interval == 0
+
+    def _should_infer(self, frame_index: int, frame: np.ndarray) -> bool:
+        thumbnail = self._thumbnail(frame)
+        if (
+            self._reference is None
+            or frame_index - self._last_inferred >= self.max_interval
+            or self.motion_energy(thumbnail) > self.motion_threshold
+        ):
+            self._reference = thumbnail
+            self._last_inferred = frame_index
+            return True
+        return False
+
+
+def make_sampler(mode: Optional[str] = None, frame_skip: int = FRAME_SKIP) -> FrameSampler:
+    """
+    Creates a sampler for one video.
+
+    :param mode: One of SAMPLING_MODES; defaults to DEFAULT_SAMPLING.
+    :param frame_skip: Interval of fixed sampling (and the reference for adaptive sampling).
+    :raises ValueError: If the mode is not supported.
+    """
+    mode = mode or DEFAULT_SAMPLING
+    if mode == "fixed":
+        return FixedSampler(frame_skip)
+    if mode == "adaptive":
+        return AdaptiveSampler(frame_skip=frame_skip)
+    raise ValueError(f"Unsupported sampling mode '{mode}', expected one of {SAMPLING_MODES}.")
@@ -0,0 +1,183 @@
+import base64
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+class StreamOptions(NamedTuple):
+    """
+    How a WebSocket client wants analysed frames delivered.
+
+    The defaults reproduce the original protocol: one JSON message per frame carrying
+    full-resolution, base64-encoded JPEGs of both the raw frame and the overlay.
+
+    :param binary: Send a JSON metadata message followed by raw image bytes instead of base64.
+    :param preview_width: Downscale images to this width (keeping aspect ratio); None keeps the source size.
+    :param quality: Encoder quality, 1-100.
+    :param image_format: "jpeg" or "webp".
+    :param send_raw: Whether the raw frame is sent in addition to the heatmap overlay.
+    """
+    binary: bool = False
+    preview_width: Optional[int] = None
+    quality: int = 95
+    image_format: str = "jpeg"
+    send_raw: bool = True
+
+    @property
+    def mode(self) -> str:
+        """
+        Short label used when reporting per-mode statistics.
+        """
+        width = self.preview_width or "full"
+        raw = "+raw" if self.send_raw else ""
+        return f"{'binary' if self.binary else 'base64'}/{self.image_format}/q{self.quality}/{width}{raw}"
+
+
+DEFAULT_STREAM_OPTIONS = StreamOptions()
+
+
+def _int_option(message: Dict[str, Any], key: str, default: Optional[int], low: int, high: int, invalid: List[str]):
+    value = message.get(key)
+    if value is None:
+        return default
+    try:
+        return max(low, min(int(value), high))
+    except (TypeError, ValueError, OverflowError):
+        invalid.append(key)
+        return default
+
+
+def _bool_option(message: Dict[str, Any], key: str, default: bool, invalid: List[str]) -> bool:
+    value = message.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    # "false" is truthy; only JSON booleans are accepted.
+    invalid.append(key)
+    return default
+
+
+def parse_stream_options(message: Dict[str, Any], invalid: Optional[List[str]] = None) -> StreamOptions:
+    """
+    Builds StreamOptions from a client "configure" message, clamping values to sane ranges.
+    Unknown, missing or malformed values fall back to the defaults.
+
+    :param message: e.g. {"type": "configure", "binary": true, "preview_width": 640, "quality": 70}
+    :param invalid: If given, the keys whose values were malformed (e.g. "quality": "high" or
+        "binary": "false"; flags must be JSON booleans) are appended to it.
+    :return: The negotiated options.
+    """
+    invalid = [] if invalid is None else invalid
+    preview_width = _int_option(message, "preview_width", None, 64, 3840, invalid)
+    image_format = str(message.get("format", DEFAULT_STREAM_OPTIONS.image_format)).lower()
+    if image_format not in IMAGE_FORMATS:
+        invalid.append("format")
+        image_format = DEFAULT_STREAM_OPTIONS.image_format
+    return StreamOptions(
+        binary=_bool_option(message, "binary", DEFAULT_STREAM_OPTIONS.binary, invalid),
+        preview_width=preview_width,
+        quality=_int_option(message, "quality", DEFAULT_STREAM_OPTIONS.quality, 1, 100, invalid),
+        image_format=image_format,
+        send_raw=_bool_option(message, "send_raw", DEFAULT_STREAM_OPTIONS.send_raw, invalid),
+    )
+
+
+def encode_image(image: np.ndarray, options: StreamOptions) -> bytes:
+    """
+    Downscales (if requested) and encodes an image according to `options`.
+    """
+    if options.preview_width and image.shape[1] > options.preview_width:
+        height = max(1, round(image.shape[0] * options.preview_width / image.shape[1]))
+        image = cv2.resize(image, (options.preview_width, height), interpolation=cv2.INTER_AREA)
+    extension, quality_flag = IMAGE_FORMATS[options.image_format]
+    _, buffer = cv2.imencode(extension, image, [quality_flag, options.quality])
+    return buffer.tobytes()
+
+
+class EncodedFrame(NamedTuple):
+    """
+    Images of one analysed frame encoded for a particular StreamOptions.
+
+    :param payloads: (name, bytes) pairs in send order, e.g. [("frame", ...), ("heatmap", ...)].
+    :param encode_ms: Time spent encoding.
+    """
+    payloads: List[Tuple[str, bytes]]
+    encode_ms: float
+
+    def messages(self, metadata: Dict[str, Any], options: StreamOptions) -> List[Any]:
+        """
+        Builds the WebSocket messages for a client: a single JSON dict in base64 mode, or
+        a JSON metadata dict followed by one bytes message per payload in binary mode.
+        """
+        if not options.binary:
+            images = {name: base64.b64encode(data).decode("utf-8") for name, data in self.payloads}
+            return [{**metadata, **images}]
+        header = {
+            **metadata,
+            "type": "frame",
+            "payloads": [
+                {"name": name, "format": options.image_format, "size": len(data)}
+                for name, data in self.payloads
+            ],
+        }
+        return [header] + [data for _, data in self.payloads]
+
+
+def encode_frame(frame: np.ndarray, overlay: np.ndarray, options: StreamOptions) -> EncodedFrame:
+    """
+    Encodes the raw frame (if requested) and the heatmap overlay for one set of options.
+    """
+    start = time.perf_counter()
+    payloads = []
+    if options.send_raw:
+        payloads.append(("frame", encode_image(frame, options)))
+    payloads.append(("heatmap", encode_image(overlay, options)))
+    return EncodedFrame(payloads, (time.perf_counter() - start) * 1000)
+
+
+def encode_for_clients(frame: np.ndarray, overlay: np.ndarray, options: Iterable[StreamOptions]) -> Dict[StreamOptions, EncodedFrame]:
+    """
+    Encodes a frame once per distinct set of client options.
+    """
+    return {opts: encode_frame(frame, overlay, opts) for opts in set(options)}
+
+
+class StreamStats:
+    """
+    Accumulates bytes per frame and encode time for each streaming mode.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, List[float]] = {}
+
+    def record(self, encoded: Dict[StreamOptions, EncodedFrame]):
+        for options, frame in encoded.items():
+            size = sum(len(data) for _, data in frame.payloads)
+            if not options.binary:
+                # base64 inflates every 3 bytes to 4
+                size = sum(4 * ((len(data) + 2) // 3) for _, data in frame.payloads)
+            totals = self._totals.setdefault(options.mode, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += size
+            totals[2] += frame.encode_ms
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns {mode: {"frames", "avg_bytes_per_frame", "avg_encode_ms"}}.
+        """
+        return {
+            mode: {
+                "frames": int(frames),
+                "avg_bytes_per_frame": round(size / frames),
+                "avg_encode_ms": round(encode_ms / frames, 3),
+            }
+            for mode, (frames, size, encode_ms) in self._totals.items()
+        }
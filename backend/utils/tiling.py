@@ -0,0 +1,291 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.analytics import Detections, detections_from_result, person_boxes
+from utils.tracking import overlapping_pairs
+from utils.zones import ZoneLayout, zone_config
+
+# Fraction of a tile shared with each neighbour, so people on a tile edge appear whole in one of them.
+TILE_OVERLAP = 0.2
+# Zones with more people than this per tile-sized square (model input size) are tiled...
+TILE_DENSITY = 8.0
+# ...with tiles of the model input size, or of half of it (a 2x zoom) above this density.
+DENSE_TILE_DENSITY = 24.0
+# Every this many frames the whole frame is tiled, so zones the whole-frame pass undercounts are found.
+FULL_TILING_INTERVAL = 10
+# Most tiles per frame; the densest zones are tiled first.
+MAX_TILES = 48
+# Most images (whole frames and tiles) per model call.
+TILE_BATCH_SIZE = 16
+# Detections of one class overlapping by more than this (intersection over the smaller box) are merged.
+MERGE_IOS = 0.5
+
+Tile = Tuple[int, int, int, int]
+
+
+def _spans(start: float, end: float, size: int, limit: int, overlap: float) -> List[int]:
+    """
+    Returns the start of each tile covering [start, end) along one axis of length `limit`.
+    """
+    size = min(size, limit)
+    start, end = max(start, 0), min(end, limit)
+    if end - start <= size:
+        return [int(min(max(round((start + end - size) / 2), 0), limit - size))]
+    count = math.ceil((end - start - size) / (size * (1 - overlap))) + 1
+    return [int(round(position)) for position in np.linspace(start, end - size, count)]
+
+
+def tile_rect(rect: Sequence[float], size: int, width: int, height: int, overlap: float = TILE_OVERLAP) -> List[Tile]:
+    """
+    Returns overlapping size x size tiles (smaller only if the frame is) covering an
+    (x1, y1, x2, y2) rectangle of a width x height frame.
+    """
+    x1, y1, x2, y2 = rect
+    tile_w, tile_h = min(size, width), min(size, height)
+    return [
+        (x, y, x + tile_w, y + tile_h)
+        for y in _spans(y1, y2, size, height, overlap)
+        for x in _spans(x1, x2, size, width, overlap)
+    ]
+
+
+def merge_detections(detections: Detections, threshold: float = MERGE_IOS) -> Detections:
+    """
+    Removes duplicate detections of the same person from overlapping tiles and the
+    whole-frame pass: greedy non-maximum suppression, highest confidence first, on
+    intersection over the smaller box. A person cut by a tile edge gives a partial box
+    that lies almost entirely inside the full one, which IoU would not catch.
+
+    Candidate pairs come from the sparse sweep of tracking.overlapping_pairs, so the
+    cost follows the number of overlapping boxes rather than its square.
+    """
+    boxes, count = detections.xyxy, len(detections.xyxy)
+    if count < 2:
+        return detections
+    # Shift each class into its own horizontal band so boxes of different classes never overlap.
+    band = float(boxes[:, 2].max() - min(boxes[:, 0].min(), 0)) + 1
+    shifted = boxes + (detections.cls.astype(np.float32) * band)[:, None] * np.array([1, 0, 1, 0], np.float32)
+    rows, cols, _ = overlapping_pairs(shifted, shifted)
+    a, b = boxes[rows], boxes[cols]
+    overlap_x = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    overlap_y = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    smaller = np.minimum((a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]), (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]))
+    ios = overlap_x * overlap_y / np.maximum(smaller, 1e-6)
+
+    order = np.argsort(-detections.conf, kind="stable")
+    rank = np.empty(count, np.int64)
+    rank[order] = np.arange(count)
+    # Keep the pairs in which the row outranks the column, grouped by the row's rank.
+    duplicate = (ios > threshold) & (rank[rows] < rank[cols])
+    rows, cols = rows[duplicate], cols[duplicate]
+    if not len(rows):
+        return detections
+    grouped = np.argsort(rank[rows], kind="stable")
+    rows, cols = rows[grouped], cols[grouped]
+    suppressed = np.zeros(count, bool)
+    boundaries = np.flatnonzero(np.diff(rows)) + 1
+    for start, end in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(rows)]])):
+        if not suppressed[rows[start]]:
+            suppressed[cols[start:end]] = True
+    keep = np.sort(np.flatnonzero(~suppressed))
+    return Detections(detections.xyxy[keep], detections.cls[keep], detections.conf[keep])
+
+
+class TiledDetector:
+    """
+    Sliced (SAHI-style) inference for dense crowds of small, distant people.
+
+    Run on a whole frame, the model sees it shrunk to its input size, where people a
+    few pixels tall are missed. Besides the whole-frame pass, this detector cuts the
+    crowded parts of each frame into overlapping tiles of the model input size, runs
+    all tiles of a batch of frames through the model in batches of `batch_size`,
+    maps their boxes back to frame coordinates and merges duplicates
+    (merge_detections).
+
+    Which parts are tiled follows the density each zone of `zones` had in previous
+    frames, in people per tile-sized square: zones above `tile_density` get tiles of
+    `tile_size`, zones above `dense_tile_density` tiles of half that size (so the
+    model sees them at twice the scale), and sparse zones only the whole-frame pass.
+    Since the whole-frame pass is what undercounts, densities are taken from tiled
+    frames: every `full_interval`-th frame (and the first) is tiled completely to
+    measure every zone (keeping the half-size tiles of dense zones, which a coarser
+    pass would undercount), and in between a zone's density is only refreshed where
+    it was tiled, or raised when the whole-frame pass finds more people.
+
+    Density is state carried across frames, so one detector serves one video or
+    stream, with frames passed in order.
+
+    :param model: Callable running detection on a list of frames (e.g. the shared ModelHandle).
+    :param zones: Zone layout whose zones decide what is tiled; defaults to the default layout.
+    :param tile_size: Tile edge in pixels; defaults to the model input size.
+    :param overlap: Fraction of a tile shared with each neighbour.
+    :param tile_density: People per tile-sized square above which a zone is tiled.
+    :param dense_tile_density: Density above which a zone gets half-size tiles.
+    :param full_interval: Frames between complete tilings of the frame.
+    :param max_tiles: Most tiles per frame.
+    :param batch_size: Most images per model call.
+    :param merge_threshold: Intersection over the smaller box above which detections are duplicates.
+    """
+
+    def __init__(
+        self,
+        model,
+        zones: Optional[ZoneLayout] = None,
+        tile_size: Optional[int] = None,
+        overlap: float = TILE_OVERLAP,
+        tile_density: float = TILE_DENSITY,
+        dense_tile_density: float = DENSE_TILE_DENSITY,
+        full_interval: int = FULL_TILING_INTERVAL,
+        max_tiles: int = MAX_TILES,
+        batch_size: int = TILE_BATCH_SIZE,
+        merge_threshold: float = MERGE_IOS,
+    ):
+        self.model = model
+        self.zones = zones if zones is not None else zone_config.get()
+        self.tile_size = tile_size or getattr(model, "imgsz", 640)
+        self.overlap = overlap
+        self.tile_density = tile_density
+        self.dense_tile_density = dense_tile_density
+        self.full_interval = max(1, full_interval)
+        self.max_tiles = max_tiles
+        self.batch_size = max(1, batch_size)
+        self.merge_threshold = merge_threshold
+        # People per tile-sized square of each zone, from the latest measurement.
+        self.density: Optional[np.ndarray] = None
+        self.frames = 0
+        self.tiles = 0
+        self.full_frames = 0
+        self._geometry: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identifies this detector's output for the detection cache: the model, the
+        tiling settings and the geometry of the zones that steer them (not just the
+        layout's name, which survives edits).
+        """
+        return (
+            f"{self.model.cache_key}:tiled:{self.zones.fingerprint}:{self.tile_size}:{self.overlap}:"
+            f"{self.tile_density}:{self.dense_tile_density}:{self.full_interval}:{self.max_tiles}:{self.merge_threshold}"
+        )
+
+    def _zone_geometry(self, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns each zone's bounding rectangle in pixels and its area in tile-sized squares.
+        """
+        geometry = self._geometry.get((width, height))
+        if geometry is None:
+            scale = np.array([width, height], np.float64)
+            rects, squares = [], []
+            for zone in self.zones.zones:
+                polygon = zone.polygon * scale
+                rects.append([*polygon.min(axis=0), *polygon.max(axis=0)])
+                x, y = polygon[:, 0], polygon[:, 1]
+                area = abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+                squares.append(max(area, 1.0) / self.tile_size ** 2)
+            geometry = self._geometry[(width, height)] = (np.array(rects), np.array(squares))
+        return geometry
+
+    def plan(self, width: int, height: int, full: bool = False) -> Tuple[List[Tile], np.ndarray]:
+        """
+        Returns the tiles of a frame and which zones they cover.
+
+        :param full: Tile the whole frame, whatever the density.
+        """
+        rects, _ = self._zone_geometry(width, height)
+        covered = np.zeros(len(rects), bool)
+        tiles: List[Tile] = []
+        if full or self.density is None:
+            covered[:] = True
+            tiles = tile_rect((0, 0, width, height), self.tile_size, width, height, self.overlap)
+            if self.density is None:
+                return tiles, covered
+        for index in np.argsort(-self.density, kind="stable"):
+            density = self.density[index]
+            if density <= self.tile_density:
+                break
+            if full and density <= self.dense_tile_density:
+                # Already covered by the full tiling at this size
+                continue
+            size = self.tile_size // 2 if density > self.dense_tile_density else self.tile_size
+            zone_tiles = [tile for tile in tile_rect(rects[index], size, width, height, self.overlap) if tile not in tiles]
+            if len(tiles) + len(zone_tiles) > self.max_tiles:
+                continue
+            tiles.extend(zone_tiles)
+            covered[index] = True
+        return tiles, covered
+
+    def _measure(self, detections: Detections, width: int, height: int, covered: np.ndarray):
+        _, squares = self._zone_geometry(width, height)
+        labels = self.zones.labels(person_boxes(detections), width, height)
+        density = np.bincount(labels, minlength=len(squares) + 1)[:len(squares)] / squares
+        if self.density is None:
+            self.density = density
+        else:
+            self.density = np.where(covered, density, np.maximum(self.density, density))
+
+    def __call__(self, frames: Sequence[np.ndarray]) -> List[Detections]:
+        """
+        Detects people in a batch of frames (in stream order) and returns one Detections per frame.
+        """
+        # Tiles are planned from the density measured before this batch.
+        plans = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            full = self.density is None or self.frames % self.full_interval == 0
+            plans.append(self.plan(width, height, full))
+            self.full_frames += full
+            self.frames += 1
+        images = list(frames)
+        offsets = []
+        for frame, (tiles, _) in zip(frames, plans):
+            for x1, y1, x2, y2 in tiles:
+                images.append(frame[y1:y2, x1:x2])
+                offsets.append((x1, y1))
+        self.tiles += len(offsets)
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            results.extend(detections_from_result(result) for result in self.model(images[start:start + self.batch_size]))
+
+        output = []
+        tile_index = 0
+        for i, (frame, (tiles, covered)) in enumerate(zip(frames, plans)):
+            parts = [results[i]]
+            for _ in tiles:
+                detections = results[len(frames) + tile_index]
+                x, y = offsets[tile_index]
+                parts.append(detections._replace(xyxy=detections.xyxy + np.array([x, y, x, y], np.float32)))
+                tile_index += 1
+            merged = merge_detections(
+                Detections(
+                    np.concatenate([part.xyxy for part in parts]),
+                    np.concatenate([part.cls for part in parts]),
+                    np.concatenate([part.conf for part in parts]),
+                ),
+                self.merge_threshold,
+            )
+            height, width = frame.shape[:2]
+            self._measure(merged, width, height, covered)
+            output.append(merged)
+        return output
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the tile size and how many tiles were run, in total and per frame.
+        """
+        return {
+            "tile_size": self.tile_size,
+            "frames": self.frames,
+            "tiles": self.tiles,
+            "tiles_per_frame": round(self.tiles / self.frames, 2) if self.frames else 0.0,
+            "full_tiling_frames": self.full_frames,
+        }
+
+
+def detection_key(model, zones: ZoneLayout, tiled: bool = False) -> str:
+    """
+    Returns the detection cache identity of `model`'s detections, tiled or whole-frame.
+    """
+    return TiledDetector(model, zones).cache_key if tiled else model.cache_key
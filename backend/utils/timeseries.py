@@ -0,0 +1,530 @@
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from rich.console import Console
+
+from utils.metrics import metrics
+
+console = Console()
+
+# Time-series database; override with STAMPEDE_TIMESERIES_DB.
+TIMESERIES_DB = os.getenv(
+    "STAMPEDE_TIMESERIES_DB", os.path.join(os.getenv("STAMPEDE_DATA_DIR", "data"), "timeseries.sqlite3")
+)
+# Days of raw samples kept; rollups are kept longer (see RETENTION_DAYS).
+RAW_RETENTION_DAYS = float(os.getenv("STAMPEDE_TIMESERIES_RAW_DAYS", "7"))
+
+# Rollup resolutions in seconds, finest first, with the table holding each.
+RESOLUTIONS = {"1s": 1, "1m": 60, "1h": 3600}
+# Days each table is kept for (None: forever).
+RETENTION_DAYS = {"raw": RAW_RETENTION_DAYS, "1s": 30.0, "1m": 400.0, "1h": None}
+
+# Samples buffered in memory at most; further samples are dropped (and counted) until the writer catches up.
+MAX_PENDING = 100_000
+# The writer commits at least this often (seconds) while samples are arriving.
+FLUSH_INTERVAL = 0.5
+# Expired rows are deleted this often (seconds).
+PRUNE_INTERVAL = 3600.0
+
+INSERT_SAMPLE = "INSERT OR IGNORE INTO samples (series_id, ts, count, danger) VALUES (?, ?, ?, ?)"
+
+# Region name of the whole-frame count, next to the quadrant names.
+GLOBAL_REGION = "global"
+
+
+class Sample(NamedTuple):
+    """
+    Counts of one analysed frame of one source (a camera or an analysed video).
+    Timestamps are Unix time, or seconds into the video for video-time sources.
+    """
+    source: str
+    timestamp: float
+    people: int
+    quadrant_counts: Dict[str, int]
+    danger_zones: List[str]
+    video_time: bool = False
+
+
+class TimeSeriesStore:
+    """
+    Append-optimised SQLite store of per-source, per-region people counts.
+
+    Every analysed frame becomes one row per region (the whole frame is region
+    "global") in `samples`, keyed by (series, timestamp) in a WITHOUT ROWID table so
+    each series is stored contiguously in time order. Alongside, 1s/1m/1h rollups
+    (sample count, sum, minimum, maximum and frames in danger per bucket) are
+    maintained incrementally, so range queries read at most a few thousand rows
+    whatever the time span.
+
+    Cameras record in Unix time. Analysed videos record in video time (seconds from
+    the start of the video), in series flagged `video_time`. Those series are not
+    pruned, and a video recorded again (a resumed job or a re-run) lands on the same
+    (series, timestamp) keys. Samples already stored are kept, and only newly stored
+    samples are rolled up, so repeats never count twice.
+
+    record() only appends to an in-memory queue and can be called from any thread;
+    a writer thread commits whatever has accumulated as one transaction at least every
+    FLUSH_INTERVAL seconds, aggregating the batch per bucket before upserting the
+    rollups. Queries use their own connection; with WAL they never wait for the writer.
+
+    :param path: Database file.
+    :param max_pending: Samples buffered before new ones are dropped.
+    :param flush_interval: Longest time samples wait in memory, in seconds.
+    :param retention_days: Days each of "raw", "1s", "1m" and "1h" is kept (None: forever).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_pending: int = MAX_PENDING,
+        flush_interval: float = FLUSH_INTERVAL,
+        retention_days: Optional[Dict[str, Optional[float]]] = None,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retention_days = {**RETENTION_DAYS, **(retention_days or {})}
+        self.recorded = 0
+        self.dropped = 0
+        self.written_rows = 0
+        self.duplicate_rows = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+        self._queue: "queue.Queue[Optional[Sample]]" = queue.Queue(maxsize=max_pending)
+        metrics.watch_queue("timeseries", self._queue)
+        self._thread: Optional[threading.Thread] = None
+        self._series: Dict[Tuple[str, str], int] = {}
+        # Latest stored timestamp per series id, as known to the writer
+        self._last_ts: Dict[int, float] = {}
+        self._read_lock = threading.Lock()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints only; losing the last commits on power loss is acceptable here.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS series (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                region TEXT NOT NULL,
+                video_time INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (source, region)
+            )
+            """
+        )
+        # Databases created before video time was separated from Unix time
+        if "video_time" not in [row[1] for row in conn.execute("PRAGMA table_info(series)")]:
+            conn.execute("ALTER TABLE series ADD COLUMN video_time INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS samples (
+                series_id INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                count INTEGER NOT NULL,
+                danger INTEGER NOT NULL,
+                PRIMARY KEY (series_id, ts)
+            ) WITHOUT ROWID
+            """
+        )
+        for name in RESOLUTIONS:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS rollup_{name} (
+                    series_id INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    n INTEGER NOT NULL,
+                    sum REAL NOT NULL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    danger INTEGER NOT NULL,
+                    PRIMARY KEY (series_id, bucket)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def start(self):
+        """
+        Creates the tables if needed and starts the writer thread.
+        """
+        if self._thread is not None:
+            return
+        conn = self._connect()
+        self._create_tables(conn)
+        self._reader = conn
+        self._thread = threading.Thread(target=self._writer, name="timeseries-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Writes everything recorded so far and stops the writer thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def record(
+        self,
+        source: str,
+        timestamp: float,
+        people: int,
+        quadrant_counts: Dict[str, int],
+        danger_zones: List[str],
+        video_time: bool = False,
+    ):
+        """
+        Queues one analysed frame for writing. Never blocks; if the writer has fallen
+        MAX_PENDING samples behind the sample is dropped.
+
+        :param source: Camera or video the frame belongs to.
+        :param timestamp: Unix time of the frame, or seconds into the video with `video_time`.
+        :param people: People in the frame.
+        :param quadrant_counts: People per quadrant.
+        :param danger_zones: Quadrants in alert.
+        :param video_time: The source is a video timestamped in video time; only taken
+            into account when its series are first created.
+        """
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(Sample(source, timestamp, people, quadrant_counts, danger_zones, video_time))
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self._queue.get()
+                deadline = time.monotonic() + self.flush_interval
+                while item is not None:
+                    batch.append(item)
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    running = False
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self.write(conn, batch)
+                if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    self._last_prune = time.monotonic()
+                    self.prune(conn)
+            except Exception as e:
+                console.print(f"[bold red]Time-series write failed, {len(batch)} samples lost:[/bold red] {e!r}")
+        conn.close()
+
+    def _series_id(self, conn: sqlite3.Connection, source: str, region: str, video_time: bool = False) -> int:
+        key = (source, region)
+        series_id = self._series.get(key)
+        if series_id is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO series (source, region, video_time) VALUES (?, ?, ?)", (*key, int(video_time))
+            )
+            series_id = conn.execute("SELECT id FROM series WHERE source = ? AND region = ?", key).fetchone()[0]
+            self._series[key] = series_id
+        return series_id
+
+    def _last_timestamp(self, conn: sqlite3.Connection, series_id: int) -> float:
+        last = self._last_ts.get(series_id)
+        if last is None:
+            last = conn.execute("SELECT MAX(ts) FROM samples WHERE series_id = ?", (series_id,)).fetchone()[0]
+            last = self._last_ts[series_id] = -math.inf if last is None else last
+        return last
+
+    def write(self, conn: sqlite3.Connection, batch: List[Sample]):
+        """
+        Writes a batch of samples and folds them into the rollups, in one transaction.
+        Called by the writer thread (and directly by benchmarks).
+
+        Samples whose (series, timestamp) is already stored are ignored, and only the
+        rows actually inserted are aggregated into 1s buckets; each coarser rollup is
+        then aggregated from the previous one, since count, sum, min, max and danger
+        combine exactly. Rows after the last stored timestamp of their series (all of
+        them, for live sources) cannot be duplicates and are inserted in bulk; only
+        the others are inserted one at a time to see whether they were new.
+        """
+        start = time.perf_counter()
+        rows = []
+        new_rows = []
+        # (series_id, bucket) -> [n, sum, min, max, danger] per resolution, finest first.
+        buckets: Dict[Tuple[int, int], List[float]] = {}
+        inserted = 0
+        conn.execute("BEGIN")
+        try:
+            for sample in batch:
+                second = int(sample.timestamp // 1)
+                values = [(GLOBAL_REGION, sample.people, bool(sample.danger_zones))]
+                values.extend(
+                    (region, count, region in sample.danger_zones) for region, count in sample.quadrant_counts.items()
+                )
+                for region, count, danger in values:
+                    series_id = self._series_id(conn, sample.source, region, sample.video_time)
+                    row = (series_id, sample.timestamp, count, int(danger))
+                    rows.append(row)
+                    if sample.timestamp > self._last_timestamp(conn, series_id):
+                        self._last_ts[series_id] = sample.timestamp
+                        new_rows.append(row)
+                    else:
+                        # Keep the insertion order, so a repeat within the batch is seen as one.
+                        conn.executemany(INSERT_SAMPLE, new_rows)
+                        new_rows.clear()
+                        if not conn.execute(INSERT_SAMPLE, row).rowcount:
+                            continue
+                    inserted += 1
+                    key = (series_id, second)
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        buckets[key] = [1, count, count, count, int(danger)]
+                    else:
+                        bucket[0] += 1
+                        bucket[1] += count
+                        if count < bucket[2]:
+                            bucket[2] = count
+                        if count > bucket[3]:
+                            bucket[3] = count
+                        bucket[4] += danger
+            conn.executemany(INSERT_SAMPLE, new_rows)
+
+            previous_seconds = 1
+            for name, seconds in RESOLUTIONS.items():
+                if seconds != previous_seconds:
+                    factor = seconds // previous_seconds
+                    coarser: Dict[Tuple[int, int], List[float]] = {}
+                    for (series_id, index), (n, total, low, high, danger) in buckets.items():
+                        key = (series_id, index // factor)
+                        bucket = coarser.get(key)
+                        if bucket is None:
+                            coarser[key] = [n, total, low, high, danger]
+                        else:
+                            bucket[0] += n
+                            bucket[1] += total
+                            bucket[2] = min(bucket[2], low)
+                            bucket[3] = max(bucket[3], high)
+                            bucket[4] += danger
+                    buckets, previous_seconds = coarser, seconds
+                conn.executemany(
+                    f"""
+                    INSERT INTO rollup_{name} (series_id, bucket, n, sum, min, max, danger) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (series_id, bucket) DO UPDATE SET
+                        n = n + excluded.n, sum = sum + excluded.sum, min = MIN(min, excluded.min),
+                        max = MAX(max, excluded.max), danger = danger + excluded.danger
+                    """,
+                    [(*key, *values) for key, values in buckets.items()],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # Series ids created in the failed transaction no longer exist.
+            self._series.clear()
+            self._last_ts.clear()
+            raise
+        self.batches += 1
+        self.written_rows += inserted
+        self.duplicate_rows += len(rows) - inserted
+        self.write_seconds += time.perf_counter() - start
+
+    def prune(self, conn: sqlite3.Connection, now: Optional[float] = None):
+        """
+        Deletes raw samples and rollups older than their retention period, one series
+        at a time so each delete is a range scan of the primary key. Video-time series
+        are kept.
+        """
+        now = time.time() if now is None else now
+        series_ids = [row[0] for row in conn.execute("SELECT id FROM series WHERE video_time = 0")]
+        for name, days in self.retention_days.items():
+            if days is None:
+                continue
+            cutoff = now - days * 86400
+            if name == "raw":
+                sql = "DELETE FROM samples WHERE series_id = ? AND ts < ?"
+            else:
+                sql = f"DELETE FROM rollup_{name} WHERE series_id = ? AND bucket < ?"
+                cutoff = int(cutoff // RESOLUTIONS[name])
+            conn.execute("BEGIN")
+            conn.executemany(sql, [(series_id, cutoff) for series_id in series_ids])
+            conn.execute("COMMIT")
+
+    def _read(self, sql: str, args=()) -> List[tuple]:
+        if self._reader is None:
+            raise RuntimeError("TimeSeriesStore has not been started.")
+        with self._read_lock:
+            return self._reader.execute(sql, args).fetchall()
+
+    def _lookup(self, source: str, region: str) -> Optional[int]:
+        row = self._read("SELECT id FROM series WHERE source = ? AND region = ?", (source, region))
+        return row[0][0] if row else None
+
+    def is_video_time(self, source: str) -> bool:
+        """
+        Returns whether `source` is timestamped in video time.
+        """
+        return bool(self._read("SELECT 1 FROM series WHERE source = ? AND video_time = 1 LIMIT 1", (source,)))
+
+    def sources(self) -> List[Dict[str, Any]]:
+        """
+        Returns every recorded source with its regions, whether it is in video time,
+        and the start of the last minute it has data for.
+        """
+        rows = self._read(
+            """
+            SELECT source, region, video_time, (SELECT MAX(bucket) FROM rollup_1m WHERE series_id = series.id)
+            FROM series ORDER BY source, id
+            """
+        )
+        sources: Dict[str, Dict[str, Any]] = {}
+        for source, region, video_time, last_minute in rows:
+            entry = sources.setdefault(
+                source, {"source": source, "regions": [], "video_time": bool(video_time), "last_seen": None}
+            )
+            entry["regions"].append(region)
+            if last_minute is not None:
+                entry["last_seen"] = max(entry["last_seen"] or 0, last_minute * 60)
+        return list(sources.values())
+
+    @staticmethod
+    def pick_resolution(start: float, end: float, max_points: int) -> Tuple[str, int]:
+        """
+        Returns the finest rollup giving at most `max_points` buckets over [start, end),
+        and how many of its buckets to merge per point when even the coarsest gives more.
+        """
+        span = max(end - start, 0.0)
+        for name, seconds in RESOLUTIONS.items():
+            if span / seconds <= max_points:
+                return name, 1
+        return name, math.ceil(span / seconds / max_points)
+
+    def series(
+        self, source: str, region: str, start: float, end: float, resolution: str = "auto", max_points: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Returns the counts of one region over [start, end).
+
+        :param source: Camera or video.
+        :param region: Quadrant name or "global".
+        :param start: Unix time of the first sample included.
+        :param end: Unix time after the last sample included.
+        :param resolution: "raw", one of RESOLUTIONS, or "auto" for the finest rollup giving at
+            most `max_points` points (merging 1h buckets for very long spans).
+        :param max_points: Limit on the points returned; `truncated` is set when it was reached.
+        :return: The seconds per point and points with the mean, minimum and maximum count,
+            number of samples and fraction of samples in danger.
+        """
+        factor = 1
+        if resolution == "auto":
+            resolution, factor = self.pick_resolution(start, end, max_points)
+        series_id = self._lookup(source, region)
+        points = []
+        if series_id is not None and resolution == "raw":
+            rows = self._read(
+                "SELECT ts, count, danger FROM samples WHERE series_id = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+                (series_id, start, end, max_points),
+            )
+            points = [{"t": ts, "mean": count, "min": count, "max": count, "samples": 1, "danger": float(danger)}
+                      for ts, count, danger in rows]
+        elif series_id is not None:
+            seconds = RESOLUTIONS[resolution]
+            rows = self._read(
+                f"SELECT bucket / ? AS point, SUM(n), SUM(sum), MIN(min), MAX(max), SUM(danger) FROM rollup_{resolution}"
+                f" WHERE series_id = ? AND bucket >= ? AND bucket < ? GROUP BY point ORDER BY point LIMIT ?",
+                (factor, series_id, math.floor(start / seconds), math.ceil(end / seconds), max_points),
+            )
+            points = [
+                {"t": point * factor * seconds, "mean": round(total / n, 3), "min": low, "max": high,
+                 "samples": n, "danger": round(danger / n, 3)}
+                for point, n, total, low, high, danger in rows
+            ]
+        return {
+            "source": source, "region": region, "resolution": resolution,
+            "seconds_per_point": None if resolution == "raw" else RESOLUTIONS[resolution] * factor,
+            "points": points, "truncated": len(points) >= max_points,
+        }
+
+    @staticmethod
+    def _tiles(start: int, end: int, levels=("1h", "1m", "1s")) -> Iterator[Tuple[str, int, int]]:
+        """
+        Covers whole seconds [start, end) with the fewest rollup buckets: whole hours
+        in the middle, then whole minutes, then seconds at the edges. Yields
+        (resolution, first bucket, end bucket).
+        """
+        name, finer = levels[0], levels[1:]
+        seconds = RESOLUTIONS[name]
+        first, last = -(-start // seconds), end // seconds
+        if not finer:
+            if start < end:
+                yield name, start, end
+            return
+        if first >= last:
+            yield from TimeSeriesStore._tiles(start, end, finer)
+            return
+        yield from TimeSeriesStore._tiles(start, first * seconds, finer)
+        yield name, first, last
+        yield from TimeSeriesStore._tiles(last * seconds, end, finer)
+
+    def aggregate(self, source: str, region: str, start: float, end: float) -> Dict[str, Any]:
+        """
+        Returns the mean, minimum and maximum count, number of samples and fraction
+        in danger of one region over [start, end), rounded out to whole seconds.
+        Ranges are assembled from the coarsest rollups that fit, so even months of
+        data take a handful of index range scans.
+        """
+        result = {"source": source, "region": region, "start": start, "end": end,
+                  "samples": 0, "mean": None, "min": None, "max": None, "danger": None}
+        series_id = self._lookup(source, region)
+        if series_id is None:
+            return result
+        tiles = list(self._tiles(math.floor(start), math.ceil(end)))
+        if not tiles:
+            return result
+        sql = " UNION ALL ".join(
+            f"SELECT SUM(n), SUM(sum), MIN(min), MAX(max), SUM(danger) FROM rollup_{name}"
+            f" WHERE series_id = ? AND bucket >= ? AND bucket < ?"
+            for name, _, _ in tiles
+        )
+        args = [value for _, first, last in tiles for value in (series_id, first, last)]
+        n = total = danger = 0
+        low = high = None
+        for part_n, part_sum, part_min, part_max, part_danger in self._read(sql, args):
+            if not part_n:
+                continue
+            n += part_n
+            total += part_sum
+            danger += part_danger
+            low = part_min if low is None else min(low, part_min)
+            high = part_max if high is None else max(high, part_max)
+        if n:
+            result.update(samples=n, mean=round(total / n, 3), min=low, max=high, danger=round(danger / n, 3))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recorded_samples": self.recorded,
+            "dropped_samples": self.dropped,
+            "pending_samples": self._queue.qsize(),
+            "written_rows": self.written_rows,
+            "duplicate_rows": self.duplicate_rows,
+            "batches": self.batches,
+            "write_ms_per_batch": round(self.write_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+        }
+
+
+timeseries_store = TimeSeriesStore(TIMESERIES_DB)
@@ -0,0 +1,364 @@
+import math
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.zones import ZoneLayout, zone_config
+
+# Detections at or above this confidence are matched first and may start tracks; weaker
+# ones (down to LOW_CONFIDENCE) can only continue an existing track, as in ByteTrack.
+HIGH_CONFIDENCE = 0.5
+LOW_CONFIDENCE = 0.1
+# Minimum overlap between a track's predicted box and a detection for them to match.
+MATCH_IOU = 0.2
+# A track is dropped after this many seconds without a matching detection.
+MAX_AGE = 1.0
+# Matches needed before a track counts (filters out detector flicker).
+MIN_HITS = 2
+# Upper bound on live tracks, which bounds the per-frame cost.
+MAX_TRACKS = 1000
+# Rounds of mutual-best matching per association; each round matches at least one pair.
+MATCH_ROUNDS = 8
+# Inflow and outflow rates are measured over this many seconds.
+FLOW_WINDOW = 10.0
+
+# Gains of the alpha-beta filter smoothing track positions and velocities.
+POSITION_GAIN = 0.7
+VELOCITY_GAIN = 0.3
+
+
+def pair_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Returns the intersection over union of corresponding rows of two (N, 4) xyxy box arrays.
+    """
+    overlap_x = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    overlap_y = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    intersection = overlap_x * overlap_y
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+def overlapping_pairs(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the pairs of boxes from `a` and `b` that overlap, with their IoU.
+
+    Instead of comparing every box with every other, `b` is sorted by its left edge
+    and each box of `a` is only compared with the boxes of `b` that start within its
+    horizontal extent (widened by the widest box of `b`). The cost grows with the
+    number of nearby pairs rather than with len(a) * len(b).
+
+    :return: Row indices into `a`, row indices into `b` and the IoU of each overlapping pair.
+    """
+    if not len(a) or not len(b):
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    order = np.argsort(b[:, 0], kind="stable")
+    left = b[order, 0]
+    widest = float((b[:, 2] - b[:, 0]).max())
+    first = np.searchsorted(left, a[:, 0] - widest, side="right")
+    last = np.searchsorted(left, a[:, 2], side="left")
+    counts = np.maximum(last - first, 0)
+    total = int(counts.sum())
+    rows = np.repeat(np.arange(len(a)), counts)
+    offsets = np.cumsum(counts) - counts
+    cols = order[np.repeat(first - offsets, counts) + np.arange(total)]
+    iou = pair_iou(a[rows], b[cols])
+    overlapping = iou > 0
+    return rows[overlapping], cols[overlapping], iou[overlapping]
+
+
+def match(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, threshold: float,
+          rounds: int = MATCH_ROUNDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matches rows to columns given scored candidate pairs, in vectorised rounds: every
+    pair that is the best remaining one of both its row and its column is matched,
+    and their other pairs are removed. The highest remaining score is always such a
+    pair, so every round makes progress; after `rounds` rounds whatever is left stays
+    unmatched.
+
+    :param rows: Row index of each candidate pair.
+    :param cols: Column index of each candidate pair.
+    :param scores: Similarity of each candidate pair.
+    :param threshold: Pairs scoring below this are never matched.
+    :return: Matched row and column indices.
+    """
+    keep = scores >= threshold
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    matched_rows, matched_cols = [], []
+    for _ in range(rounds):
+        if not len(scores):
+            break
+        best = np.zeros((2, len(scores)), bool)
+        for side, index in enumerate((rows, cols)):
+            order = np.lexsort((-scores, index))
+            leaders = np.ones(len(order), bool)
+            leaders[1:] = index[order][1:] != index[order][:-1]
+            best[side, order[leaders]] = True
+        mutual = best[0] & best[1]
+        if not mutual.any():
+            break
+        matched_rows.append(rows[mutual])
+        matched_cols.append(cols[mutual])
+        remaining = ~(np.isin(rows, rows[mutual]) | np.isin(cols, cols[mutual]))
+        rows, cols, scores = rows[remaining], cols[remaining], scores[remaining]
+    if not matched_rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(matched_rows), np.concatenate(matched_cols)
+
+
+class Tracker:
+    """
+    Multi-object tracker for person boxes, in the style of SORT/ByteTrack, plus the
+    crowd-flow metrics derived from its tracks.
+
+    Tracks are kept as NumPy arrays rather than objects, so an update is a handful of
+    vectorised operations whatever the crowd size: positions are predicted with a
+    constant-velocity model, matched to nearby detections by IoU (high-confidence
+    detections first, then low-confidence ones to bridge missed detections), and
+    corrected with an alpha-beta filter. Timestamps may be unevenly spaced, as with
+    adaptive frame sampling; velocities are in pixels per second. The number of live
+    tracks is capped at `max_tracks`.
+
+    Per zone the tracker reports:
+
+    - inflow/outflow per minute: confirmed tracks entering or leaving the region
+      (including appearing in or disappearing from the frame, or moving to a spot outside
+      all zones) over `flow_window` seconds.
+    - speed and direction: mean speed and heading of the region's moving people, and
+      coherence (1 when everyone moves the same way, near 0 when movement is random).
+    - dwell: how long the people currently in the region have been there.
+
+    :param width: Frame width.
+    :param height: Frame height.
+    :param zones: Zone layout the metrics are reported for; defaults to the default layout.
+    :param max_age: Seconds a track survives without detections.
+    :param min_hits: Matches before a track is confirmed.
+    :param max_tracks: Maximum number of live tracks.
+    :param flow_window: Window of the inflow/outflow rates, in seconds.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        zones: Optional[ZoneLayout] = None,
+        max_age: float = MAX_AGE,
+        min_hits: int = MIN_HITS,
+        max_tracks: int = MAX_TRACKS,
+        flow_window: float = FLOW_WINDOW,
+    ):
+        self.width = width
+        self.height = height
+        self.zones = zones if zones is not None else zone_config.get()
+        self.regions = self.zones.names
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.max_tracks = max_tracks
+        self.flow_window = flow_window
+
+        self.ids = np.zeros(0, np.int64)
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.velocity = np.zeros((0, 2), np.float32)
+        self.hits = np.zeros(0, np.int32)
+        self.first_seen = np.zeros(0, np.float64)
+        self.last_seen = np.zeros(0, np.float64)
+        # Zone of each confirmed track (-1 before confirmation or outside all zones) and since when it is there.
+        self.region = np.zeros(0, np.int64)
+        self.region_since = np.zeros(0, np.float64)
+        self._next_id = 1
+        self._start: Optional[float] = None
+        self._now = 0.0
+
+        cells = len(self.regions)
+        self.total_inflow = np.zeros(cells, np.int64)
+        self.total_outflow = np.zeros(cells, np.int64)
+        self.completed_dwell = np.zeros(cells, np.float64)
+        self.completed_visits = np.zeros(cells, np.int64)
+        self.peak_tracks = 0
+        self._flow_events = deque()
+        self._window_inflow = np.zeros(cells, np.int64)
+        self._window_outflow = np.zeros(cells, np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def confirmed(self) -> np.ndarray:
+        return self.hits >= self.min_hits
+
+    def _keep(self, mask: np.ndarray):
+        for name in ("ids", "boxes", "velocity", "hits", "first_seen", "last_seen", "region", "region_since"):
+            setattr(self, name, getattr(self, name)[mask])
+
+    def _record_flow(self, timestamp: float, inflow: np.ndarray, outflow: np.ndarray):
+        cells = len(self.regions)
+        inflow = np.bincount(inflow, minlength=cells)
+        outflow = np.bincount(outflow, minlength=cells)
+        self.total_inflow += inflow
+        self.total_outflow += outflow
+        self._window_inflow += inflow
+        self._window_outflow += outflow
+        self._flow_events.append((timestamp, inflow, outflow))
+        while self._flow_events and self._flow_events[0][0] < timestamp - self.flow_window:
+            _, old_inflow, old_outflow = self._flow_events.popleft()
+            self._window_inflow -= old_inflow
+            self._window_outflow -= old_outflow
+
+    def _leave(self, leaving: np.ndarray, timestamp: float) -> np.ndarray:
+        """
+        Accounts for tracks leaving their region and returns those regions.
+        """
+        regions = self.region[leaving]
+        placed = regions >= 0
+        np.add.at(self.completed_dwell, regions[placed], timestamp - self.region_since[leaving][placed])
+        np.add.at(self.completed_visits, regions[placed], 1)
+        return regions[placed]
+
+    def update(self, timestamp: float, boxes: np.ndarray, confidences: Optional[np.ndarray] = None):
+        """
+        Advances the tracks to a new frame.
+
+        :param timestamp: Time of the frame in seconds, non-decreasing.
+        :param boxes: (N, 4) xyxy person boxes.
+        :param confidences: (N,) detection confidences; all are treated as high if omitted.
+        """
+        if self._start is None:
+            self._start = timestamp
+        self._now = timestamp
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+        if confidences is None:
+            confidences = np.ones(len(boxes), np.float32)
+        keep = confidences >= LOW_CONFIDENCE
+        boxes, confidences = boxes[keep], confidences[keep]
+
+        # Predict every track's box at this timestamp.
+        dt = (timestamp - self.last_seen).astype(np.float32)
+        predicted = self.boxes + np.tile(self.velocity * dt[:, None], 2)
+
+        # First association: all tracks with the high-confidence detections.
+        high = np.flatnonzero(confidences >= HIGH_CONFIDENCE)
+        low = np.flatnonzero(confidences < HIGH_CONFIDENCE)
+        track_rows, det_rows = match(*overlapping_pairs(predicted, boxes[high]), MATCH_IOU)
+        matched_tracks, matched_dets = [track_rows], [high[det_rows]]
+        # Second association: tracks still unmatched with the low-confidence detections.
+        unmatched = np.ones(len(self.ids), bool)
+        unmatched[track_rows] = False
+        remaining = np.flatnonzero(unmatched)
+        if len(remaining) and len(low):
+            track_rows, det_rows = match(*overlapping_pairs(predicted[remaining], boxes[low]), MATCH_IOU)
+            matched_tracks.append(remaining[track_rows])
+            matched_dets.append(low[det_rows])
+        matched_tracks = np.concatenate(matched_tracks)
+        matched_dets = np.concatenate(matched_dets)
+
+        # Correct matched tracks: alpha-beta filter on the box center, smoothed box size.
+        if len(matched_tracks):
+            detected = boxes[matched_dets]
+            prediction = predicted[matched_tracks]
+            residual = (detected[:, :2] + detected[:, 2:] - prediction[:, :2] - prediction[:, 2:]) / 2
+            center = (prediction[:, :2] + prediction[:, 2:]) / 2 + POSITION_GAIN * residual
+            size = ((prediction[:, 2:] - prediction[:, :2]) + (detected[:, 2:] - detected[:, :2])) / 2
+            elapsed = np.maximum(dt[matched_tracks], 1e-3)[:, None]
+            first_match = (self.hits[matched_tracks] == 1)[:, None]
+            previous_center = (self.boxes[matched_tracks, :2] + self.boxes[matched_tracks, 2:]) / 2
+            # A track's first velocity is its displacement; later ones are filtered.
+            self.velocity[matched_tracks] = np.where(
+                first_match,
+                ((detected[:, :2] + detected[:, 2:]) / 2 - previous_center) / elapsed,
+                self.velocity[matched_tracks] + VELOCITY_GAIN * residual / elapsed,
+            )
+            self.boxes[matched_tracks] = np.concatenate([center - size / 2, center + size / 2], axis=1)
+            self.hits[matched_tracks] += 1
+            self.last_seen[matched_tracks] = timestamp
+
+        # Drop tracks that missed: tentative ones immediately, confirmed ones after max_age.
+        missed = np.ones(len(self.ids), bool)
+        missed[matched_tracks] = False
+        expired = missed & (~self.confirmed | (timestamp - self.last_seen > self.max_age))
+        outflow = [self._leave(expired, timestamp)]
+        self._keep(~expired)
+
+        # Start tentative tracks from unmatched high-confidence detections, within the cap.
+        new = np.setdiff1d(high, matched_dets, assume_unique=True)
+        room = self.max_tracks - len(self.ids)
+        if len(new) > room:
+            new = new[np.argsort(-confidences[new])[:max(room, 0)]]
+        if len(new):
+            count = len(new)
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + count)])
+            self._next_id += count
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((count, 2), np.float32)])
+            self.hits = np.concatenate([self.hits, np.ones(count, np.int32)])
+            self.first_seen = np.concatenate([self.first_seen, np.full(count, timestamp)])
+            self.last_seen = np.concatenate([self.last_seen, np.full(count, timestamp)])
+            self.region = np.concatenate([self.region, np.full(count, -1, np.int64)])
+            self.region_since = np.concatenate([self.region_since, np.full(count, timestamp)])
+
+        # Region changes of confirmed tracks seen in this frame.
+        seen = self.confirmed & (self.last_seen == timestamp)
+        cells = np.full(len(self.ids), -1, np.int64)
+        if seen.any():
+            cells[seen] = self.zones.labels(self.boxes[seen], self.width, self.height)
+            cells[cells == len(self.regions)] = -1
+        moved = seen & (cells != self.region)
+        outflow.append(self._leave(moved, timestamp))
+        inflow = cells[moved]
+        inflow = inflow[inflow >= 0]
+        self.region[moved] = cells[moved]
+        self.region_since[moved] = timestamp
+        self._record_flow(timestamp, inflow, np.concatenate(outflow))
+        self.peak_tracks = max(self.peak_tracks, int(self.confirmed.sum()))
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the current flow, motion and dwell metrics per region.
+        """
+        cells = len(self.regions)
+        present = self.confirmed & (self.region >= 0)
+        regions = self.region[present]
+        velocity = self.velocity[present].astype(np.float64)
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        occupants = np.bincount(regions, minlength=cells).tolist()
+        total_speed = np.bincount(regions, speed, minlength=cells).tolist()
+        sum_vx = np.bincount(regions, velocity[:, 0], minlength=cells).tolist()
+        sum_vy = np.bincount(regions, velocity[:, 1], minlength=cells).tolist()
+        dwell = np.bincount(regions, self._now - self.region_since[present], minlength=cells).tolist()
+        window = max(min(self.flow_window, self._now - (self._start or self._now)), 1.0)
+        inflow = (self._window_inflow * (60.0 / window)).tolist()
+        outflow = (self._window_outflow * (60.0 / window)).tolist()
+
+        result = {}
+        for i, name in enumerate(self.regions):
+            n = occupants[i]
+            resultant = math.hypot(sum_vx[i], sum_vy[i])
+            result[name] = {
+                "occupants": n,
+                "inflow_per_min": round(inflow[i], 2),
+                "outflow_per_min": round(outflow[i], 2),
+                "speed": round(total_speed[i] / n, 2) if n else 0.0,
+                "direction": round(math.degrees(math.atan2(sum_vy[i], sum_vx[i])), 1) if resultant > 0 else None,
+                "coherence": round(resultant / total_speed[i], 3) if total_speed[i] > 0 else 0.0,
+                "dwell_seconds": round(dwell[i] / n, 2) if n else 0.0,
+            }
+        return {"active_tracks": sum(occupants), "regions": result}
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns totals over everything tracked so far: tracks created, the most tracks
+        confirmed at once, and per region the people that entered and left and their
+        mean dwell time.
+        """
+        dwell = (self.completed_dwell / np.maximum(self.completed_visits, 1)).tolist()
+        return {
+            "total_tracks": self._next_id - 1,
+            "peak_active_tracks": self.peak_tracks,
+            "regions": {
+                name: {
+                    "inflow": int(self.total_inflow[i]),
+                    "outflow": int(self.total_outflow[i]),
+                    "mean_dwell_seconds": round(dwell[i], 2),
+                }
+                for i, name in enumerate(self.regions)
+            },
+        }
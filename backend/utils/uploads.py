@@ -0,0 +1,80 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from typing import NamedTuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# Uploads are streamed here under unique names; override with STAMPEDE_UPLOAD_DIR.
+UPLOAD_DIR = os.getenv("STAMPEDE_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "stampede_uploads"))
+
+# Peak memory used while ingesting an upload is bounded by this chunk size.
+CHUNK_SIZE = 1024 * 1024
+
+
+class SavedUpload(NamedTuple):
+    """
+    An upload written to local disk.
+
+    :param path: Path of the unique temporary file.
+    :param filename: Client-supplied file name, stripped of any directory components.
+    :param size: Size in bytes.
+    :param sha256: Hex digest of the content, computed while streaming.
+    """
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def safe_filename(filename: str) -> str:
+    """
+    Strips directory components from a client-supplied file name.
+    """
+    return os.path.basename((filename or "").replace("\\", "/")) or "upload.mp4"
+
+
+def unique_output_path(filename: str, directory: str = ".") -> str:
+    """
+    Returns an output path that cannot collide with another upload of the same name.
+    """
+    return os.path.join(directory, f"output_{uuid.uuid4().hex[:12]}_{safe_filename(filename)}")
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    f.write(chunk)
+    digest.update(chunk)
+
+
+async def save_upload(upload: UploadFile, directory: str = None) -> SavedUpload:
+    """
+    Streams an upload to a unique temporary file in CHUNK_SIZE pieces, hashing it on the
+    way, so memory stays bounded regardless of the file size and concurrent uploads with
+    the same name never overwrite each other.
+
+    :param upload: The uploaded file from FastAPI.
+    :param directory: Target directory (defaults to UPLOAD_DIR).
+    :return: Where the file was written, with its size and SHA-256.
+    """
+    directory = directory or UPLOAD_DIR
+    os.makedirs(directory, exist_ok=True)
+    filename = safe_filename(upload.filename)
+    suffix = os.path.splitext(filename)[1] or ".mp4"
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                # Disk writes and hashing happen off the event loop.
+                await run_in_threadpool(_write_chunk, f, digest, chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SavedUpload(path, filename, size, digest.hexdigest())
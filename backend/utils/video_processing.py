@@ -1,222 +1,542 @@
+import asyncio
 import os
 import time
+from typing import Callable, Dict, List, Optional
 import cv2
-import numpy as np
-import base64
 from fastapi import HTTPException
-from models import model
+from fastapi.concurrency import run_in_threadpool
+from models import get_model
 from rich.console import Console
 from rich.progress import Progress
 from websocket_manager import websocket_manager
-from utils.alert import check_overcrowding
+from utils.alert import DEFAULT_VIDEO_FPS, AlertEngine, AlertTransition, alert_log
+from utils.analytics import HeatmapRenderer, detections_from_result, person_boxes, person_confidences
+from utils.detection_cache import CachedVideo, DetectionCache, detection_cache, pack_detections
+from utils.metrics import count_frames, stage_timer
+from utils.pipeline import FramePipeline
+from utils.sampling import FRAME_SKIP, make_sampler
+from utils.streaming import StreamStats, encode_for_clients
+from utils.tiling import TiledDetector
+from utils.timeseries import timeseries_store
+from utils.tracking import Tracker
+from utils.uploads import save_upload, unique_output_path
+from utils.video_writer import VideoWriterThread
+from utils.zones import zone_config
 
 console = Console()
 
-async def process_video(video):
+
+class CrowdStatistics:
     """
-    Processes an uploaded video to perform object detection, compute region (quadrant) statistics,
-    generate a heatmap overlay, and stream frame data over a WebSocket.
+    Aggregates per-frame people and zone counts over a video and feeds them to an
+    AlertEngine, which evaluates the overcrowding thresholds over video time.
 
-    Steps:
-      1. Save the uploaded video to a temporary file.
-      2. Open the video file and validate it.
-      3. Process frames at intervals (skipping frames for efficiency).
-         - Detect persons in the frame.
-         - Compute counts per quadrant based on a 3x4 grid.
-         - Aggregate statistics and check overcrowding conditions.
-         - Create a heatmap overlay and encode frame data.
-         - Send data via WebSocket.
-      4. Save the processed (overlay) video.
-      5. Compute summary statistics and clean up.
+    Zones are a named layout from STAMPEDE_ZONES, an ad-hoc grid, or the default
+    layout (see utils/zones.py). They and the thresholds only affect this
+    post-processing, so the statistics can be rebuilt from cached detections without
+    running the model again.
+
+    Analysed frames need not be evenly spaced (see utils/sampling.py). Per-frame
+    statistics are reported on a fixed grid of every `frame_step`-th frame instead:
+    each grid frame takes the values of the latest analysed frame at or before it
+    (carried forward), so `frame_wise_count` stays aligned with video time.
+
+    :param zones: Name of the zone layout; defaults to the default layout.
+    :param num_rows: Number of grid rows, for a grid instead of a named layout.
+    :param num_cols: Number of grid columns, for a grid instead of a named layout.
+    :param max_capacity: Global capacity threshold; defaults to the layout's.
+    :param high_density_threshold: More persons than this in any zone triggers a density
+        alert; defaults to each zone's own capacity.
+    :param sudden_change_threshold: A change within `change_window` seconds above this triggers an alert.
+    :param frame_step: Spacing of the reported per-frame statistics, in video frames.
+    :param fps: Frame rate of the video, to turn frame indices into seconds.
+    :param alert_window: Rolling window of the reported per-quadrant statistics, in seconds.
+    :param change_window: Window of the sudden change check, in seconds.
+    :param alert_debounce: Seconds a condition has to hold before an alert is raised or cleared.
+    """
+
+    def __init__(
+        self,
+        zones: Optional[str] = None,
+        num_rows: Optional[int] = None,
+        num_cols: Optional[int] = None,
+        max_capacity: Optional[int] = None,
+        high_density_threshold: Optional[int] = None,
+        sudden_change_threshold: int = 3,
+        frame_step: int = FRAME_SKIP,
+        fps: float = DEFAULT_VIDEO_FPS,
+        alert_window: float = 10.0,
+        change_window: float = 1.0,
+        alert_debounce: float = 0.5,
+    ):
+        self.zones = zone_config.resolve(zones, num_rows, num_cols, max_capacity, high_density_threshold)
+        self.sudden_change_threshold = sudden_change_threshold
+        self.frame_step = max(1, frame_step)
+        self.fps = fps if fps and fps > 0 else DEFAULT_VIDEO_FPS
+        self.alerts = AlertEngine(
+            self.zones.names,
+            max_capacity=self.zones.max_capacity,
+            density_threshold=self.zones.capacities,
+            change_threshold=sudden_change_threshold,
+            window=alert_window,
+            change_window=change_window,
+            debounce=alert_debounce,
+        )
+        self.people_count_per_frame: List[int] = []
+        self.aggregated_quadrants = {key: 0 for key in self.zones.names}
+        self.danger_flags = {key: 0 for key in self.zones.names}
+        # Video frame index of the next grid frame, and the latest analysed frame's
+        # (people, quadrant counts, danger zones) carried forward onto the grid.
+        self._next_grid_frame = 0
+        self._current = None
+
+    def _fill(self, end: int):
+        """
+        Records the current values for every grid frame before `end`.
+        """
+        if self._current is None:
+            return
+        people_in_frame, quadrant_counts, danger_zones = self._current
+        while self._next_grid_frame < end:
+            self.people_count_per_frame.append(people_in_frame)
+            for key in self.aggregated_quadrants:
+                self.aggregated_quadrants[key] += quadrant_counts[key]
+            for key in danger_zones:
+                self.danger_flags[key] += 1
+            self._next_grid_frame += self.frame_step
+
+    def update(
+        self, frame_index: int, quadrant_counts: Dict[str, int], people_in_frame: int, verbose: bool = True
+    ) -> List[AlertTransition]:
+        """
+        Adds one analysed frame. Frames must be added in order.
+
+        :param frame_index: Index of the frame in the video.
+        :param quadrant_counts: People per quadrant in this frame.
+        :param people_in_frame: People in this frame.
+        :param verbose: Print alert transitions to the console.
+        :return: The alerts raised or cleared by this frame; see danger_zones() for the current state.
+        """
+        # Grid frames up to this one keep the previous analysed frame's values
+        self._fill(frame_index)
+
+        transitions = self.alerts.update(frame_index / self.fps, quadrant_counts, people_in_frame)
+        if verbose:
+            alert_log.emit(transitions)
+        self._current = (people_in_frame, quadrant_counts, self.alerts.danger_zones())
+        return transitions
+
+    def danger_zones(self) -> List[str]:
+        """
+        Returns the quadrants currently in alert.
+        """
+        return self._current[2] if self._current is not None else []
+
+    def finish(self, last_frame_index: int):
+        """
+        Carries the last analysed frame's values forward to the end of the video (or
+        of the processed part of it).
+        """
+        self._fill(last_frame_index + 1)
+
+    def summary(self) -> dict:
+        """
+        Returns the totals, per-frame counts, quadrant averages and quadrant alert flags,
+        plus the average people/m² of zones with a known area.
+        """
+        total_people = sum(self.people_count_per_frame)
+        num_frames = len(self.people_count_per_frame)
+        avg_people_per_frame = total_people / num_frames if num_frames > 0 else 0
+        avg_quadrants = {
+            key: self.aggregated_quadrants[key] / num_frames if num_frames > 0 else 0
+            for key in self.aggregated_quadrants
+        }
+        # Flag quadrant if danger occurred in >30% of frames
+        danger_alerts = {
+            key: num_frames > 0 and (self.danger_flags[key] / num_frames) > 0.3 for key in self.danger_flags
+        }
+        return {
+            "total_people_detected": total_people,
+            "average_people_per_frame": round(avg_people_per_frame, 2),
+            "frame_wise_count": self.people_count_per_frame,
+            "avg_quadrant_counts": avg_quadrants,
+            "quadrant_alerts": danger_alerts,
+            "zone_layout": self.zones.name,
+            "avg_zone_density": self.zones.densities(avg_quadrants),
+            "region_stats": self.alerts.snapshot(),
+        }
+
+
+def reanalyze_cached(cached: CachedVideo, tracking: bool = False, **thresholds) -> dict:
+    """
+    Rebuilds a video's statistics from its cached detections with different zones or
+    thresholds, without decoding the video or running the model.
+
+    :param cached: The video's cached detections.
+    :param tracking: Also track people across frames and report flow and dwell totals.
+    :param thresholds: Zones and alert thresholds, passed on to CrowdStatistics.
+    :return: The statistics process_video_file reports for the same settings.
+    """
+    start_time = time.time()
+    statistics = CrowdStatistics(fps=cached.fps, **thresholds)
+    tracker = Tracker(cached.width, cached.height, statistics.zones) if tracking else None
+    for frame_index, detections in cached.frames():
+        boxes = person_boxes(detections)
+        quadrant_counts = statistics.zones.counts(boxes, cached.width, cached.height)
+        statistics.update(frame_index, quadrant_counts, len(boxes), verbose=False)
+        if tracker is not None:
+            tracker.update(frame_index / statistics.fps, boxes, person_confidences(detections))
+    statistics.finish(cached.total_frames - 1)
+    return {
+        **statistics.summary(),
+        "tracking": tracker.summary() if tracker is not None else None,
+        "processing_time_seconds": round(time.time() - start_time, 3),
+        "total_frames": cached.total_frames,
+        "cache_hit": True,
+    }
+
+
+async def process_video(
+    video,
+    batch_size: int = 1,
+    timeout: Optional[float] = 60,
+    sampling: Optional[str] = None,
+    tracking: bool = False,
+    tiled: bool = False,
+    output_codec: Optional[str] = None,
+    output_width: Optional[int] = None,
+    **thresholds,
+):
+    """
+    Processes an uploaded video: streams it to a unique temporary file, runs
+    process_video_file on it and removes the temporary file afterwards.
+
+    Requests that wait for the result are bounded by `timeout`; longer videos
+    should go through the job queue (utils/jobs.py), which has no time limit.
 
     :param video: An uploaded video file object from FastAPI.
+    :param batch_size: Number of sampled frames sent through the model in one call.
+    :param timeout: Processing time budget in seconds; the result is flagged as truncated when it runs out.
+    :param sampling: Frame sampling mode (see utils/sampling.py).
+    :param tracking: Track people across frames for flow, speed and dwell metrics (see utils/tracking.py).
+    :param tiled: Detect with tiled inference over crowded zones (see utils/tiling.py).
+    :param output_codec: Codec of the overlay video (see utils/video_writer.py).
+    :param output_width: Widest overlay video frame; wider videos are downscaled.
+    :param thresholds: Zones and alert thresholds, passed on to CrowdStatistics.
     :return: A dictionary with statistics and metadata about the processed video.
     :raises HTTPException: If the video file is invalid or empty.
     """
-    # Save the uploaded video file
-    video_path = f"temp_{video.filename}"
-    output_video_path = f"output_{video.filename}"
-    with open(video_path, "wb") as f:
-        f.write(await video.read())
-    console.print("[bold green]Video saved successfully![/bold green] ✅")
+    # Save the uploaded video file in bounded-size chunks
+    upload = await save_upload(video)
+    console.print(f"[bold green]Video saved successfully![/bold green] ✅ ({upload.size / 1e6:.1f} MB)")
+    try:
+        return await process_video_file(
+            upload.path,
+            unique_output_path(upload.filename),
+            batch_size=batch_size,
+            timeout=timeout,
+            sampling=sampling,
+            tracking=tracking,
+            tiled=tiled,
+            output_codec=output_codec,
+            output_width=output_width,
+            sha256=upload.sha256,
+            **thresholds,
+        )
+    finally:
+        os.remove(upload.path)
+
+
+async def process_video_file(
+    video_path: str,
+    output_video_path: str,
+    batch_size: int = 1,
+    timeout: Optional[float] = None,
+    cancel_event: Optional[asyncio.Event] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+    sampling: Optional[str] = None,
+    tracking: bool = False,
+    tiled: bool = False,
+    output_codec: Optional[str] = None,
+    output_width: Optional[int] = None,
+    sha256: Optional[str] = None,
+    source: Optional[str] = None,
+    model=None,
+    **thresholds,
+):
+    """
+    Processes a video file to perform object detection, compute region (quadrant) statistics,
+    generate a heatmap overlay, and stream frame data over a WebSocket.
+
+    Steps:
+      1. Open the video file and validate it.
+      2. Process sampled frames through a FramePipeline, so decoding, detection
+         and encoding run on worker threads and overlap instead of blocking the
+         event loop.
+         - Decode thread: read the frames picked by the sampler (every 5th frame,
+           or adaptively by scene motion) and skip over the others without decoding.
+         - Detect thread: detect persons, `batch_size` sampled frames per model call
+           (plus, with `tiled`, overlapping tiles of the frames' crowded zones).
+         - Encode thread: compute counts per zone of the layout, optionally
+           update the tracker (which needs frames in order), create a
+           heatmap overlay, queue it for the output video and encode frame data
+           once per streaming mode requested by connected clients.
+         - Writer thread: downscale and encode the overlays into the output
+           video, at the frame rate of the analysed frames.
+         - Event loop: aggregate statistics, check overcrowding conditions and
+           send data via WebSocket.
+      3. Save the processed (overlay) video.
+      4. Compute summary statistics and clean up.
+
+    When `sha256` is given, the detections of a complete run are cached under the
+    video's content hash, the model and the frame skip. Processing the same content
+    again takes the detections from the cache instead of running the model, and
+    reanalyze_cached can rebuild the statistics without decoding the video at all.
+
+    The counts of every analysed frame are recorded in the time-series store under
+    `source` in video time (seconds from the start of the video), so processing the
+    same video again under the same source records nothing twice.
+
+    :param video_path: Path of the video to analyse. The caller owns (and removes) it.
+    :param output_video_path: Where the overlay video is written.
+    :param batch_size: Number of sampled frames sent through the model in one call.
+    :param timeout: Stop after this many seconds and flag the result as truncated; None processes the whole video.
+    :param cancel_event: Processing stops early (flagging the result as cancelled) once this is set.
+    :param on_progress: Called with the completed percentage after every processed frame.
+    :param sampling: Frame sampling mode, "fixed" or "adaptive"; defaults to DEFAULT_SAMPLING.
+    :param tracking: Track people across frames; frames then carry per-region flow, speed and
+        dwell metrics and the result the tracker's totals.
+    :param tiled: Also run the model on overlapping tiles of crowded zones, for small,
+        distant people the whole-frame pass misses; the result reports the tiles run (none on a cache hit).
+    :param output_codec: Codec of the overlay video, "mp4v" or "h264"; defaults to OUTPUT_CODEC.
+    :param output_width: Widest overlay video frame; defaults to OUTPUT_WIDTH (0 keeps the source width).
+    :param sha256: Content hash of the video; enables the detection cache.
+    :param source: Time-series source name; defaults to "video:" and the start of `sha256`.
+    :param model: Callable running detection on a list of frames; defaults to the shared model.
+    :param thresholds: Zones and alert thresholds, passed on to CrowdStatistics.
+    :return: A dictionary with statistics and metadata about the processed video.
+    :raises HTTPException: If the video file is invalid or empty, or the sampling mode or output codec is unknown.
+    """
+    if source is None:
+        source = f"video:{sha256[:12]}" if sha256 else "video"
+    try:
+        sampler = make_sampler(sampling)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Shared model from the registry (loaded once per process) unless one is given
+    model = model or get_model()
 
     # Open the video file
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
-        os.remove(video_path)
         raise HTTPException(status_code=400, detail="Invalid video file. Unable to open.")
 
-    # Initialize counters and aggregation dictionaries
+    # Initialize counters and aggregated statistics
     frame_count = 0
-    people_count_per_frame = []
-    num_regions = 12
-    aggregated_quadrants = {f"q{i}": 0 for i in range(1, num_regions + 1)}
-    danger_flags = {f"q{i}": 0 for i in range(1, num_regions + 1)}
-    prev_quadrant_counts = {f"q{i}": 0 for i in range(1, num_regions + 1)}
+    truncated = False
+    cancelled = False
 
     start_time = time.time()
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_skip = 5
     if total_frames == 0:
-        os.remove(video_path)
+        cap.release()
         raise HTTPException(status_code=400, detail="Empty video file. No frames to process.")
 
     # Video properties for output creation
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+    # Everything that can fail is set up before the writer (a thread, and an ffmpeg
+    # process for h264) is started; the writer is closed by the try/finally below.
+    try:
+        # Zones can be rejected (404/400), e.g. when a job resumes after STAMPEDE_ZONES changed.
+        statistics = CrowdStatistics(fps=fps, **thresholds)
+        # Tracks depend on frame order, so the tracker runs in the (single) encode stage.
+        tracker = Tracker(width, height, statistics.zones) if tracking else None
+
+        # Tiling follows zone density over the video, so the detector is created per video.
+        tiler = TiledDetector(model, statistics.zones) if tiled else None
 
-    # Grid configuration: 3 rows x 4 columns = 12 regions
-    num_rows = 3
-    num_cols = 4
+        # Detections from an earlier run over the same content, if cached
+        model_key = tiler.cache_key if tiler is not None else model.cache_key
+        cache_key = DetectionCache.key(sha256, model_key, sampler.cache_key) if sha256 else None
+        # Entries can be large; read them off the event loop, as save() and reanalysis do.
+        cached = await run_in_threadpool(detection_cache.load, cache_key) if cache_key else None
+
+        try:
+            # Only analysed frames are written, at the rate the sampler nominally picks them.
+            out = VideoWriterThread(
+                output_video_path, fps or DEFAULT_VIDEO_FPS, width, height,
+                codec=output_codec, max_width=output_width, frame_step=sampler.frame_skip,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        cap.release()
+        raise
+    cached_positions = cached.by_frame_index() if cached is not None else {}
+    # (frame_index, detections) of every analysed frame, to fill the cache on a miss
+    detected = []
 
-    # Thresholds for alerts and detection
-    high_density_threshold = 5      # More than 5 persons in a quadrant triggers density alert
-    sudden_change_threshold = 3     # Change from previous frame exceeds this triggers alert
-    global_max_capacity = 50        # Global capacity threshold
+    # Heatmap buffers are allocated once for this video's resolution and reused
+    heatmap_renderer = HeatmapRenderer()
+    # Bytes per frame and encode time for each client streaming mode
+    stream_stats = StreamStats()
 
-    def compute_quadrant_counts(boxes):
+    def detect(frame_indices, frames):
         """
-        Computes the count of persons in each quadrant based on detected boxes.
-        Returns both the quadrant count dictionary and the total people count.
+        Runs the detector on a batch of frames (detect stage) and returns one
+        Detections per frame, taken from the cache when it has them.
         """
-        quadrant_counts = {f"q{i}": 0 for i in range(1, num_rows * num_cols + 1)}
-        count_people = 0
-        for box in boxes:
-            if int(box.cls[0]) == 0:  # Assuming class 0 represents "person"
-                count_people += 1
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                center_x = (x1 + x2) / 2
-                center_y = (y1 + y2) / 2
-                col_index = int(center_x / (width / num_cols))
-                row_index = int(center_y / (height / num_rows))
-                col_index = min(col_index, num_cols - 1)
-                row_index = min(row_index, num_rows - 1)
-                quadrant_index = row_index * num_cols + col_index + 1
-                quadrant_counts[f"q{quadrant_index}"] += 1
-        return quadrant_counts, count_people
-
-    def generate_heatmap_overlay(frame, boxes):
+        if all(i in cached_positions for i in frame_indices):
+            return [cached.detections(cached_positions[i]) for i in frame_indices]
+        with stage_timer("video", "inference"):
+            if tiler is not None:
+                return tiler(frames)
+            return [detections_from_result(result) for result in model(frames)]
+
+    def encode(frame_index, frame, detections):
         """
-        Generates a heatmap overlay from the detected boxes and returns the combined image.
+        Computes per-frame statistics, writes the overlay to the output video and
+        encodes both images for the WebSocket (encode stage).
         """
-        heatmap = np.zeros((height, width), dtype=np.float32)
-        for box in boxes:
-            if int(box.cls[0]) == 0:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                heatmap[y1:y2, x1:x2] += 1
-        heatmap = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX)
-        heatmap = np.uint8(heatmap)
-        heatmap = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
-        return cv2.addWeighted(frame, 0.6, heatmap, 0.4, 0)
+        if cached is None:
+            detected.append((frame_index, detections))
+        boxes = person_boxes(detections)
+
+        # Count people per zone (one lookup in the layout's label mask) and in total
+        with stage_timer("video", "analytics"):
+            quadrant_counts = statistics.zones.counts(boxes, width, height)
+            people_in_frame = len(boxes)
+            flow = None
+            if tracker is not None:
+                tracker.update(frame_index / statistics.fps, boxes, person_confidences(detections))
+                flow = tracker.metrics()
+
+        # Generate heatmap overlay and queue it for the output video
+        with stage_timer("video", "heatmap"):
+            overlay = heatmap_renderer.render(frame, boxes)
+        out.write(frame_index, overlay)
+
+        # Encode the frame and overlay once per distinct client stream setting
+        with stage_timer("video", "encode"):
+            encoded = encode_for_clients(frame, overlay, websocket_manager.requested_options())
+        stream_stats.record(encoded)
+
+        return {
+            "frame_index": frame_index,
+            "quadrant_counts": quadrant_counts,
+            "people_in_frame": people_in_frame,
+            "flow": flow,
+            "encoded": encoded,
+        }
 
     # Process frames with a progress bar
-    with Progress() as progress:
-        task = progress.add_task("[cyan]Processing video frames...", total=total_frames)
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Skip frames for efficiency
-            if frame_count % frame_skip != 0:
-                frame_count += 1
-                continue
-            frame_count += 1
-            progress.update(task, advance=frame_skip)
-
-            # Perform object detection on the current frame
-            results = model(frame)
-            boxes = results[0].boxes
-
-            # Compute quadrant counts and people count for this frame
-            quadrant_counts, people_in_frame = compute_quadrant_counts(boxes)
-            people_count_per_frame.append(people_in_frame)
-
-            # Update aggregated counts
-            for key in aggregated_quadrants:
-                aggregated_quadrants[key] += quadrant_counts[key]
-
-            # Compute changes in quadrant counts from the previous frame
-            quadrant_deltas = {
-                key: quadrant_counts[key] - prev_quadrant_counts.get(key, 0)
-                for key in quadrant_counts
-            }
-
-            # Check overcrowding and get alert info
-            alert_info = check_overcrowding(
-                people_in_frame,
-                global_max_capacity,
-                quadrant_counts=quadrant_counts,
-                quadrant_threshold=high_density_threshold,
-                quadrant_deltas=quadrant_deltas,
-                scatter_threshold=sudden_change_threshold
-            )
-            # Identify and update danger zones
-            danger_zones = [
-                key for key, info in alert_info["quadrant_alerts"].items() if info["alert"]
-            ]
-            for key in danger_zones:
-                danger_flags[key] += 1
-
-            # Update previous quadrant counts for the next iteration
-            prev_quadrant_counts = quadrant_counts.copy()
-
-            # Encode the original frame as a base64 JPEG image
-            _, buffer = cv2.imencode(".jpg", frame)
-            frame_base64 = base64.b64encode(buffer).decode("utf-8")
-
-            # Generate heatmap overlay, write it to the output video, and encode it
-            overlay = generate_heatmap_overlay(frame, boxes)
-            out.write(overlay)
-            _, overlay_buffer = cv2.imencode(".jpg", overlay)
-            heatmap_base64 = base64.b64encode(overlay_buffer).decode("utf-8")
-
-            # Send frame and analysis data via WebSocket
-            await websocket_manager.send_data({
-                "frame": frame_base64,
-                "heatmap": heatmap_base64,
-                "people_in_frame": people_in_frame,
-                "progress": (frame_count / total_frames) * 100,
-                "quadrant_counts": quadrant_counts,
-                "danger_zones": danger_zones
-            })
-
-            # Timeout after 60 seconds
-            if time.time() - start_time > 60:
-                console.print("[bold red]Timeout reached! Stopping processing.[/bold red] ⚠️")
-                break
-
-    # Clean up resources
-    cap.release()
-    out.release()
-    os.remove(video_path)
-
-    # Compute summary statistics
-    total_people = sum(people_count_per_frame)
-    num_frames = len(people_count_per_frame)
-    avg_people_per_frame = total_people / num_frames if num_frames > 0 else 0
-    avg_quadrants = {
-        key: aggregated_quadrants[key] / num_frames for key in aggregated_quadrants
-    }
-    # Flag quadrant if danger occurred in >30% of frames
-    danger_alerts = {
-        key: (danger_flags[key] / num_frames) > 0.3 for key in danger_flags
-    }
+    try:
+        with Progress() as progress:
+            task = progress.add_task("[cyan]Processing video frames...", total=total_frames)
+            async with FramePipeline(cap, detect, encode, batch_size=batch_size, sampler=sampler) as pipeline:
+                async for item in pipeline:
+                    frame_count = item["frame_index"] + 1
+                    progress.update(task, completed=frame_count)
+                    count_frames("video")
+
+                    quadrant_counts = item["quadrant_counts"]
+                    people_in_frame = item["people_in_frame"]
+                    transitions = statistics.update(item["frame_index"], quadrant_counts, people_in_frame)
+                    danger_zones = statistics.danger_zones()
+                    timeseries_store.record(
+                        source, item["frame_index"] / statistics.fps, people_in_frame, quadrant_counts, danger_zones,
+                        video_time=True,
+                    )
+
+                    # Alerts are sent when they are raised or cleared, and delivered to
+                    # every client even if it is dropping frames
+                    if transitions:
+                        await websocket_manager.send_data({
+                            "type": "alert",
+                            "frame_index": item["frame_index"],
+                            "people_in_frame": people_in_frame,
+                            "danger_zones": danger_zones,
+                            "transitions": [transition.as_dict() for transition in transitions],
+                        })
+
+                    # Send frame and analysis data via WebSocket (never blocks on slow clients)
+                    metadata = {
+                        "people_in_frame": people_in_frame,
+                        "progress": (frame_count / total_frames) * 100,
+                        "quadrant_counts": quadrant_counts,
+                        "danger_zones": danger_zones
+                    }
+                    zone_density = statistics.zones.densities(quadrant_counts)
+                    if zone_density:
+                        metadata["zone_density"] = zone_density
+                    if item["flow"] is not None:
+                        metadata["flow"] = item["flow"]
+                    await websocket_manager.send_frame(metadata, item["encoded"])
+
+                    if on_progress is not None:
+                        on_progress((frame_count / total_frames) * 100)
+
+                    if cancel_event is not None and cancel_event.is_set():
+                        console.print("[bold yellow]Processing cancelled.[/bold yellow]")
+                        cancelled = True
+                        break
+
+                    # Stop once the time budget (if any) is used up
+                    if timeout is not None and time.time() - start_time > timeout:
+                        console.print("[bold red]Timeout reached! Stopping processing.[/bold red] ⚠️")
+                        truncated = True
+                        break
+    finally:
+        # Clean up resources (the pipeline threads have stopped by now); a complete
+        # video keeps its last overlay up to the end of the source.
+        cap.release()
+        output_stats = await run_in_threadpool(
+            out.close, sampler.frames if not (truncated or cancelled) else None
+        )
+
+    complete = not (truncated or cancelled)
+    # Cache the detections of complete runs so the video can be reanalysed without inference
+    if cache_key and cached is None and complete:
+        await run_in_threadpool(
+            detection_cache.save, cache_key, pack_detections(detected, width, height, fps, sampler.frames)
+        )
+
+    # Compute summary statistics, carrying the last counts forward to the end of the
+    # video (or of the part that was processed)
+    statistics.finish(sampler.frames - 1 if complete else frame_count - 1)
+    summary = statistics.summary()
     process_time = time.time() - start_time
 
     # Output final statistics
-    console.print(f"\n[bold blue]Total people detected:[/bold blue] {total_people}")
-    console.print(f"[bold magenta]Average per frame:[/bold magenta] {avg_people_per_frame:.2f}")
-    console.print(f"[bold yellow]Processing time:[/bold yellow] {process_time:.2f} seconds\n")
+    console.print(f"\n[bold blue]Total people detected:[/bold blue] {summary['total_people_detected']}")
+    console.print(f"[bold magenta]Average per frame:[/bold magenta] {summary['average_people_per_frame']:.2f}")
+    console.print(f"[bold yellow]Processing time:[/bold yellow] {process_time:.2f} seconds")
+    sampling_stats = sampler.stats()
+    console.print(
+        f"[bold cyan]Frames analysed:[/bold cyan] {sampling_stats['inferred_frames']} of {sampling_stats['frames']} "
+        f"({sampling_stats['mode']} sampling, {sampling_stats['inference_saved']} fewer than every {FRAME_SKIP}th frame)"
+    )
+    console.print(
+        f"[bold cyan]Output video:[/bold cyan] {output_stats['codec']} {output_stats['width']}x{output_stats['height']} "
+        f"at {output_stats['fps']} fps, {output_stats['encode_fps']} frames/s encoded, {output_stats['size_bytes']} bytes\n"
+    )
 
     return {
-        "total_people_detected": total_people,
-        "average_people_per_frame": round(avg_people_per_frame, 2),
-        "frame_wise_count": people_count_per_frame,
+        **summary,
         "processing_time_seconds": round(process_time, 2),
-        "avg_quadrant_counts": avg_quadrants,
-        "quadrant_alerts": danger_alerts
+        "sampling": sampling_stats,
+        "stream_stats": stream_stats.summary(),
+        "output_video_path": output_video_path,
+        "output_video": output_stats,
+        "last_processed_frame": frame_count,
+        "total_frames": total_frames,
+        "truncated": truncated,
+        "cancelled": cancelled,
+        "cache_hit": cached is not None,
+        "tracking": tracker.summary() if tracker is not None else None,
+        # A cache hit never runs the tiler; its stats would describe no tiling at all.
+        "tiling": tiler.stats() if tiler is not None and cached is None else None,
     }
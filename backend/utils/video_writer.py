@@ -0,0 +1,254 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from rich.console import Console
+
+from utils.metrics import metrics, record_stage
+from utils.sampling import FRAME_SKIP
+
+console = Console()
+
+# Codecs of the output (overlay) video: "mp4v" through OpenCV, or "h264" through an
+# ffmpeg subprocess. H.264 files are smaller, play in browsers and, with a fast
+# preset, encode quicker than OpenCV's MPEG-4 Part 2.
+OUTPUT_CODECS = ("mp4v", "h264")
+OUTPUT_CODEC = os.getenv("STAMPEDE_OUTPUT_CODEC", "mp4v")
+# Frames wider than this are downscaled before encoding; 0 keeps the source resolution.
+OUTPUT_WIDTH = int(os.getenv("STAMPEDE_OUTPUT_WIDTH", "0"))
+# ffmpeg executable used for "h264"; without it the writer falls back to "mp4v".
+FFMPEG = os.getenv("STAMPEDE_FFMPEG", "ffmpeg")
+# x264 speed/size trade-off and quality (lower CRF is better quality, larger files).
+H264_PRESET = os.getenv("STAMPEDE_H264_PRESET", "veryfast")
+H264_CRF = int(os.getenv("STAMPEDE_H264_CRF", "23"))
+# Frames that may wait for the writer thread before write() blocks.
+WRITER_QUEUE_SIZE = 16
+
+# Marks the end of the frames in the writer queue.
+_END = object()
+
+
+def output_size(width: int, height: int, max_width: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Returns the output resolution for a `width` x `height` source: scaled down to
+    `max_width` (keeping the aspect ratio) if wider, rounded down to even sizes as
+    H.264 with 4:2:0 chroma requires.
+    """
+    if max_width and width > max_width:
+        height = height * max_width / width
+        width = max_width
+    return max(2, int(width) // 2 * 2), max(2, int(round(height)) // 2 * 2)
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG) is not None
+
+
+class _OpenCVEncoder:
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"Unable to open {path} for writing.")
+
+    def write(self, frame: np.ndarray):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class _FFmpegEncoder:
+    """
+    Pipes raw BGR frames into `ffmpeg`, which encodes them with libx264.
+    """
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int], preset: str = H264_PRESET, crf: int = H264_CRF):
+        command = [
+            FFMPEG, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", f"{fps:.6g}", "-i", "-",
+            "-an", "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            # Index at the start of the file, so browsers can play it while it downloads
+            "-movflags", "+faststart",
+            path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write(self, frame: np.ndarray):
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        errors = self.process.stderr.read().decode(errors="replace").strip()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode}: {errors}")
+
+
+class VideoWriterThread:
+    """
+    Writes the output video on its own thread, so encoding overlaps with analysis
+    instead of adding to the time of every frame.
+
+    Only the analysed frames reach the writer, so it writes at the effective frame
+    rate `fps / frame_step` (the rate of the fixed sampler), and the video plays back
+    at the speed of the source. Each frame is placed at its frame index: when frames
+    are further apart than `frame_step` (adaptive sampling) the previous one is
+    repeated, when they are closer only the first of a slot is kept. Frames are
+    downscaled to at most `max_width` on the writer thread.
+
+    write() blocks once `queue_size` frames are waiting, so a slow encoder slows the
+    pipeline down rather than buffering the whole video in memory.
+
+    :param path: Output video path.
+    :param fps: Frame rate of the source video.
+    :param width: Source frame width.
+    :param height: Source frame height.
+    :param codec: One of OUTPUT_CODECS; defaults to OUTPUT_CODEC. "h264" falls back
+        to "mp4v" if ffmpeg is not installed.
+    :param max_width: Widest output frame; defaults to OUTPUT_WIDTH (0 keeps the source width).
+    :param frame_step: Source frames per output frame.
+    :param queue_size: Frames that may wait for the writer thread.
+    :raises ValueError: If the codec is not supported.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fps: float,
+        width: int,
+        height: int,
+        codec: Optional[str] = None,
+        max_width: Optional[int] = None,
+        frame_step: int = FRAME_SKIP,
+        queue_size: int = WRITER_QUEUE_SIZE,
+    ):
+        codec = codec or OUTPUT_CODEC
+        if codec not in OUTPUT_CODECS:
+            raise ValueError(f"Unsupported output codec '{codec}', expected one of {OUTPUT_CODECS}.")
+        if codec == "h264" and not ffmpeg_available():
+            console.print(f"[bold yellow]{FFMPEG} not found, writing the output video with mp4v.[/bold yellow]")
+            codec = "mp4v"
+        self.path = path
+        self.codec = codec
+        self.frame_step = max(1, frame_step)
+        self.fps = fps / self.frame_step
+        self.source_size = (width, height)
+        self.size = output_size(width, height, max_width if max_width is not None else OUTPUT_WIDTH)
+        # Area averaging is slow at fractional factors below 2x, where bilinear does not alias yet.
+        self._interpolation = (
+            cv2.INTER_AREA if width % self.size[0] == 0 or width >= 2 * self.size[0] else cv2.INTER_LINEAR
+        )
+        self.frames_written = 0
+        self.repeated = 0
+        self.skipped = 0
+        self.encode_seconds = 0.0
+        self.error: Optional[BaseException] = None
+
+        encoder = _FFmpegEncoder if codec == "h264" else _OpenCVEncoder
+        self._encoder = encoder(path, self.fps, self.size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        metrics.watch_queue("video_write", self._queue)
+        self._last = None
+        self._thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, frame_index: int, frame: np.ndarray):
+        """
+        Queues the frame at `frame_index` of the source for writing.
+
+        :raises RuntimeError: If the encoder has failed.
+        """
+        if self.error is not None:
+            raise RuntimeError(f"Writing the output video failed: {self.error}")
+        self._queue.put((frame_index, frame))
+
+    def close(self, end_frame: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Writes the queued frames, finishes the file and returns the writer's stats.
+
+        :param end_frame: Number of source frames the video covers; the last frame is
+            repeated up to it (e.g. when the last analysed frame is not the last one).
+        """
+        self._queue.put((end_frame, None) if end_frame is not None else _END)
+        self._thread.join()
+        return self.stats()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            started = time.perf_counter()
+            if self.error is not None:
+                # Keep draining so write() never blocks on a failed encoder.
+                if item is _END or item[1] is None:
+                    break
+                continue
+            try:
+                if item is _END:
+                    break
+                frame_index, frame = item
+                if frame is None:
+                    self._fill(-(-frame_index // self.frame_step))
+                    break
+                slot = frame_index // self.frame_step
+                if slot < self.frames_written:
+                    self.skipped += 1
+                    continue
+                self._fill(slot)
+                if frame.shape[1::-1] != self.size:
+                    frame = cv2.resize(frame, self.size, interpolation=self._interpolation)
+                self._encode(frame)
+                self._last = frame
+            except BaseException as exc:
+                self.error = exc
+            finally:
+                elapsed = time.perf_counter() - started
+                self.encode_seconds += elapsed
+                record_stage("video", "video_write", elapsed)
+        # ffmpeg may still be encoding buffered frames; that time counts as encoding too.
+        started = time.perf_counter()
+        try:
+            self._encoder.close()
+        except BaseException as exc:
+            self.error = self.error or exc
+        self.encode_seconds += time.perf_counter() - started
+        if self.error is not None:
+            console.print(f"[bold red]Writing {self.path} failed:[/bold red] {self.error}")
+
+    def _fill(self, slot: int):
+        """Repeats the last frame up to (not including) output frame `slot`."""
+        while self._last is not None and self.frames_written < slot:
+            self._encode(self._last)
+            self.repeated += 1
+
+    def _encode(self, frame: np.ndarray):
+        self._encoder.write(frame)
+        self.frames_written += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the output settings, the frames written and the encode speed (frames per
+        second the writer thread was busy, downscaling included), plus the file size once
+        the writer is closed.
+        """
+        finished = not self._thread.is_alive()
+        size_bytes = os.path.getsize(self.path) if finished and os.path.exists(self.path) else None
+        return {
+            "codec": self.codec,
+            "width": self.size[0],
+            "height": self.size[1],
+            "fps": round(self.fps, 3),
+            "frames_written": self.frames_written,
+            "repeated_frames": self.repeated,
+            "skipped_frames": self.skipped,
+            "encode_fps": round(self.frames_written / self.encode_seconds, 1) if self.encode_seconds else None,
+            "size_bytes": size_bytes,
+            "error": str(self.error) if self.error is not None else None,
+        }
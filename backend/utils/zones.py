@@ -0,0 +1,335 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+from utils.analytics import quadrant_names
+
+# Optional JSON file of named zone layouts, e.g.
+# {"default": {"grid": [3, 4], "capacity": 5, "max_capacity": 50},
+#  "gate-1": {"frame_size": [1920, 1080], "max_capacity": 200, "zones": [
+#      {"name": "entrance", "polygon": [[0, 600], [800, 600], [800, 1080], [0, 1080]], "capacity": 40, "area": 25}]}}
+ZONES_FILE = os.getenv("STAMPEDE_ZONES")
+# Layout used when none is named; the built-in one is a 3x4 grid.
+DEFAULT_LAYOUT = "default"
+# More people than this in a zone raises a density alert, unless the zone sets its own capacity.
+DEFAULT_CAPACITY = 5
+# More people than this in the whole frame raises a capacity alert.
+DEFAULT_MAX_CAPACITY = 50
+# Label masks (or grid lookup tables) kept per layout, one per frame resolution.
+MAX_MASKS = 8
+# Sub-pixel bits used when rasterising polygons.
+POLYGON_SHIFT = 4
+
+
+class Zone(NamedTuple):
+    """
+    One region of a camera view.
+
+    :param name: Region id reported in counts, alerts and history.
+    :param polygon: (K, 2) float64 vertices as fractions of the frame width and height.
+    :param capacity: More people than this in the zone raises a density alert.
+    :param area: Floor area in square metres, for people/m²; None if unknown.
+    """
+    name: str
+    polygon: np.ndarray
+    capacity: float
+    area: Optional[float] = None
+
+
+class ZoneLayout:
+    """
+    The regions people are counted in, with their thresholds.
+
+    Zones are arbitrary polygons in coordinates relative to the frame, so one layout
+    serves every resolution. Detections are assigned to zones by their box center
+    through a label mask: an image of the frame's size holding, per pixel, the index
+    of its zone (or len(zones) outside all zones). The mask is rasterised once per
+    resolution and cached, so assigning any number of centers is a single indexing
+    operation plus a bincount, independent of the number and shape of the polygons.
+    Where zones overlap, the one listed first wins.
+
+    Grid layouts (from_grid) use a row and a column lookup table instead, indexed by
+    the center in half pixels, so they count exactly as the grid always has
+    (analytics.compute_quadrant_counts) at a fraction of the memory.
+
+    :param zones: The zones, in reporting order.
+    :param max_capacity: Capacity threshold of the whole frame.
+    :param name: Name of the layout.
+    :param grid: (num_rows, num_cols) if the zones are the cells of a grid.
+    """
+
+    def __init__(
+        self,
+        zones: List[Zone],
+        max_capacity: float = DEFAULT_MAX_CAPACITY,
+        name: str = DEFAULT_LAYOUT,
+        grid: Optional[Tuple[int, int]] = None,
+    ):
+        if not zones:
+            raise ValueError(f"Zone layout '{name}' has no zones.")
+        names = [zone.name for zone in zones]
+        if len(set(names)) != len(names) or "global" in names:
+            raise ValueError(f"Zone layout '{name}': zone names must be unique and not 'global'.")
+        self.zones = list(zones)
+        self.name = name
+        self.max_capacity = max_capacity
+        self.grid = grid
+        self.names = names
+        self.capacities = {zone.name: zone.capacity for zone in zones}
+        self._lookups: "OrderedDict[Tuple[int, int], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Short hash of the zones' names, polygons and capacities. It changes whenever
+        the geometry of a layout does, even if the layout keeps its name.
+        """
+        digest = hashlib.sha256()
+        for zone in self.zones:
+            digest.update(f"{zone.name}|{zone.capacity!r}|".encode())
+            digest.update(np.ascontiguousarray(zone.polygon, np.float64).tobytes())
+        digest.update(repr(self.max_capacity).encode())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def from_grid(
+        cls,
+        num_rows: int = 3,
+        num_cols: int = 4,
+        capacity: float = DEFAULT_CAPACITY,
+        max_capacity: float = DEFAULT_MAX_CAPACITY,
+        area: Optional[float] = None,
+        name: str = DEFAULT_LAYOUT,
+    ) -> "ZoneLayout":
+        """
+        Returns a num_rows x num_cols grid of zones named q1, q2, ... row-major.
+
+        :param area: Floor area of the whole view in m², split evenly between the cells.
+        """
+        zones = []
+        cell_area = area / (num_rows * num_cols) if area else None
+        for i, zone_name in enumerate(quadrant_names(num_rows, num_cols)):
+            row, col = divmod(i, num_cols)
+            x1, x2 = col / num_cols, (col + 1) / num_cols
+            y1, y2 = row / num_rows, (row + 1) / num_rows
+            polygon = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+            zones.append(Zone(zone_name, polygon, capacity, cell_area))
+        return cls(zones, max_capacity, name, grid=(num_rows, num_cols))
+
+    @classmethod
+    def from_config(cls, name: str, entry: Dict[str, Any]) -> "ZoneLayout":
+        """
+        Builds a layout from its STAMPEDE_ZONES entry: either {"grid": [rows, cols]} or
+        {"zones": [{"name", "polygon", "capacity", "area"}, ...]}, with optional
+        "capacity" (zone default), "max_capacity" and "max_density" (people/m²; sets
+        the capacity of zones with an area and no capacity of their own). Polygon
+        vertices are fractions of the frame size, or pixels of "frame_size" [w, h].
+
+        :raises ValueError: If the entry is malformed.
+        """
+        capacity = float(entry.get("capacity", DEFAULT_CAPACITY))
+        max_capacity = float(entry.get("max_capacity", DEFAULT_MAX_CAPACITY))
+        if "grid" in entry:
+            num_rows, num_cols = (int(value) for value in entry["grid"])
+            if num_rows < 1 or num_cols < 1:
+                raise ValueError(f"Zone layout '{name}': grid dimensions must be positive.")
+            return cls.from_grid(num_rows, num_cols, capacity, max_capacity, entry.get("area"), name)
+
+        max_density = entry.get("max_density")
+        scale = np.array(entry.get("frame_size", (1, 1)), np.float64)
+        zones = []
+        for zone in entry.get("zones", []):
+            polygon = np.array(zone["polygon"], np.float64)
+            if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+                raise ValueError(f"Zone '{zone.get('name')}' of layout '{name}' needs at least three [x, y] vertices.")
+            area = float(zone["area"]) if zone.get("area") else None
+            if "capacity" in zone:
+                zone_capacity = float(zone["capacity"])
+            elif area and max_density:
+                zone_capacity = area * float(max_density)
+            else:
+                zone_capacity = capacity
+            zones.append(Zone(str(zone["name"]), polygon / scale, zone_capacity, area))
+        return cls(zones, max_capacity, name)
+
+    def with_thresholds(self, max_capacity: Optional[float] = None, capacity: Optional[float] = None) -> "ZoneLayout":
+        """
+        Returns this layout with the frame capacity and/or every zone's capacity
+        replaced. The copy shares the cached lookups.
+        """
+        if max_capacity is None and capacity is None:
+            return self
+        layout = copy.copy(self)
+        if max_capacity is not None:
+            layout.max_capacity = max_capacity
+        if capacity is not None:
+            layout.zones = [zone._replace(capacity=capacity) for zone in self.zones]
+            layout.capacities = {zone.name: capacity for zone in self.zones}
+        return layout
+
+    def _rasterise(self, width: int, height: int):
+        if self.grid is not None:
+            # Zone offset of each row and column, for centers x1 + x2 (in half pixels) in [0, 2 * size).
+            num_rows, num_cols = self.grid
+            rows = np.minimum((np.arange(2 * height) / (2 * height / num_rows)).astype(np.int64), num_rows - 1)
+            cols = np.minimum((np.arange(2 * width) / (2 * width / num_cols)).astype(np.int64), num_cols - 1)
+            return (rows * num_cols).astype(np.int32), cols.astype(np.int32)
+        dtype = np.uint8 if len(self.zones) < 255 else np.uint16
+        mask = np.full((height, width), len(self.zones), dtype)
+        size = np.array([width, height], np.float64) * (1 << POLYGON_SHIFT)
+        # Painted last to first, so the first listed zone wins where zones overlap.
+        for index in range(len(self.zones) - 1, -1, -1):
+            vertices = np.round(self.zones[index].polygon * size).astype(np.int32)
+            cv2.fillPoly(mask, [vertices], int(index), lineType=cv2.LINE_8, shift=POLYGON_SHIFT)
+        return mask
+
+    def _lookup(self, width: int, height: int):
+        """
+        Returns the resolution's label mask, or (row, column) tables for a grid,
+        computed on first use. The arrays are shared and must not be modified.
+        """
+        key = (width, height)
+        with self._lock:
+            lookup = self._lookups.get(key)
+            if lookup is not None:
+                self._lookups.move_to_end(key)
+                return lookup
+        lookup = self._rasterise(width, height)
+        with self._lock:
+            self._lookups[key] = lookup
+            while len(self._lookups) > MAX_MASKS:
+                self._lookups.popitem(last=False)
+        return lookup
+
+    def labels(self, boxes: np.ndarray, width: int, height: int) -> np.ndarray:
+        """
+        Returns the zone index of each box center, len(zones) for centers outside all zones.
+
+        :param boxes: (N, 4) xyxy boxes.
+        """
+        lookup = self._lookup(width, height)
+        # Truncate to whole pixels first, matching how boxes have always been counted.
+        boxes = boxes.astype(np.int32).reshape(-1, 4)
+        # Twice the center, i.e. the center in half pixels
+        center_x = boxes[:, 0] + boxes[:, 2]
+        center_y = boxes[:, 1] + boxes[:, 3]
+        if self.grid is not None:
+            rows, cols = lookup
+            return rows[np.clip(center_y, 0, 2 * height - 1)] + cols[np.clip(center_x, 0, 2 * width - 1)]
+        return lookup[np.clip(center_y >> 1, 0, height - 1), np.clip(center_x >> 1, 0, width - 1)]
+
+    def counts(self, boxes: np.ndarray, width: int, height: int) -> Dict[str, int]:
+        """
+        Returns the number of people per zone from their box centers.
+        """
+        counts = np.bincount(self.labels(boxes, width, height), minlength=len(self.zones) + 1)
+        return dict(zip(self.names, counts[:len(self.zones)].tolist()))
+
+    def densities(self, counts: Dict[str, float]) -> Dict[str, float]:
+        """
+        Returns people per square metre of the zones that have an area.
+        """
+        return {zone.name: round(counts.get(zone.name, 0) / zone.area, 3) for zone in self.zones if zone.area}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_capacity": self.max_capacity,
+            "grid": list(self.grid) if self.grid is not None else None,
+            "zones": [
+                {
+                    "name": zone.name,
+                    "polygon": np.round(zone.polygon, 5).tolist(),
+                    "capacity": zone.capacity,
+                    "area": zone.area,
+                }
+                for zone in self.zones
+            ],
+        }
+
+
+class ZoneConfig:
+    """
+    The named zone layouts of STAMPEDE_ZONES, read on first use. A "default" entry
+    replaces the built-in 3x4 grid for everything that names no layout.
+
+    :param path: JSON file of layouts; None for only the built-in default.
+    """
+
+    def __init__(self, path: Optional[str] = ZONES_FILE):
+        self.path = path
+        self._layouts: Optional[Dict[str, ZoneLayout]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, ZoneLayout]:
+        """
+        Returns every layout by name, reading the file the first time.
+
+        :raises ValueError: If the file is malformed.
+        """
+        with self._lock:
+            if self._layouts is None:
+                layouts = {DEFAULT_LAYOUT: ZoneLayout.from_grid()}
+                if self.path:
+                    with open(self.path) as f:
+                        for name, entry in json.load(f).items():
+                            try:
+                                layouts[name] = ZoneLayout.from_config(name, entry)
+                            except (KeyError, TypeError) as e:
+                                raise ValueError(f"Zone layout '{name}' in {self.path} is invalid: {e!r}")
+                self._layouts = layouts
+            return self._layouts
+
+    def find(self, name: str) -> Optional[ZoneLayout]:
+        return self.load().get(name)
+
+    def get(self, name: Optional[str] = None) -> ZoneLayout:
+        """
+        Returns the named layout, or the default one.
+
+        :raises HTTPException: 404 if no layout has this name.
+        """
+        layout = self.load().get(name or DEFAULT_LAYOUT)
+        if layout is None:
+            raise HTTPException(status_code=404, detail=f"Zone layout '{name}' not found.")
+        return layout
+
+    def resolve(
+        self,
+        zones: Optional[str] = None,
+        num_rows: Optional[int] = None,
+        num_cols: Optional[int] = None,
+        max_capacity: Optional[float] = None,
+        high_density_threshold: Optional[float] = None,
+    ) -> ZoneLayout:
+        """
+        Returns the layout for an analysis request: the named layout, an ad-hoc grid if
+        num_rows/num_cols are given, or the default. Thresholds that are given replace
+        the layout's (high_density_threshold becomes every zone's capacity).
+
+        :raises HTTPException: 404 for an unknown layout, 400 if both a layout and grid dimensions are given.
+        """
+        if zones is not None and (num_rows is not None or num_cols is not None):
+            raise HTTPException(status_code=400, detail="Give either a zone layout or grid dimensions, not both.")
+        if num_rows is not None or num_cols is not None:
+            default = self.get()
+            default_rows, default_cols = default.grid or (3, 4)
+            capacity = default.zones[0].capacity if default.grid else DEFAULT_CAPACITY
+            layout = ZoneLayout.from_grid(
+                num_rows or default_rows, num_cols or default_cols, capacity, default.max_capacity, name="grid"
+            )
+        else:
+            layout = self.get(zones)
+        return layout.with_thresholds(max_capacity, high_density_threshold)
+
+
+zone_config = ZoneConfig()
@@ -1,19 +1,291 @@
-from fastapi import WebSocket
-from typing import List
+import asyncio
+import json
+from collections import deque
+from fastapi import WebSocket, WebSocketDisconnect
+from rich.console import Console
+from typing import Any, Dict, List, Optional
+from utils.metrics import stage_timer
+from utils.streaming import DEFAULT_STREAM_OPTIONS, EncodedFrame, StreamOptions, parse_stream_options
+
+console = Console()
+
+
+def _parse_json(text: Optional[str]) -> Any:
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _address(websocket: WebSocket) -> str:
+    client = getattr(websocket, "client", None)
+    return f"{client.host}:{client.port}" if client else "unknown client"
+
+
+class ClientConnection:
+    """
+    One connected WebSocket client with its own outbound queue and sender task.
+
+    Frame messages are latest-frame-wins: if the client has not finished receiving the
+    previous frame when a new one arrives, the older pending frame is dropped. Other
+    messages (alerts, control replies) are queued and always delivered in order; a
+    client that falls more than `max_pending` of them behind, or whose send does not
+    complete within `send_timeout` seconds, is evicted.
+
+    Each client listens on one channel: None for uploaded-video processing, or a
+    camera's channel (see utils/cameras.py).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        manager: "WebSocketManager",
+        channel: Optional[str] = None,
+        max_pending: int = 256,
+        send_timeout: float = 10.0,
+    ):
+        self.websocket = websocket
+        self.manager = manager
+        self.channel = channel
+        self.options: StreamOptions = DEFAULT_STREAM_OPTIONS
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.sent_messages = 0
+        self.dropped_frames = 0
+        self._messages = deque()
+        self._frame: Optional[List[Any]] = None
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._sender())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._messages) + (self._frame is not None)
+
+    def enqueue(self, messages: List[Any]):
+        """
+        Queues messages for guaranteed, in-order delivery.
+        """
+        if len(self._messages) >= self.max_pending:
+            # Too far behind to ever catch up; drop the client rather than buffer forever.
+            self.manager.evict(self.websocket)
+            return
+        self._messages.append(messages)
+        self._wakeup.set()
+
+    def enqueue_frame(self, messages: List[Any]):
+        """
+        Replaces the pending frame (if any) with a newer one.
+        """
+        if self._frame is not None:
+            self.dropped_frames += 1
+        self._frame = messages
+        self._wakeup.set()
+
+    async def _send(self, message: Any):
+        if isinstance(message, bytes):
+            send = self.websocket.send_bytes(message)
+        else:
+            send = self.websocket.send_json(message)
+        with stage_timer("video" if self.channel is None else "camera", "websocket_send"):
+            await asyncio.wait_for(send, timeout=self.send_timeout)
+        self.sent_messages += 1
+
+    async def _sender(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._messages or self._frame is not None:
+                    # Guaranteed messages go first; the frame slot may be refreshed meanwhile.
+                    if self._messages:
+                        messages = self._messages.popleft()
+                    else:
+                        messages, self._frame = self._frame, None
+                    # A multi-part frame (metadata + binary payloads) is sent back to back.
+                    for message in messages:
+                        await self._send(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            console.print(f"[bold red]WebSocket send to {_address(self.websocket)} failed, evicting client:[/bold red] {e!r}")
+            self.manager.evict(self.websocket)
+
+    def close(self):
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "mode": self.options.mode,
+            "queue_depth": self.queue_depth,
+            "dropped_frames": self.dropped_frames,
+            "sent_messages": self.sent_messages,
+        }
+
 
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # Immutable copies of the distinct options in use per channel; read by encoder threads.
+        self._requested_options: Dict[Optional[str], frozenset] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    def _refresh_options(self):
+        requested = {}
+        for client in self.clients.values():
+            requested.setdefault(client.channel, set()).add(client.options)
+        self._requested_options = {channel: frozenset(options) for channel, options in requested.items()}
 
-    async def connect(self, websocket: WebSocket):
+    def _channel_clients(self, channel: Optional[str]) -> List[ClientConnection]:
+        return [client for client in self.clients.values() if client.channel == channel]
+
+    async def connect(self, websocket: WebSocket, channel: Optional[str] = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.clients[websocket] = ClientConnection(websocket, self, channel)
+        self._refresh_options()
+
+    async def serve(self, websocket: WebSocket, channel: Optional[str] = None):
+        """
+        Runs a client connection until it closes: registers it on `channel`, applies
+        its "configure" messages and sends a keep-alive after every 2 idle seconds.
+        """
+        await self.connect(websocket, channel)
+        try:
+            while True:
+                try:
+                    received = await asyncio.wait_for(websocket.receive(), timeout=2)
+                except asyncio.TimeoutError:
+                    # Queue a keep-alive message for the client. Everything goes through the
+                    # client's sender task so it never interleaves with a multi-part frame.
+                    await self.send_to(websocket, {"message": "WebSocket connection active"})
+                    continue
+                if received["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(received.get("code", 1000))
+                message = _parse_json(received.get("text"))
+                if not isinstance(message, dict):
+                    # Not JSON, or JSON that is not an object: tell the client, keep the connection.
+                    await self.send_to(websocket, {"type": "error", "detail": "Expected a JSON object."})
+                    continue
+                if message.get("type") == "configure":
+                    invalid = []
+                    options = self.configure(websocket, message, invalid)
+                    if invalid:
+                        await self.send_to(websocket, {
+                            "type": "error", "detail": f"Invalid configure values ignored: {', '.join(invalid)}.",
+                        })
+                    await self.send_to(websocket, {"type": "configured", "options": options._asdict()})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            console.print(f"[bold red]WebSocket error from {_address(websocket)}:[/bold red] {e!r}")
+            # Close the socket too, rather than leave the client connected to nothing
+            self.evict(websocket)
+        finally:
+            self.disconnect(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.close()
+            self._refresh_options()
+
+    def evict(self, websocket: WebSocket):
+        """
+        Disconnects a dead or hopelessly slow client and closes its socket in the background.
+        """
+        if websocket in self.clients:
+            self.disconnect(websocket)
+            asyncio.create_task(self._close_quietly(websocket))
+
+    def close_channel(self, channel: Optional[str], code: int = 1001):
+        """
+        Disconnects every client on `channel` and closes their sockets with `code` in the
+        background (1001, "going away", when a camera is removed).
+        """
+        for client in self._channel_clients(channel):
+            self.disconnect(client.websocket)
+            asyncio.create_task(self._close_quietly(client.websocket, code))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int = 1000):
+        try:
+            await asyncio.wait_for(websocket.close(code), timeout=5)
+        except Exception:
+            pass
+
+    def configure(
+        self, websocket: WebSocket, message: Dict[str, Any], invalid: Optional[List[str]] = None
+    ) -> StreamOptions:
+        """
+        Applies a client's "configure" message (binary mode, preview width, quality,
+        format, whether to send the raw frame) and returns the negotiated options.
+        Malformed values fall back to the defaults; their keys are appended to `invalid`.
+        """
+        options = parse_stream_options(message, invalid)
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.options = options
+            self._refresh_options()
+        return options
+
+    def requested_options(self, channel: Optional[str] = None) -> frozenset:
+        """
+        Returns the distinct StreamOptions of clients on `channel`, so each frame is
+        encoded once per option set rather than once per client (and not at all when
+        nobody listens). Safe to call from worker threads.
+        """
+        return self._requested_options.get(channel, frozenset())
+
+    async def send_to(self, websocket: WebSocket, data: dict):
+        """
+        Queues a message for a single client, behind anything already queued for it.
+        """
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue([data])
+
+    async def send_data(self, data: dict, channel: Optional[str] = None):
+        """
+        Queues a message for every client on `channel` with guaranteed delivery (used
+        for alerts). Returns immediately; each client's sender task delivers it.
+        """
+        for client in self._channel_clients(channel):
+            client.enqueue([data])
+
+    async def send_frame(
+        self, metadata: Dict[str, Any], encoded: Dict[StreamOptions, EncodedFrame], channel: Optional[str] = None
+    ):
+        """
+        Hands an analysed frame to every client on `channel` in the format it
+        negotiated. Slow clients skip to the newest frame instead of holding up the others.
+
+        :param metadata: JSON-serialisable frame statistics.
+        :param encoded: Encoded images keyed by the options they were encoded for.
+        :param channel: Channel the frame belongs to.
+        """
+        for client in self._channel_clients(channel):
+            frame = encoded.get(client.options)
+            if frame is None:
+                # The client re-configured after this frame was encoded; it gets the next one.
+                continue
+            client.enqueue_frame(frame.messages(metadata, client.options))
 
-    async def send_data(self, data: dict):
-        for connection in self.active_connections:
-            await connection.send_json(data)
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the number of connected clients and per-client queue depth and drop counts.
+        """
+        return {
+            "connected_clients": len(self.clients),
+            "clients": [
+                {"client": f"{ws.client.host}:{ws.client.port}" if getattr(ws, "client", None) else str(id(ws)), **client.stats()}
+                for ws, client in self.clients.items()
+            ],
+        }
 
 websocket_manager = WebSocketManager()
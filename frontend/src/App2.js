@@ -22,13 +22,18 @@ function App2({ frames }) {
 
   // Determine which image to show based on displayMode.
   // For "original", use data.frame; for "heatmap", use data.heatmap.
+  // Frames streamed in binary mode carry object URLs (frameUrl / heatmapUrl) instead.
   let imageSrc = "";
   if (displayMode === "original") {
-    if (currentFrameData.frame) {
+    if (currentFrameData.frameUrl) {
+      imageSrc = currentFrameData.frameUrl;
+    } else if (currentFrameData.frame) {
       imageSrc = `data:image/jpeg;base64,${currentFrameData.frame}`;
     }
   } else {
-    if (currentFrameData.heatmap) {
+    if (currentFrameData.heatmapUrl) {
+      imageSrc = currentFrameData.heatmapUrl;
+    } else if (currentFrameData.heatmap) {
       imageSrc = `data:image/jpeg;base64,${currentFrameData.heatmap}`;
     }
   }
@@ -10,40 +10,91 @@ function WebSocketHandler({
 }) {
   useEffect(() => {
     const ws = new WebSocket("ws://127.0.0.1:8000/ws");
+    ws.binaryType = "blob";
 
-    ws.onopen = () => console.log("✅ WebSocket connected!");
+    // Frame metadata waiting for its binary payloads (binary streaming mode)
+    let pending = null;
+
+    const handleFrame = (data) => {
+      // Update the live frame
+      if (data.frameUrl || data.frame) {
+        setLatestFrame(data.frameUrl || `data:image/jpeg;base64,${data.frame}`);
+        // Append this frame's data to frames array for scrubbing
+        if (setFrames) {
+          setFrames((prev) => [...prev, data]);
+        }
+      } else if (data.heatmapUrl || data.heatmap) {
+        setLatestFrame(data.heatmapUrl || `data:image/jpeg;base64,${data.heatmap}`);
+        if (setFrames) {
+          setFrames((prev) => [...prev, data]);
+        }
+      } else {
+        console.warn("⚠️ No frame received");
+      }
+
+      // Update people count and progress
+      setPeopleCount(data.people_in_frame || 0);
+      setProgress(
+        data.progress !== undefined ? data.progress.toFixed(2) : 0
+      );
+
+      // Update quadrant counts if available
+      if (data.quadrant_counts) {
+        setQuadrantCounts(data.quadrant_counts);
+      }
+
+      // Update danger zones (if provided)
+      if (data.danger_zones) {
+        setDangerZones(data.danger_zones);
+      }
+    };
+
+    ws.onopen = () => {
+      console.log("✅ WebSocket connected!");
+      // Ask for binary JPEG payloads at preview resolution instead of base64 JSON
+      ws.send(JSON.stringify({
+        type: "configure",
+        binary: true,
+        preview_width: 960,
+        quality: 75,
+        format: "jpeg",
+      }));
+    };
 
     ws.onmessage = (event) => {
+      // Binary payloads follow their metadata message in the order it lists them
+      if (event.data instanceof Blob) {
+        if (!pending) return;
+        const { meta, remaining } = pending;
+        const payload = remaining.shift();
+        const mime = payload.format === "webp" ? "image/webp" : "image/jpeg";
+        const url = URL.createObjectURL(new Blob([event.data], { type: mime }));
+        meta[`${payload.name}Url`] = url;
+        if (remaining.length === 0) {
+          pending = null;
+          handleFrame(meta);
+        }
+        return;
+      }
+
       try {
         const data = JSON.parse(event.data);
-        console.log("🔥 Received WebSocket Data:", data);
 
-        // Update the live frame
-        if (data.frame) {
-          setLatestFrame(`data:image/jpeg;base64,${data.frame}`);
-          // Append this frame's data to frames array for scrubbing
-          if (setFrames) {
-            setFrames((prev) => [...prev, data]);
-          }
-        } else {
-          console.warn("⚠️ No frame received");
+        if (data.type === "frame") {
+          pending = { meta: data, remaining: [...data.payloads] };
+          return;
         }
-
-        // Update people count and progress
-        setPeopleCount(data.people_in_frame || 0);
-        setProgress(
-          data.progress !== undefined ? data.progress.toFixed(2) : 0
-        );
-
-        // Update quadrant counts if available
-        if (data.quadrant_counts) {
-          setQuadrantCounts(data.quadrant_counts);
+        // Alerts are always delivered, even when frames are being skipped
+        if (data.type === "alert") {
+          setDangerZones(data.danger_zones || []);
+          return;
         }
-
-        // Update danger zones (if provided)
-        if (data.danger_zones) {
-          setDangerZones(data.danger_zones);
+        // Keep-alive and configuration acknowledgements carry no frame data
+        if (data.message || data.type === "configured") {
+          return;
         }
+        console.log("🔥 Received WebSocket Data:", data);
+        handleFrame(data);
       } catch (error) {
         console.error("❌ Error parsing WebSocket data:", error);
       }
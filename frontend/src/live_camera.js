@@ -1,21 +1,76 @@
 import React, { useState, useRef, useEffect } from "react";
-import axios from "axios";
 import "./live_camera.css"; // Optional: separate CSS for live feed–specific styling
 
+// Frames are streamed over one WebSocket at this rate; the server always analyses
+// the newest frame and drops stale ones, so a slow backend never builds a backlog.
+const LIVE_FPS = 10;
+const LIVE_WS_URL = "ws://127.0.0.1:8000/ws/live";
+// Skip a capture if this many bytes are still waiting to leave the socket
+const MAX_BUFFERED_BYTES = 512 * 1024;
+
 function LiveCamera() {
   const [liveDetection, setLiveDetection] = useState(null);
   const [liveProcessedFrame, setLiveProcessedFrame] = useState(null);
   const [liveFrameCount, setLiveFrameCount] = useState(0);
   const [cumulativeQuadrants, setCumulativeQuadrants] = useState({});
   const [liveAvgQuadrants, setLiveAvgQuadrants] = useState({});
+  const [latencyMs, setLatencyMs] = useState(null);
   
   const liveVideoRef = useRef(null);
   const liveIntervalRef = useRef(null);
+  const liveSocketRef = useRef(null);
+  const canvasRef = useRef(document.createElement("canvas"));
 
   // Threshold for running average danger alert
   const avgQuadrantThreshold = 5; // Adjust as needed
 
   useEffect(() => {
+    // Statistics of the last result, waiting for its overlay image
+    let pendingResult = null;
+
+    function handleResult(data) {
+      setLiveDetection(data);
+      setLatencyMs(performance.now() - data.client_ts);
+      // Update running average for quadrant counts if available
+      if (data.quadrant_counts) {
+        setLiveFrameCount(prev => prev + 1);
+        setCumulativeQuadrants(prev => {
+          const updated = { ...prev };
+          for (const key in data.quadrant_counts) {
+            updated[key] = (updated[key] || 0) + data.quadrant_counts[key];
+          }
+          return updated;
+        });
+      }
+    }
+
+    function openSocket() {
+      const ws = new WebSocket(LIVE_WS_URL);
+      ws.binaryType = "blob";
+      ws.onmessage = (event) => {
+        if (event.data instanceof Blob) {
+          // Overlay JPEG for the preceding result message
+          const url = URL.createObjectURL(event.data);
+          setLiveProcessedFrame(prev => {
+            if (prev && prev.startsWith("blob:")) URL.revokeObjectURL(prev);
+            return url;
+          });
+          if (pendingResult) handleResult(pendingResult);
+          pendingResult = null;
+          return;
+        }
+        const data = JSON.parse(event.data);
+        if (data.type === "result") {
+          pendingResult = data;
+        } else if (data.type === "error") {
+          console.error("Error detecting live frame:", data.detail);
+        }
+      };
+      ws.onerror = (error) => console.error("Live WebSocket error:", error);
+      ws.onclose = () => console.warn("Live WebSocket closed.");
+      return ws;
+    }
+
     async function startLiveFeed() {
       try {
         const stream = await navigator.mediaDevices.getUserMedia({ video: true });
@@ -26,7 +81,8 @@ function LiveCamera() {
             liveVideoRef.current.play();
           }, 100);
         }
-        liveIntervalRef.current = setInterval(captureAndDetectFrame, 1000);
+        liveSocketRef.current = openSocket();
+        liveIntervalRef.current = setInterval(captureAndSendFrame, 1000 / LIVE_FPS);
       } catch (error) {
         console.error("Error accessing webcam:", error);
         alert("Webcam access is required for live feed mode.");
@@ -39,50 +95,31 @@ function LiveCamera() {
     const currentVideo = liveVideoRef.current;
     return () => {
       if (liveIntervalRef.current) clearInterval(liveIntervalRef.current);
+      if (liveSocketRef.current) liveSocketRef.current.close();
       if (currentVideo && currentVideo.srcObject) {
         currentVideo.srcObject.getTracks().forEach((track) => track.stop());
       }
     };
   }, []);
 
-  const captureAndDetectFrame = async () => {
-    if (!liveVideoRef.current) return;
+  const captureAndSendFrame = () => {
     const video = liveVideoRef.current;
-    const canvas = document.createElement("canvas");
+    const ws = liveSocketRef.current;
+    if (!video || !video.videoWidth || !ws || ws.readyState !== WebSocket.OPEN) return;
+    if (ws.bufferedAmount > MAX_BUFFERED_BYTES) return;
+
+    const canvas = canvasRef.current;
     canvas.width = video.videoWidth;
     canvas.height = video.videoHeight;
     const ctx = canvas.getContext("2d");
     ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-    const dataUrl = canvas.toDataURL("image/jpeg");
-    const blob = await (await fetch(dataUrl)).blob();
-    const formData = new FormData();
-    formData.append("image", blob, "frame.jpg");
-
-    try {
-      const response = await axios.post("http://127.0.0.1:8000/detect_frame/", formData, {
-        headers: { "Content-Type": "multipart/form-data" },
-      });
-      console.log("Live frame response:", response.data);
-      setLiveDetection(response.data);
-      if (response.data.frame) {
-        setLiveProcessedFrame(`data:image/jpeg;base64,${response.data.frame}`);
-      }
-      // Update running average for quadrant counts if available
-      if (response.data.quadrant_counts) {
-        setLiveFrameCount(prev => prev + 1);
-        setCumulativeQuadrants(prev => {
-          const updated = { ...prev };
-          for (const key in response.data.quadrant_counts) {
-            updated[key] = (updated[key] || 0) + response.data.quadrant_counts[key];
-          }
-          return updated;
-        });
-      }
-    } catch (error) {
-      console.error("Error detecting live frame:", error);
-      // Fallback: use the captured frame if detection fails
-      setLiveProcessedFrame(dataUrl);
-    }
+    canvas.toBlob((blob) => {
+      if (!blob || ws.readyState !== WebSocket.OPEN) return;
+      // 8-byte little-endian timestamp header, echoed back to measure end-to-end latency
+      const header = new DataView(new ArrayBuffer(8));
+      header.setFloat64(0, performance.now(), true);
+      ws.send(new Blob([header.buffer, blob]));
+    }, "image/jpeg", 0.7);
   };
 
   // Compute running average whenever cumulativeQuadrants or liveFrameCount updates
@@ -98,6 +135,7 @@ function LiveCamera() {
 
   const stopLiveFeed = () => {
     if (liveIntervalRef.current) clearInterval(liveIntervalRef.current);
+    if (liveSocketRef.current) liveSocketRef.current.close();
     if (liveVideoRef.current && liveVideoRef.current.srcObject) {
       liveVideoRef.current.srcObject.getTracks().forEach((track) => track.stop());
     }
@@ -112,7 +150,12 @@ function LiveCamera() {
         <div className="live-detection-info">
           <p><strong>People in Frame:</strong> {liveDetection.people_in_frame}</p>
           <p>
-            
+            {latencyMs !== null && (
+              <span>
+                <strong>Latency:</strong> {latencyMs.toFixed(0)} ms end-to-end
+                {liveDetection.latency && ` (${liveDetection.latency.server_ms} ms on server)`}
+              </span>
+            )}
           </p>
           {liveDetection.danger_zones && liveDetection.danger_zones.length > 0 && (
             <p style={{ color: "red" }}>